@@ -0,0 +1,64 @@
+"""Benchmark load_contributions throughput against the in-memory fake Breeze.
+
+Each add_contribution request waits --latency seconds on the fake, standing in for the round
+trip to Breeze. The client-side rate limiter is lifted so the numbers show the submission
+path itself; against the real account throughput is capped by BREEZE_RATE_LIMIT_PER_MINUTE.
+
+Run from the breeze_loader directory:
+    python -m benchmarks.bench_load_contributions [--rows 100 1000 5000] [--workers 1 4 8]
+"""
+import argparse
+import random
+import time
+
+import pandas as pd
+
+from benchmarks.fake_breeze import FakeBreeze
+from funds import get_funds
+from utils.api_util import TokenBucket
+from utils.funds_util import FundResolver
+from utils.load_contr_util import load_contributions
+
+
+def synthetic_contributions(rows, funds, seed=0):
+    # A month of Sunday offerings: a few dates, many givers, a handful of funds
+    rng = random.Random(seed)
+    sundays = pd.date_range('2024-01-07', periods=4, freq='7D').strftime('%Y-%m-%d')
+    fund_names = [fund['name'].strip() for fund in funds[:8]]
+    return pd.DataFrame({
+        'Date': [rng.choice(sundays) for _ in range(rows)],
+        'Contributor Name': [f'Giver {index}' for index in range(rows)],
+        'id': [str(100000 + index) for index in range(rows)],
+        'Method': [rng.choice(['Check', 'Cash', 'Direct Deposit']) for _ in range(rows)],
+        'Fund': [rng.choice(fund_names) for _ in range(rows)],
+        'Amount': [f'{rng.choice([5, 10, 20, 25, 50, 100, 250]):.2f}' for _ in range(rows)],
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds per fake Breeze request')
+    args = parser.parse_args()
+
+    print(f"{'rows':>6} {'workers':>8} {'seconds':>8} {'rows/s':>8} {'batches':>8}")
+    for rows in args.rows:
+        for workers in args.workers:
+            fake_breeze = FakeBreeze(funds=get_funds(), latency=args.latency)
+            breeze_client = fake_breeze.client()
+            fund_resolver = FundResolver(breeze_client)
+            df = synthetic_contributions(rows, fake_breeze.funds)
+
+            start = time.perf_counter()
+            result = load_contributions(breeze_client, df, fund_resolver, max_workers=workers,
+                                        rate_limiter=TokenBucket(rate=1e9, capacity=1e9))
+            elapsed = time.perf_counter() - start
+
+            assert result['Payment ID'].notna().all()
+            batches = len({contribution['group'] for contribution in fake_breeze.contributions})
+            print(f'{rows:>6} {workers:>8} {elapsed:>8.2f} {rows / elapsed:>8.0f} {batches:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Benchmark the fuzzy phase of match_people: the original nested iterrows scan vs PeopleIndex.
+
+Also reports how many spreadsheet spellings of directory names (case, accents, punctuation,
+Greek/English first names) the exact phase catches with and without the alias join, i.e.
+how many rows it keeps out of the fuzzy phase.
+
+Run from the breeze_loader directory:
+    python -m benchmarks.bench_match_people [--queries 50] [--sizes 1000 10000 50000]
+"""
+import argparse
+import random
+import time
+
+import pandas as pd
+from thefuzz import fuzz
+
+from benchmarks.fake_breeze import synthetic_people
+from utils.match_util import FIRST_NAME_ALIASES, PeopleIndex, name_columns
+
+
+def synthetic_unmatched(people, count, seed=1):
+    # Misspelled / truncated versions of directory names, like the rows that miss the direct match
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        person = people.iloc[rng.randrange(len(people))]
+        name = person['first_name'] + ' ' + person['last_name']
+        edit = rng.choice(['typo', 'drop', 'none', 'unknown'])
+        if edit == 'typo':
+            pos = rng.randrange(len(name))
+            name = name[:pos] + rng.choice('aeiou') + name[pos + 1:]
+        elif edit == 'drop':
+            name = name[:-1]
+        elif edit == 'unknown':
+            name = 'Zzyzx ' + ''.join(rng.choice('qwxz') for _ in range(6))
+        parts = name.split()
+        rows.append({'Contributor Name': name, 'First_Name': parts[0], 'Last_Name': parts[1] if len(parts) > 1 else None})
+    return pd.DataFrame(rows)
+
+
+def synthetic_variants(people, count, seed=2):
+    # Directory names as they show up on bank deposits and envelopes
+    rng = random.Random(seed)
+    variants = {name: group for group in FIRST_NAME_ALIASES for name in group}
+    rows = []
+    for _ in range(count):
+        person = people.iloc[rng.randrange(len(people))]
+        first_name, last_name = person['first_name'], person['last_name']
+        edit = rng.choice(['case', 'alias', 'punctuation', 'accent'])
+        if edit == 'case':
+            first_name, last_name = first_name.upper(), last_name.lower()
+        elif edit == 'alias':
+            first_name = rng.choice(variants.get(first_name.lower(), [first_name])).title()
+        elif edit == 'punctuation':
+            first_name += '.'
+        else:
+            last_name = last_name.replace('o', 'ó', 1)
+        rows.append({'Contributor Name': f'{first_name} {last_name}', 'First_Name': first_name, 'Last_Name': last_name})
+    return pd.DataFrame(rows)
+
+
+def exact_hit_rates(people_index, df_upload):
+    # Share of rows the exact phase matches on (first, last) alone, and with the alias join
+    keys = name_columns(df_upload['First_Name'], df_upload['Last_Name']).reset_index()
+    without_alias = keys.merge(people_index.name_keys, on=['_first_key', '_last_key'])['index'].nunique()
+    _, df_unmatched = people_index.exact_match_frame(df_upload)
+    return without_alias / len(df_upload), 1 - len(df_unmatched) / len(df_upload)
+
+
+def legacy_fuzzy_match(unmatched_df, people):
+    # The fuzzy phase of match_people before PeopleIndex, kept here as the reference implementation
+    matches = {}
+    for index, row in unmatched_df.iterrows():
+        max_score = 0
+        best_match = None
+        for i, person in people.iterrows():
+            score = fuzz.partial_ratio(row['Contributor Name'], person['first_name'] + ' ' + person['last_name'])
+            if score > max_score:
+                max_score = score
+                best_match = person
+        if max_score > 90:
+            matches[index] = best_match['id']
+    return matches
+
+
+def indexed_fuzzy_match(unmatched_df, people):
+    df_matched, matched_labels = PeopleIndex(people).match_frame(unmatched_df)
+    return dict(zip(matched_labels, df_matched['id']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--queries', type=int, default=50, help='unmatched spreadsheet rows to score')
+    parser.add_argument('--legacy-queries', type=int, default=5,
+                        help='rows timed with the legacy scan (it is extrapolated to --queries)')
+    args = parser.parse_args()
+
+    print(f"{'people':>8} {'legacy s/row':>13} {'indexed s/row':>14} {'speedup':>8}  parity")
+    for size in args.sizes:
+        people = synthetic_people(size)
+        unmatched_df = synthetic_unmatched(people, args.queries)
+
+        start = time.perf_counter()
+        indexed = indexed_fuzzy_match(unmatched_df, people)
+        indexed_per_row = (time.perf_counter() - start) / args.queries
+
+        legacy_df = unmatched_df.head(args.legacy_queries)
+        start = time.perf_counter()
+        legacy = legacy_fuzzy_match(legacy_df, people)
+        legacy_per_row = (time.perf_counter() - start) / len(legacy_df)
+
+        parity = all(indexed.get(label) == legacy.get(label) for label in legacy_df.index)
+        print(f"{size:>8} {legacy_per_row:>13.4f} {indexed_per_row:>14.5f} "
+              f"{legacy_per_row / indexed_per_row:>7.0f}x  {'ok' if parity else 'MISMATCH'}")
+
+    print(f"\n{'people':>8} {'exact, no alias':>16} {'exact + alias':>14}")
+    for size in args.sizes:
+        people = synthetic_people(size)
+        without_alias, with_alias = exact_hit_rates(PeopleIndex(people), synthetic_variants(people, args.queries))
+        print(f'{size:>8} {without_alias:>16.0%} {with_alias:>14.0%}')
+
+
+if __name__ == '__main__':
+    main()
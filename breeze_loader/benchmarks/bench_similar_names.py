@@ -0,0 +1,61 @@
+"""Benchmark similar-name detection: the original all-pairs check_similar_names vs similar_name_clusters.
+
+Run from the breeze_loader directory:
+    python -m benchmarks.bench_similar_names [--sizes 500 1000 3000]
+"""
+import argparse
+import time
+
+import pandas as pd
+from thefuzz import fuzz
+
+from benchmarks.bench_match_people import synthetic_unmatched
+from benchmarks.fake_breeze import synthetic_people
+from utils.ppl_util import check_similar_names
+
+
+def legacy_check_similar_names(df):
+    # check_similar_names before similar_name_clusters, kept here as the reference implementation
+    names = df['Contributor Name']
+    similar_names = []
+    for name in names:
+        scores = [(other_name, fuzz.ratio(name, other_name)) for other_name in names if other_name != name]
+        scores.sort(key=lambda x: x[1], reverse=True)
+        if scores and scores[0][1] > 80:  # if the best match has a score > 80
+            similar_names.append(name)
+    return similar_names
+
+
+def synthetic_upload(rows):
+    # A year-end file: repeat givers plus misspelled variants of some of them
+    people = synthetic_people(max(rows // 2, 10))
+    upload = pd.concat([synthetic_unmatched(people, rows // 2, seed=2),
+                        people.sample(rows - rows // 2, replace=True, random_state=3)
+                        .assign(**{'Contributor Name': lambda df: df['first_name'] + ' ' + df['last_name']})],
+                       ignore_index=True)
+    return upload[['Contributor Name']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 1000, 3000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>6} {'legacy s':>9} {'clustered s':>12} {'speedup':>8}  parity")
+    for size in args.sizes:
+        df = synthetic_upload(size)
+
+        start = time.perf_counter()
+        clustered = check_similar_names(df)
+        clustered_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        legacy = legacy_check_similar_names(df)
+        legacy_time = time.perf_counter() - start
+
+        print(f"{size:>6} {legacy_time:>9.2f} {clustered_time:>12.3f} {legacy_time / clustered_time:>7.0f}x  "
+              f"{'ok' if clustered == legacy else 'MISMATCH'}")
+
+
+if __name__ == '__main__':
+    main()
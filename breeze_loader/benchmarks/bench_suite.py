@@ -0,0 +1,181 @@
+"""End-to-end benchmark of an upload against the in-memory fake Breeze, with a stored baseline.
+
+Times each stage of the loader (fetch_people, match_people, merge_spreasheet, check_funds,
+load_contributions) at several upload sizes, and compares the timings with a baseline JSON
+file. Stages more than --tolerance slower than the baseline are reported as regressions and
+the exit status is 1. Baselines are machine specific; save one with --save-baseline before
+comparing changes on the same machine.
+
+Run from the breeze_loader directory:
+    python -m benchmarks.bench_suite [--sizes 100 1000 5000] [--save-baseline]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+from benchmarks.fake_breeze import FakeBreeze, synthetic_people
+from utils.api_util import TokenBucket
+from utils.funds_util import FundResolver, check_funds
+from utils.load_contr_util import load_contributions
+from utils.match_util import SIMILAR_NAME_SCORE, PeopleIndex
+from utils.ppl_util import fetch_people, match_people
+from utils.spreadsheet_util import merge_spreasheet
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+MIN_REGRESSION_SECONDS = 0.05   # ignore slowdowns smaller than this, they are mostly noise
+# The upload is built so that most rows match and load; if fewer do, the load timings no
+# longer measure an upload of the given size and the run fails
+MIN_LOADED_FRACTION = 0.75
+
+
+def distinct_givers(people, seed=0):
+    # People whose names are unique in the directory and not too similar to any other giver's,
+    # picked greedily in a random order. Uploads drawn from them don't trip the similar-name
+    # check, which would otherwise leave most of a large synthetic upload for manual entry.
+    names = people['first_name'] + ' ' + people['last_name']
+    candidates = names[~names.duplicated(keep=False)].sample(frac=1, random_state=seed)
+    accepted, givers = [], []
+    for index, name in candidates.items():
+        if process.extractOne(name, accepted, scorer=fuzz.ratio, score_cutoff=SIMILAR_NAME_SCORE) is None:
+            accepted.append(name)
+            givers.append(index)
+    return people.loc[givers]
+
+
+def misspell(name, rng, taken=()):
+    # A typo or a dropped last letter, like the rows that miss the exact match. Variants that
+    # are someone else's name in `taken` are skipped, since they would match that person.
+    while True:
+        if rng.random() < 0.5:
+            variant = name[:-1]
+        else:
+            pos = rng.randrange(1, len(name))
+            variant = name[:pos] + rng.choice([letter for letter in 'aeiou' if letter != name[pos]]) + name[pos + 1:]
+        if variant not in taken:
+            return variant
+
+
+def synthetic_upload(givers, unknown, funds, rows, seed=0, directory_names=()):
+    # Spreadsheet rows from repeat givers: most spelled as in the directory, a sixth misspelled
+    # (each misspelled giver always the same way), a twelfth not in the directory at all, and
+    # one in fifty with a fund name that doesn't exist in Breeze
+    rng = random.Random(seed)
+    names = (givers['first_name'] + ' ' + givers['last_name']).tolist()
+    misspelled_count = len(names) // 5
+    misspelled = [misspell(name, rng, set(directory_names)) for name in names[:misspelled_count]]
+    exact = names[misspelled_count:]
+    unknown = (unknown['first_name'] + ' ' + unknown['last_name']).tolist()
+    contributor_names = (rng.choices(misspelled, k=rows // 6) + rng.choices(unknown, k=rows // 12)
+                         + rng.choices(exact, k=rows - rows // 6 - rows // 12))
+    rng.shuffle(contributor_names)
+    upload = pd.DataFrame({'Contributor Name': contributor_names})
+    fund_names = [fund['name'].strip() for fund in funds]
+    upload['Date'] = [rng.choice(['2024-01-07', '2024-01-14', '2024-01-21', '2024-01-28']) for _ in range(rows)]
+    upload['Fund'] = [rng.choice(['Building Fnd', 'Festival Sponsorship']) if rng.random() < 0.02
+                      else rng.choice(fund_names) for _ in range(rows)]
+    upload['Amount'] = [rng.choice([5, 10, 20, 25, 50, 100, 250]) for _ in range(rows)]
+    upload['Method'] = [rng.choice(['Check', 'Cash', 'Direct Deposit']) for _ in range(rows)]
+    split = upload['Contributor Name'].str.split(' ', n=1)
+    upload['First_Name'], upload['Last_Name'] = split.str[0], split.str[1]
+    return upload
+
+
+def run_upload(rows, people_size, latency, workers):
+    # One upload through every stage; returns ({stage: seconds}, rows loaded into the fake)
+    directory = synthetic_people(people_size).assign(force_first_name='', path='')
+    givers = distinct_givers(directory)
+    # A tenth of the givers are taken out of the directory, to show up as unknown names
+    unknown = givers.iloc[:len(givers) // 10]
+    fake_breeze = FakeBreeze(people=directory.drop(unknown.index), latency=latency)
+    breeze_client = fake_breeze.client()
+    upload = synthetic_upload(givers.iloc[len(unknown):], unknown, fake_breeze.funds, rows,
+                              directory_names=directory['first_name'] + ' ' + directory['last_name'])
+    timings = {}
+
+    def timed(stage, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    people = timed('fetch_people', fetch_people, breeze_client)
+    df_matched = timed('match_people', match_people, upload, people, PeopleIndex(people))
+    merged = timed('merge_spreasheet', merge_spreasheet, upload, df_matched[['Contributor Name', 'id']])
+    fund_resolver = FundResolver(breeze_client)
+    checked = timed('check_funds', check_funds, merged, breeze_client, fund_resolver)
+    auto_recs = checked[(checked['Manually Enter'] == 'N') & (checked['Fund Exists'] == 'Y')].copy()
+    loaded = timed('load_contributions', load_contributions, breeze_client, auto_recs, fund_resolver,
+                   max_workers=workers, rate_limiter=TokenBucket(rate=1e9, capacity=1e9))
+    assert loaded['Payment ID'].notna().all() and len(fake_breeze.contributions) == len(auto_recs)
+    if len(auto_recs) < rows * MIN_LOADED_FRACTION:
+        raise RuntimeError(f'Only {len(auto_recs)} of {rows} rows reached load_contributions; the synthetic '
+                           f'upload no longer measures a {rows}-row load')
+    return timings, len(auto_recs)
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for key, seconds in sorted(results.items()):
+        before = baseline.get(key)
+        if before is not None and seconds > before * (1 + tolerance) and seconds - before > MIN_REGRESSION_SECONDS:
+            regressions.append(f'{key}: {before:.3f}s -> {seconds:.3f}s')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000], help='upload rows')
+    parser.add_argument('--people', type=int, default=5000, help='people in the fake directory')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds per fake Breeze request')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per size; the fastest is kept')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown vs the baseline')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    results, loaded_rows = {}, {}
+    for rows in args.sizes:
+        runs = [run_upload(rows, args.people, args.latency, args.workers) for _ in range(args.repeat)]
+        for stage in runs[0][0]:
+            results[f'{stage}/{rows}'] = min(timings[stage] for timings, _ in runs)
+        loaded_rows[rows] = runs[0][1]
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+
+    print(f"{'stage':<20} {'rows':>6} {'seconds':>9} {'rows/s':>9} {'baseline':>9}")
+    for key, seconds in results.items():
+        stage, rows = key.split('/')
+        # load_contributions only gets the rows that matched and have a fund in Breeze
+        stage_rows = loaded_rows[int(rows)] if stage == 'load_contributions' else int(rows)
+        before = f"{baseline[key]:>9.3f}" if key in baseline else f"{'-':>9}"
+        print(f'{stage:<20} {rows:>6} {seconds:>9.3f} {stage_rows / seconds:>9.0f} {before}')
+    # Unknown and misspelled names that don't match, and rows with a fund that isn't in
+    # Breeze, are left out of the load
+    print('rows loaded: ' + ', '.join(f'{loaded} of {rows}' for rows, loaded in loaded_rows.items()))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump({'settings': {key: value for key, value in vars(args).items()
+                                    if key in ('people', 'latency', 'workers', 'repeat')},
+                       'results': {key: round(seconds, 4) for key, seconds in results.items()}}, file, indent=2)
+        print(f'Saved baseline to {args.baseline}')
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
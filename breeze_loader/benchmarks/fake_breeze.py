@@ -0,0 +1,118 @@
+import collections
+import itertools
+import json
+import random
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+import requests
+from breeze_chms_api import breeze
+from requests.adapters import BaseAdapter
+
+from funds import get_funds
+
+FAKE_BREEZE_URL = 'https://fake.breezechms.com'
+FAKE_API_KEY = 'fake-api-key'
+
+FIRST_NAMES = ['George', 'Georgios', 'Nicholas', 'Nikolaos', 'John', 'Ioannis', 'Mary', 'Maria', 'Katerina',
+               'Catherine', 'Elias', 'Helen', 'Eleni', 'Peter', 'Petros', 'Anna', 'Michael', 'Sophia', 'Basil',
+               'Christina', 'Demetrios', 'James', 'Thomas', 'Paul', 'Constantine', 'Theodore', 'Alexandra']
+LAST_NAMES = ['Papadopoulos', 'Markopoulos', 'Haddad', 'Khoury', 'Nassar', 'Smith', 'Johnson', 'Karras',
+              'Georgiou', 'Baderian', 'Antoun', 'Saliba', 'Nicholas', 'Demos', 'Mansour', 'Brown', 'Williams',
+              'Stavros', 'Economou', 'Farah', 'Jabbour', 'Kallas', 'Miller', 'Davis', 'Pappas', 'Thomas']
+
+
+def synthetic_people(size, seed=0):
+    # A parish directory of `size` people (id, first_name, last_name)
+    rng = random.Random(seed)
+    people = []
+    for i in range(size):
+        # Suffix most last names so the directory is not just a handful of families
+        last_name = rng.choice(LAST_NAMES) + (rng.choice(['', 'is', 'ian', 'son', 'ides']) if i % 3 else '')
+        last_name += ''.join(rng.choice('aeiourstln') for _ in range(rng.randint(0, 4)))
+        people.append({'id': str(10000000 + i), 'first_name': rng.choice(FIRST_NAMES), 'last_name': last_name.title()})
+    return pd.DataFrame(people)
+
+
+class FakeBreeze(BaseAdapter):
+    """In-memory Breeze account for tests and benchmarks.
+
+    It is a requests transport adapter: mounted on the requests.Session a BreezeApi uses as
+    its connection, it answers the API calls the loader makes without touching the network.
+    Funds default to the account's fund list in funds.py and people to synthetic_people(500).
+
+    latency       seconds each request takes
+    rate_limit    requests allowed per minute; requests over it get a 429
+    failure_rate  share of requests that fail with a 503, drawn from a seeded generator
+
+    Every add_contribution call that succeeds is kept in `contributions`, with its payment id.
+    """
+
+    def __init__(self, funds=None, people=None, latency=0.0, rate_limit=None, failure_rate=0.0, seed=0):
+        super().__init__()
+        self.funds = list(get_funds() if funds is None else funds)
+        if people is None:
+            people = synthetic_people(500).assign(force_first_name='', path='img/profiles/generic/blue.jpg')
+        self.people = people.to_dict('records') if isinstance(people, pd.DataFrame) else list(people)
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.failure_rate = failure_rate
+        self.contributions = []
+        self.request_count = 0
+        self.failure_count = 0
+        self._rng = random.Random(seed)
+        self._recent = collections.deque()
+        self._payment_ids = itertools.count(1001)
+        self._lock = threading.Lock()
+
+    def client(self, api_key=FAKE_API_KEY):
+        session = requests.Session()
+        session.mount(FAKE_BREEZE_URL, self)
+        return breeze.BreezeApi(breeze_url=FAKE_BREEZE_URL, api_key=api_key, connection=session)
+
+    def send(self, request, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlsplit(request.url)
+        endpoint = url.path.split('/api/', 1)[1].strip('/')
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with self._lock:
+            self.request_count += 1
+            if request.headers.get('Api-Key') != FAKE_API_KEY:
+                return self.response(request, {'success': False, 'errors': 'Invalid API key'}, 401)
+            if self.rate_limit is not None:
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] >= 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rate_limit:
+                    self.failure_count += 1
+                    return self.response(request, {'success': False, 'errors': 'Rate limit exceeded'}, 429)
+                self._recent.append(now)
+            if self.failure_rate and self._rng.random() < self.failure_rate:
+                self.failure_count += 1
+                return self.response(request, {'success': False, 'errors': 'Service unavailable'}, 503)
+
+            if endpoint == 'giving/add':
+                payment_id = str(next(self._payment_ids))
+                self.contributions.append({**params, 'payment_id': payment_id})
+                return self.response(request, {'success': True, 'payment_id': payment_id})
+            if endpoint == 'funds/list':
+                return self.response(request, self.funds)
+            if endpoint == 'people':
+                return self.response(request, self.people)
+        return self.response(request, {'success': False, 'errors': f'Unknown endpoint {endpoint}'}, 404)
+
+    @staticmethod
+    def response(request, body, status_code=200):
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps(body).encode()
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
@@ -1,8 +1,14 @@
-from utils.api_util import connect_to_breeze
+from utils.export_util import export_download
 from utils.funds_util import check_funds, get_all_fund_names
-from utils.load_contr_util import load_contributions
-from utils.ppl_util import get_people, match_people
-from utils.spreadsheet_util import generate_template, get_upload_file, merge_spreasheet
+from utils.journal_util import find_duplicate_gifts
+from utils.load_contr_util import post_contributions, report_load
+from utils.ppl_util import display_matches, find_matches
+from utils.reconcile_util import RECONCILE_GROUPINGS, contribution_statuses, deposit_check, display_reconciliation, reconcile
+from utils.resource_util import get_breeze_client, get_fund_resolver, get_load_journal, get_people_directory
+from utils.spreadsheet_util import generate_template, merge_spreasheet, read_contributions, show_upload, upload_widget
+from utils.stage_util import file_hash, session_stages
+from utils.trace_util import count, display_trace, show_trace_panel, span, tracing
+import datetime as dt
 import streamlit as st
 import streamlit_authenticator as stauth
 import yaml
@@ -10,6 +16,181 @@ from yaml.loader import SafeLoader
 from streamlit_authenticator import Authenticate
 
 
+def contribution_loader_tab(breeze_client, fund_resolver):
+    st.title('Breeze Automated Contribution Loader')
+    st.write("""This tool loads contributions from an MS Excel (.xlsx) or CSV spreadhseet into Breeze by searching on the 
+            Contributor Name and matching it with the Breeze database. 
+            If a match is found, the contribution is loaded automatically. 
+            If no match is found, the contribution is flagged for manual entry.""")
+
+
+    # Get the list of all people in the Breeze database (cached) and display it in the sidebar
+    directory = get_people_directory()
+    with span('people_directory'):
+        people = directory.get()
+    count('people', len(people))
+
+    # Generate the template and display it in the sidebar
+    template = generate_template()
+    if template is not None:
+        st.sidebar.subheader('Contribution Loader Template')
+        st.sidebar.download_button(label='Download',
+                                   file_name='contribution_loader_template.xlsx',
+                                   data=template,
+                                   mime='application/vnd.ms-excel')
+    else:
+        pass
+    if st.sidebar.button('Refresh Breeze Funds'):
+        fund_resolver.invalidate()
+
+    # Display the list of people in the sidebar
+    st.sidebar.subheader('Breeze Parishioner Directory')
+    if st.sidebar.button('Refresh Directory'):
+        people = directory.refresh()
+    st.sidebar.dataframe(data=people, use_container_width=True)
+    st.sidebar.caption(f"Directory as of {dt.datetime.fromtimestamp(directory.loaded_at):%Y-%m-%d %H:%M}")
+
+    # Each stage below is cached in the session, keyed by the uploaded file's hash and the
+    # directory and fund list versions it used, so a rerun (e.g. pressing Load Contributions)
+    # only recomputes what changed
+    stages = session_stages()
+
+    # Get spreadheet of contributions to be loaded
+    uploaded_file = upload_widget()
+    if uploaded_file is None:
+        st.caption("Please upload your file...")
+        return
+    upload_key = file_hash(uploaded_file)
+    try:
+        df_uploaded_file = stages.run('upload', upload_key,
+                                      lambda: read_contributions(uploaded_file, uploaded_file.name))
+    except Exception as e:
+        st.error(f'Error: {e}')
+        return
+    show_upload(df_uploaded_file)
+    count('upload_rows', len(df_uploaded_file))
+    if df_uploaded_file.empty:
+        st.caption("Please upload your file...")
+        return
+
+    # Lookup people from uploaded file in Breeze
+    match_key = (upload_key, directory.version)
+    matches = stages.run('match', match_key, lambda: find_matches(df_uploaded_file, people, directory.index()))
+    df_ppl_matched = display_matches(df_uploaded_file, *matches)
+
+    # Merge the matched people from the spreadsheet back into the master spreadsheet
+    if df_ppl_matched is not None and not df_ppl_matched.empty:
+        merged_df = stages.run('merge', match_key, lambda: merge_spreasheet(df_uploaded_file, df_ppl_matched))
+    else:
+        st.error("No records matched. Please check the Contributor Names in the spreadsheet and try again.")
+        return
+
+    # Perform check to make sure that all funds on spreasheet exist in Breeze
+    st.subheader(body='Check Funds',divider='blue')
+    df_manual_contr_recs = merged_df.loc[(merged_df['Manually Enter'] == 'Y')]
+    fund_resolver.list_funds()  # refetches the fund list (and bumps its version) if it was refreshed or is stale
+    df_check_funds = stages.run('check_funds', (match_key, fund_resolver.version),
+                                lambda: check_funds(merged_df.loc[(merged_df['Manually Enter'] == 'N')].copy(),
+                                                    breeze_client, fund_resolver))
+    df_auto_contr_recs = df_check_funds
+    #st.write(df_check_funds)
+    if df_check_funds['Fund Exists'].str.contains('N').any():
+        st.error("ERROR: The following funds do not exist in Breeze. Please manually change the names in the 'Fund' column to match those in Breeze and re-upload the spreadsheet.")
+        st.table(df_check_funds.loc[(df_check_funds['Fund Exists'] == 'N')].iloc[:, :5])
+        st.write("Available funds in Breeze:")
+        st.write(get_all_fund_names(breeze_client, fund_resolver))
+        funds_exist = False
+    else:
+        st.success("All funds in the spreadsheet exist in Breeze")
+        funds_exist = True
+    # If funds_exist is False, stop the execution of the rest of the code
+    if not funds_exist:
+        return
+
+    # Load the contributions into Breeze
+    count('auto_rows', len(df_auto_contr_recs))
+    count('manual_rows', len(df_manual_contr_recs))
+    st.subheader(body='Load Contributions',divider='grey')
+    st.warning("Please review the contributions to be loaded. If you need to manually enter or change any contribution details, please do so in the spreadsheet file and re-upload.")
+    st.write(f"Contributions to be loaded: {df_auto_contr_recs.count()[0]}")
+    st.write(df_auto_contr_recs.drop(columns=['First_Name','Last_Name']))
+
+    # Check the whole upload against the gifts earlier uploads loaded (same person, date, fund
+    # and amount). Suspected duplicates are held back unless the user says to load them.
+    journal = get_load_journal()
+    df_duplicates = find_duplicate_gifts(df_auto_contr_recs, journal)
+    approved = set()
+    if not df_duplicates.empty:
+        st.warning(f"{len(df_duplicates)} contribution(s) match gifts already loaded into Breeze from an earlier upload "
+                   "(same person, date, fund and amount). They will not be loaded unless you tick the box below.")
+        st.write(df_duplicates)
+        if st.checkbox("Load these contributions anyway", key='load_duplicates'):
+            approved = set(df_duplicates.index)
+
+    max_rows = st.number_input("Contributions to load per run (0 loads them all)", min_value=0, value=0, step=100,
+                               help="Rows already loaded by a previous run of the same file are skipped, so a large file can be loaded in chunks.")
+
+    if 'load_contributions' not in st.session_state:
+        st.session_state.load_contributions = False
+    if st.button("Load Contributions"):
+        st.session_state.load_contributions = True
+    if df_auto_contr_recs is not None and st.session_state.load_contributions:
+        with st.spinner("Loading contributions..."):
+            progress_bar = st.progress(0.0)
+            # Check again under the journal's load lock: another session may have loaded some of
+            # these gifts since the page was drawn. Only the duplicates shown above can be approved.
+            with journal.loading(), span('load_contributions'):
+                hold_back = set(find_duplicate_gifts(df_auto_contr_recs, journal).index) - approved
+                df_payment_id, skipped, errors = post_contributions(
+                    breeze_client, df_auto_contr_recs.copy(), fund_resolver,
+                    progress=lambda done, total: progress_bar.progress(done / total, text=f"{done} of {total} loaded"),
+                    journal=journal, max_rows=max_rows, hold_back=hold_back)
+        report_load(skipped, errors)
+        # Reset the flag after loading the contributions
+        st.session_state.load_contributions = False
+        st.session_state.load_results = dict(upload=match_key, loaded=df_payment_id, errors=errors,
+                                             held_back=hold_back)
+        # Only a load that left nothing failed, held back or deferred is a success, as in deposit_check
+        df_statuses = contribution_statuses(df_payment_id, df_manual_contr_recs, errors, hold_back)
+        if deposit_check(df_statuses)['balanced']:
+            st.success("Contributions loaded successfully")
+        else:
+            statuses = df_statuses['Status'].value_counts()
+            st.warning(f"Contributions loaded with {statuses.get('Failed', 0)} failed, "
+                       f"{statuses.get('Held Back', 0)} held back and {statuses.get('Deferred', 0)} not sent yet. "
+                       "See the reconciliation below.")
+
+    # The results of the last load stay up (while their exports are prepared and downloaded)
+    # until a different file is uploaded
+    load_results = st.session_state.get('load_results')
+    if load_results is None or load_results['upload'] != match_key:
+        return
+
+    # Display the results
+    st.subheader(body='Results',divider='blue')
+    st.info("Contribution records loaded successfully:")
+    st.write(load_results['loaded'])
+    st.info("Unmatched contribution records that require manual entry:", icon="❗️")
+    st.caption(":red[Action Required!]")
+    st.write(df_manual_contr_recs)
+
+    # Totals per fund, method and date, checked against the bank deposit
+    df_statuses = contribution_statuses(load_results['loaded'], df_manual_contr_recs, load_results['errors'],
+                                        load_results['held_back'])
+    display_reconciliation(df_statuses)
+
+    # Download the results, rendered in memory for this session only
+    export_download('All Contributions', merged_df, 'all_contributions', key='all_contributions',
+                    fingerprint=str(match_key))
+    export_download('Unmatched Contributions', df_manual_contr_recs, 'unmatched_contributions',
+                    key='unmatched_contributions', fingerprint=str(match_key))
+    # Keyed on the report's own content: loading the next chunk, or retrying failed rows,
+    # changes the report but not the upload's stage key
+    export_download('Reconciliation', reconcile(df_statuses, RECONCILE_GROUPINGS).reset_index(), 'reconciliation',
+                    key='reconciliation')
+    st.caption("To load more contributions, simply upload another Excel spreadsheet file.")
+
+
 def main():
     # 0. Login Authentication
     hashed_passwords = stauth.Hasher(['abc', 'def']).generate()
@@ -26,120 +207,19 @@ def main():
     if st.session_state["authentication_status"]:
         authenticator.logout('Logout','main')
 
-        breeze_client = connect_to_breeze()
+        # Breeze client, fund list and people directory are created once per server process
+        breeze_client = get_breeze_client()
+        fund_resolver = get_fund_resolver()
+
         tab1, tab2 = st.tabs(["Contribution Loader", "Documentation"])
-        with tab1:
-            st.title('Breeze Automated Contribution Loader')
-            st.write("""This tool loads contributions from an MS Excel (.xlsx) spreadhseet into Breeze by searching on the 
-                    Contributor Name and matching it with the Breeze database. 
-                    If a match is found, the contribution is loaded automatically. 
-                    If no match is found, the contribution is flagged for manual entry.""")
-
-
-            # Get the list of all people in the Breeze database and display it in the sidebar
-            people = get_people(breeze_client)
-            print(people)
-
-            # Generate the template and display it in the sidebar
-            template = generate_template()
-            if template is not None:
-                st.sidebar.subheader('Contribution Loader Template')
-                st.sidebar.download_button(label='Download',
-                                           file_name='contribution_loader_template.xlsx',
-                                           data=template,
-                                           mime='application/vnd.ms-excel')
-            else:
-                pass
-
-            # Display the list of people in the sidebar
-            st.sidebar.subheader('Breeze Parishioner Directory')
-            st.sidebar.dataframe(data=get_people(breeze_client), use_container_width=True)
-
-            # Get spreadheet of contributions to be loaded
-            df_uploaded_file = get_upload_file()
-            print(df_uploaded_file)
-
-            # Lookup people from uploaded file in Breeze
-            df_ppl_matched = match_people(df_uploaded_file, people)
-            print(df_ppl_matched)
-        
-            # Merge the matched people from the spreadsheet back into the master spreadsheet
-            if df_uploaded_file is None:
-                st.caption("Please upload your file...")
-                return
-            
-            if df_ppl_matched is not None and not df_ppl_matched.empty and df_uploaded_file is not None and not df_uploaded_file.empty:
-                merged_df = merge_spreasheet(df_uploaded_file, df_ppl_matched)
-                print(merged_df)
-            else:
-                st.error("No records matched. Please check the Contributor Names in the spreadsheet and try again.")
-                st.stop()
-
-            # Perform check to make sure that all funds on spreasheet exist in Breeze
-            st.subheader(body='Check Funds',divider='blue')
-            df_auto_contr_recs = merged_df.loc[(merged_df['Manually Enter'] == 'N')]
-            df_manual_contr_recs = merged_df.loc[(merged_df['Manually Enter'] == 'Y')]
-            df_check_funds = check_funds(df_auto_contr_recs, breeze_client)
-            #st.write(df_check_funds)
-            if df_check_funds['Fund Exists'].str.contains('N').any():
-                st.error("ERROR: The following funds do not exist in Breeze. Please manually change the names in the 'Fund' column to match those in Breeze and re-upload the spreadsheet.")
-                st.table(df_check_funds.loc[(df_check_funds['Fund Exists'] == 'N')].iloc[:, :5])
-                st.write("Available funds in Breeze:")
-                st.write(get_all_fund_names(breeze_client))
-                funds_exist = False
-            else:
-                st.success("All funds in the spreadsheet exist in Breeze")
-                funds_exist = True
-            # If funds_exist is False, stop the execution of the rest of the code
-            if not funds_exist:
-                st.stop()
-
-            # Load the contributions into Breeze
-            print(df_auto_contr_recs)
-            st.subheader(body='Load Contributions',divider='grey')
-            st.warning("Please review the contributions to be loaded. If you need to manually enter or change any contribution details, please do so in the spreadsheet file and re-upload.")
-            st.write(f"Contributions to be loaded: {df_auto_contr_recs.count()[0]}")
-            st.write(df_auto_contr_recs.drop(columns=['First_Name','Last_Name']))
-
-            if 'load_contributions' not in st.session_state:
-                st.session_state.load_contributions = False
-            if st.button("Load Contributions"):
-                st.session_state.load_contributions = True
-            if df_auto_contr_recs is not None and st.session_state.load_contributions:
-                with st.spinner("Loading contributions..."):
-                    df_payment_id = load_contributions(breeze_client, df_auto_contr_recs)
-                # Reset the flag after loading the contributions
-                st.session_state.load_contributions = False
-
-                # Display the results
-                st.success("Contributions loaded successfully")
-                st.subheader(body='Results',divider='blue')
-                st.info("Contribution records loaded successfully:")
-                st.write(df_payment_id)
-                st.info("Unmatched contribution records that require manual entry:", icon="❗️")
-                st.caption(":red[Action Required!]")
-                st.write(df_manual_contr_recs)
-
-                # Download the results
-                merged_df.to_excel("/tmp/merged_df.xlsx", index=False)
-                with open("/tmp/merged_df.xlsx", "rb") as f:
-                    all_contr_data = f.read()
-                st.download_button(
-                    label="Download All Contributions Spreadsheet",
-                    data=all_contr_data,
-                    file_name='all_contributions.xlsx',
-                    mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                )
-                df_manual_contr_recs.to_excel("/tmp/df_manual_contr_recs.xlsx", index=False)
-                with open("/tmp/df_manual_contr_recs.xlsx", "rb") as f:
-                    unmatched_contr_data = f.read()
-                st.download_button(
-                    label="Download Unmatched Contributions Spreadsheet",
-                    data=unmatched_contr_data,
-                    file_name='unmatched_contributions.xlsx',
-                    mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                )
-                st.caption("To load more contributions, simply upload another Excel spreadsheet file.")
+        # Timings for this run, shown to admins in the sidebar and logged as one JSON line
+        trace_panel = show_trace_panel(username)
+        with tab1, tracing('contribution_loader') as trace:
+            try:
+                contribution_loader_tab(breeze_client, fund_resolver)
+            finally:
+                if trace_panel is not None:
+                    display_trace(trace, trace_panel)
 
     # Authentication notifications
     elif st.session_state["authentication_status"] == False:
@@ -0,0 +1,130 @@
+"""Load contribution spreadsheets into Breeze from the command line.
+
+Runs the same steps as the Streamlit app (read, match, merge, check funds, load) for each
+.xlsx or .csv file, and writes <file>_all.xlsx (every row, with its Payment ID once loaded),
+<file>_unmatched.xlsx (rows that need manual entry) and <file>_reconciliation.xlsx (totals
+per fund, method and date) to --output-dir, or .csv/.parquet with --format. Uses the same .env,
+people snapshot and load journal as the app, so a file that was partly loaded is resumed
+rather than posted twice.
+
+Gifts that an earlier upload already loaded (same person, date, fund and amount, per the
+journal) are held back and written to <file>_duplicates.xlsx; --allow-duplicates loads them.
+
+Exit status is 1 if any file could not be read, has funds that don't exist in Breeze, or
+had rows that failed to load or were held back as duplicates.
+
+    python contributions_cli.py deposits/*.xlsx --output-dir results [--dry-run] [--jobs 2]
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from utils.api_util import connect_to_breeze
+from utils.export_util import EXPORT_FORMATS, render_export
+from utils.funds_util import FundResolver
+from utils.journal_util import LoadJournal
+from utils.pipeline_util import run_pipeline
+from utils.ppl_util import PeopleDirectory
+from utils.reconcile_util import RECONCILE_GROUPINGS, contribution_statuses, deposit_check, reconcile
+from utils.spreadsheet_util import read_contributions
+from utils.trace_util import tracing
+
+
+def write_export(df, output_dir, file_name, file_format):
+    with open(os.path.join(output_dir, f'{file_name}.{file_format}'), 'wb') as file:
+        file.write(render_export(df, file_format))
+
+
+def load_file(path, output_dir, breeze_client, directory, fund_resolver, journal, dry_run=False,
+              max_workers=None, max_rows=None, file_format='xlsx', allow_duplicates=False):
+    # Run one file through the pipeline and write its result files; returns (ok, summary line)
+    name = os.path.splitext(os.path.basename(path))[0]
+    with tracing(f'cli:{name}'):
+        try:
+            with open(path, 'rb') as file:
+                df_upload = read_contributions(file, path)
+        except Exception as e:
+            return False, f'{path}: Error: {e}'
+        invalid = df_upload['Date'].isna() | df_upload['Amount'].isna()
+        if invalid.any():
+            return False, f'{path}: {int(invalid.sum())} row(s) have a missing or invalid Date or Amount'
+        if df_upload.empty:
+            return True, f'{path}: no contributions'
+
+        result = run_pipeline(df_upload, breeze_client, directory.get(), directory.index(), fund_resolver,
+                              dry_run=dry_run, journal=journal, max_workers=max_workers, max_rows=max_rows,
+                              allow_duplicates=allow_duplicates)
+
+    write_export(result['merged'], output_dir, f'{name}_all', file_format)
+    write_export(result['manual'], output_dir, f'{name}_unmatched', file_format)
+    df_statuses = contribution_statuses(result['auto'], result['manual'], result['errors'], result['held_back'])
+    write_export(reconcile(df_statuses, RECONCILE_GROUPINGS).reset_index(), output_dir, f'{name}_reconciliation',
+                 file_format)
+    if not result['duplicates'].empty:
+        write_export(result['duplicates'], output_dir, f'{name}_duplicates', file_format)
+
+    summary = (f"{path}: ${deposit_check(df_statuses)['upload_total']:,.2f} in {len(result['merged'])} rows, "
+               f"{len(result['auto'])} to load, {len(result['manual'])} for manual entry "
+               f"({len(result['excluded'])} with names too similar to match)")
+    duplicates = len(result['duplicates'])
+    if duplicates:
+        summary += (f"; {duplicates} already loaded from an earlier upload"
+                    + (', loading anyway' if allow_duplicates else f', held back (see {name}_duplicates)'))
+    if not result['missing_funds'].empty:
+        funds = ', '.join(sorted(result['missing_funds']['Fund'].astype(str).unique()))
+        return False, f'{summary}; funds not in Breeze: {funds}'
+    if not result['loaded']:
+        return True, summary + ('; dry run, nothing loaded' if dry_run else '')
+    loaded = int(result['auto']['Payment ID'].notna().sum())
+    summary += f"; {loaded} loaded, {result['skipped']} already loaded by a previous run"
+    if result['errors']:
+        summary += f", {len(result['errors'])} failed"
+    for index, e in result['errors'].items():
+        summary += f"\n  Error ({result['auto'].loc[index, 'Contributor Name']}): {e}"
+    return not result['errors'] and (allow_duplicates or not duplicates), summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='.xlsx or .csv contribution files')
+    parser.add_argument('--output-dir', default='.', help='where the result files are written')
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='xlsx', help='result file format')
+    parser.add_argument('--dry-run', action='store_true', help='match and check funds, but load nothing')
+    parser.add_argument('--jobs', type=int, default=1, help='files processed at the same time')
+    parser.add_argument('--workers', type=int, help='concurrent add_contribution requests per file')
+    parser.add_argument('--max-rows', type=int, help='load at most this many rows per file')
+    parser.add_argument('--refresh-directory', action='store_true', help='fetch the people directory from Breeze')
+    parser.add_argument('--allow-duplicates', action='store_true',
+                        help='also load gifts that an earlier upload already loaded')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    # One client, directory, fund list and journal for all files; the Breeze rate limit is
+    # per API key, and the limiter in api_util is shared by every thread in the process
+    breeze_client = connect_to_breeze()
+    directory = PeopleDirectory(breeze_client)
+    if args.refresh_directory:
+        directory.refresh()
+    fund_resolver = FundResolver(breeze_client)
+    journal = LoadJournal()
+
+    def run(path):
+        try:
+            return load_file(path, args.output_dir, breeze_client, directory, fund_resolver, journal,
+                             dry_run=args.dry_run, max_workers=args.workers, max_rows=args.max_rows,
+                             file_format=args.format, allow_duplicates=args.allow_duplicates)
+        except Exception as e:
+            return False, f'{path}: Error: {e}'
+
+    ok = True
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        # A path given twice (or matched by two globs) is only loaded once
+        for file_ok, summary in executor.map(run, dict.fromkeys(args.paths)):
+            print(summary)
+            ok = ok and file_ok
+    journal.close()
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+import pytest
+import requests
+from unittest.mock import Mock
+from breeze_chms_api.breeze import BreezeError
+from utils.api_util import (BREEZE_POOL_SIZE, REJECTED_STATUS_CODES, TokenBucket, call_with_retry, connect_to_breeze,
+                            error_status_code)
+
+
+def breeze_error(status_code):
+    return BreezeError(Mock(status_code=status_code))
+
+
+def test_error_status_code():
+    assert error_status_code(breeze_error(429)) == 429
+    assert error_status_code(BreezeError('You must provide an API key.')) is None
+
+
+def test_retries_rate_limited_requests(mocker):
+    sleep = mocker.patch('utils.api_util.time.sleep')
+    func = Mock(side_effect=[breeze_error(429), breeze_error(503), 'payment123'])
+
+    assert call_with_retry(func, amount='10.00', backoff=1) == 'payment123'
+    assert func.call_count == 3
+    func.assert_called_with(amount='10.00')
+    # Exponential backoff: 1s then 2s, plus up to 1s of jitter
+    assert 1 <= sleep.call_args_list[0].args[0] < 2
+    assert 2 <= sleep.call_args_list[1].args[0] < 3
+
+
+def test_does_not_retry_client_errors(mocker):
+    mocker.patch('utils.api_util.time.sleep')
+    func = Mock(side_effect=breeze_error(400))
+
+    with pytest.raises(BreezeError):
+        call_with_retry(func)
+    assert func.call_count == 1
+
+
+def test_gives_up_after_retries(mocker):
+    mocker.patch('utils.api_util.time.sleep')
+    func = Mock(side_effect=breeze_error(500))
+
+    with pytest.raises(BreezeError):
+        call_with_retry(func, retries=2)
+    assert func.call_count == 3
+
+
+def test_non_idempotent_calls_only_retry_rejected_requests(mocker):
+    mocker.patch('utils.api_util.time.sleep')
+    func = Mock(side_effect=[breeze_error(429), breeze_error(503), 'payment123'])
+    assert call_with_retry(func, retry_status_codes=REJECTED_STATUS_CODES) == 'payment123'
+
+    # A gateway timeout may come after the gift was created, so it isn't posted again
+    func = Mock(side_effect=[breeze_error(504), 'payment456'])
+    with pytest.raises(BreezeError):
+        call_with_retry(func, retry_status_codes=REJECTED_STATUS_CODES)
+    assert func.call_count == 1
+
+
+def test_token_bucket_waits_for_tokens(mocker):
+    clock = [100.0]
+    mocker.patch('utils.api_util.time.monotonic', side_effect=lambda: clock[0])
+    sleep = mocker.patch('utils.api_util.time.sleep', side_effect=lambda seconds: clock.__setitem__(0, clock[0] + seconds))
+    rate_limiter = TokenBucket(rate=0.5, capacity=2)
+
+    for _ in range(4):
+        rate_limiter.acquire()
+
+    # Two tokens up front, then one every two seconds
+    assert clock[0] == pytest.approx(104.0)
+    assert sleep.call_count == 2
+
+
+def test_connect_to_breeze_uses_keep_alive_session(monkeypatch):
+    monkeypatch.setenv('BREEZE_URL', 'https://example.breezechms.com')
+    monkeypatch.setenv('BREEZE_API_KEY', 'test-key')
+
+    breeze_client = connect_to_breeze()
+
+    assert isinstance(breeze_client.connection, requests.Session)
+    assert breeze_client.connection.get_adapter('https://example.breezechms.com')._pool_maxsize == BREEZE_POOL_SIZE
+    # Each client gets its own session rather than the BreezeApi default shared by every instance
+    assert connect_to_breeze().connection is not breeze_client.connection
@@ -0,0 +1,29 @@
+import io
+import pandas as pd
+import pytest
+from utils.export_util import frame_fingerprint, get_export, render_export
+
+DF = pd.DataFrame({'Date': ['2024-01-07', '2024-01-14'], 'Contributor Name': ['John Doe', 'Mary Smith'],
+                   'Amount': ['100.00', '20.00'], 'id': ['11', None]})
+
+
+@pytest.mark.parametrize('file_format, read', [('xlsx', pd.read_excel), ('csv', pd.read_csv),
+                                               ('parquet', pd.read_parquet)])
+def test_render_export_round_trips(file_format, read):
+    df = read(io.BytesIO(render_export(DF, file_format)))
+    assert df['Contributor Name'].tolist() == ['John Doe', 'Mary Smith']
+
+
+def test_exports_are_rendered_once_per_session_and_rows(mocker):
+    mocker.patch('utils.export_util.st.session_state', {})
+    render = mocker.patch('utils.export_util.render_export', side_effect=lambda df, file_format: file_format.encode())
+
+    assert get_export(DF, 'csv', 'all') == b'csv'
+    get_export(DF, 'csv', 'all')
+    get_export(DF, 'xlsx', 'all')
+    assert render.call_count == 2
+
+    changed = DF.assign(Amount=['100.00', '25.00'])
+    assert frame_fingerprint(changed) != frame_fingerprint(DF)
+    get_export(changed, 'csv', 'all')
+    assert render.call_count == 3
@@ -1,8 +1,13 @@
+import os
 import pytest
+from breeze_chms_api.breeze import BreezeError
+from benchmarks.fake_breeze import FakeBreeze
+from funds import get_funds
 from utils.api_util import connect_to_breeze
 
 class TestGetFunds:
 
+    @pytest.mark.skipif(not os.getenv('BREEZE_API_KEY'), reason='needs live Breeze credentials')
     def test_breeze_api_connection(self):
         breeze_client = connect_to_breeze()
         funds = breeze_client.list_funds()
@@ -10,26 +15,78 @@ class TestGetFunds:
         assert len(funds) > 0
 
     #  Successfully connects to Breeze API and retrieves the list of funds
-    def test_successful_connection_and_retrieval(self, mocker):
-        from utils.funds_util import get_funds
-        from utils.api_util import connect_to_breeze
+    def test_successful_connection_and_retrieval(self):
+        from utils.funds_util import get_all_funds
+
+        funds = get_all_funds(FakeBreeze().client())
+
+        assert funds == get_funds()
+
+    #  Handles the scenario where the API key is missing or incorrect
+    def test_missing_or_incorrect_api_key(self, mocker, monkeypatch):
+        from utils.funds_util import get_all_funds
+
+        monkeypatch.setenv('BREEZE_URL', 'https://example.breezechms.com')
+        monkeypatch.setenv('BREEZE_API_KEY', '')
+        with pytest.raises(BreezeError) as excinfo:
+            connect_to_breeze()
+        assert 'API key' in str(excinfo.value)
+
+        st_error = mocker.patch('utils.funds_util.st.error')
+        assert get_all_funds(FakeBreeze().client(api_key='wrong-key')) is None
+        st_error.assert_called_once()
+
+
+class TestFundResolver:
+
+    FUNDS = [{'id': '1', 'name': 'General Fund'}, {'id': '2', 'name': 'Cemetery'}, {'id': '3', 'name': 'Altar'}]
+
+    #  The fund list is fetched once and each distinct fund is resolved once
+    def test_resolves_each_fund_once(self, mocker):
+        import utils.funds_util as funds_util
+        from utils.funds_util import FundResolver
 
         mock_breeze_client = mocker.Mock()
-        mock_breeze_client.list_funds.return_value = [{'id': 1, 'name': 'General Fund'}]
-        mocker.patch('utils.api_util.connect_to_breeze', return_value=mock_breeze_client)
+        mock_breeze_client.list_funds.return_value = self.FUNDS
+        fund_resolver = FundResolver(mock_breeze_client)
+        fuzz_spy = mocker.spy(funds_util.fuzz, 'partial_ratio')
 
-        funds = get_funds()
+        assert fund_resolver.resolve('Cemetery') == ('2', 'Cemetery', 100)
+        assert fund_resolver.resolve('Cemetery') == ('2', 'Cemetery', 100)
+        assert fund_resolver.resolve('Building')[:2] == (None, None)
+        assert mock_breeze_client.list_funds.call_count == 1
+        assert fuzz_spy.call_count == 2 + 3
 
-        assert funds == [{'id': 1, 'name': 'General Fund'}]
+    #  The fund list is fetched again after invalidate() or once the TTL expires
+    def test_invalidate_and_ttl(self, mocker):
+        from utils.funds_util import FundResolver
 
-    #  Handles the scenario where the API key is missing or incorrect
-    def test_missing_or_incorrect_api_key(self, mocker):
-        from utils.funds_util import get_funds
-        from utils.api_util import connect_to_breeze
+        mock_breeze_client = mocker.Mock()
+        mock_breeze_client.list_funds.return_value = self.FUNDS
+        fund_resolver = FundResolver(mock_breeze_client, ttl=60)
+        monotonic = mocker.patch('utils.funds_util.time.monotonic', return_value=1000)
 
-        mocker.patch('utils.api_util.connect_to_breeze', side_effect=Exception("Invalid API Key"))
+        fund_resolver.resolve('Altar')
+        fund_resolver.invalidate()
+        fund_resolver.resolve('Altar')
+        monotonic.return_value = 1061
+        fund_resolver.resolve('Altar')
+
+        assert mock_breeze_client.list_funds.call_count == 3
+        assert fund_resolver.version == 3
+
+    #  check_funds flags every row and makes a single Breeze call
+    def test_check_funds_shares_resolver(self, mocker):
+        import pandas as pd
+        from utils.funds_util import FundResolver, check_funds, get_all_fund_names
+
+        mock_breeze_client = mocker.Mock()
+        mock_breeze_client.list_funds.return_value = self.FUNDS
+        fund_resolver = FundResolver(mock_breeze_client)
+        df = pd.DataFrame({'Fund': ['Cemetery', 'Building', 'Cemetery', 'General Fund']})
 
-        with pytest.raises(Exception) as excinfo:
-            get_funds()
+        df_check_funds = check_funds(df, mock_breeze_client, fund_resolver)
 
-        assert str(excinfo.value) == "Invalid API Key"
+        assert df_check_funds['Fund Exists'].tolist() == ['Y', 'N', 'Y', 'Y']
+        assert get_all_fund_names(mock_breeze_client, fund_resolver) == ['General Fund', 'Cemetery', 'Altar']
+        assert mock_breeze_client.list_funds.call_count == 1
@@ -0,0 +1,117 @@
+import sqlite3
+import pandas as pd
+from unittest.mock import Mock
+from utils.api_util import TokenBucket
+from utils.journal_util import LoadJournal, contribution_row_keys, find_duplicate_gifts, gift_keys
+from utils.load_contr_util import load_contributions
+
+
+def make_contributions():
+    return pd.DataFrame({
+        'Date': ['2023-01-01', '2023-01-01', '2023-01-01'],
+        'Contributor Name': ['John Doe', 'John Doe', 'Mary Smith'],
+        'id': ['1', '1', '2'],
+        'Method': ['Check', 'Check', 'Cash'],
+        'Fund': ['General Fund', 'General Fund', 'Altar'],
+        'Amount': ['100.00', '100.00', '25.00']
+    })
+
+
+def make_breeze_client():
+    breeze_client = Mock()
+    breeze_client.list_funds.return_value = [{'id': '1', 'name': 'General Fund'}, {'id': '2', 'name': 'Altar'}]
+    breeze_client.add_contribution.side_effect = [f'payment{i}' for i in range(1, 10)]
+    return breeze_client
+
+
+def test_identical_rows_get_distinct_keys():
+    row_keys = contribution_row_keys(make_contributions())
+
+    assert len(set(row_keys)) == 3
+    assert row_keys[0].split(':')[0] == row_keys[1].split(':')[0]
+    assert contribution_row_keys(make_contributions()) == row_keys
+
+
+def test_journal_records_and_finds_payment_ids(tmp_path):
+    journal = LoadJournal(str(tmp_path / 'journal.sqlite'))
+    df = make_contributions()
+    row_keys = contribution_row_keys(df)
+
+    journal.record(row_keys[2], 'payment9', df.iloc[2])
+
+    assert journal.committed(row_keys) == {row_keys[2]: 'payment9'}
+    assert LoadJournal(journal.path).committed(row_keys) == {row_keys[2]: 'payment9'}
+
+
+def test_rerun_skips_committed_rows(tmp_path):
+    journal = LoadJournal(str(tmp_path / 'journal.sqlite'))
+    breeze_client = make_breeze_client()
+    rate_limiter = TokenBucket(rate=1000, capacity=10)
+
+    # Load in two chunks, then re-run the whole file
+    first = load_contributions(breeze_client, make_contributions(), max_workers=1, rate_limiter=rate_limiter,
+                               journal=journal, max_rows=2)
+    second = load_contributions(breeze_client, make_contributions(), max_workers=1, rate_limiter=rate_limiter,
+                                journal=journal)
+    third = load_contributions(breeze_client, make_contributions(), max_workers=1, rate_limiter=rate_limiter,
+                               journal=journal)
+
+    assert first['Payment ID'].tolist() == ['payment1', 'payment2', None]
+    assert second['Payment ID'].tolist() == ['payment1', 'payment2', 'payment3']
+    assert third['Payment ID'].tolist() == ['payment1', 'payment2', 'payment3']
+    assert breeze_client.add_contribution.call_count == 3
+
+
+def test_gifts_loaded_by_an_earlier_upload_are_flagged_and_held_back(tmp_path):
+    journal = LoadJournal(str(tmp_path / 'journal.sqlite'))
+    breeze_client = make_breeze_client()
+    rate_limiter = TokenBucket(rate=1000, capacity=10)
+    load_contributions(breeze_client, make_contributions(), max_workers=1, rate_limiter=rate_limiter, journal=journal)
+
+    # Re-running the same file is a resume, not a duplicate
+    assert find_duplicate_gifts(make_contributions(), journal).empty
+
+    # The same gift entered as cash in a later file, next to a new one
+    df = pd.DataFrame({'Date': ['2023-01-01', '2023-01-08'], 'Contributor Name': ['John Doe', 'John Doe'],
+                       'id': ['1', '1'], 'Method': ['Cash', 'Cash'], 'Fund': ['General Fund', 'General Fund'],
+                       'Amount': ['100.00', '100.00']})
+    duplicates = find_duplicate_gifts(df, journal)
+    assert duplicates.index.tolist() == [0]
+    assert duplicates.loc[0, 'Previous Payment ID'] in ('payment1', 'payment2')
+
+    loaded = load_contributions(breeze_client, df, max_workers=1, rate_limiter=rate_limiter, journal=journal,
+                                hold_back=set(duplicates.index))
+    assert loaded['Payment ID'].tolist() == [None, 'payment4']
+    assert breeze_client.add_contribution.call_count == 4
+
+
+
+def test_a_gift_repeated_in_a_chunked_upload_is_not_its_own_duplicate(tmp_path):
+    journal = LoadJournal(str(tmp_path / 'journal.sqlite'))
+    breeze_client = make_breeze_client()
+    rate_limiter = TokenBucket(rate=1000, capacity=10)
+    # An earlier upload loaded Mary's gift; this one has John's gift twice, keyed in with different methods
+    load_contributions(breeze_client, make_contributions().iloc[[2]], max_workers=1, rate_limiter=rate_limiter,
+                       journal=journal)
+    df = pd.DataFrame({'Date': ['2023-01-01'] * 3, 'Contributor Name': ['John Doe', 'John Doe', 'Mary Smith'],
+                       'id': ['1', '1', '2'], 'Method': ['Check', 'Online', 'Check'],
+                       'Fund': ['General Fund', 'General Fund', 'Altar'], 'Amount': ['100.00', '100.00', '25.00']})
+
+    for expected in (['payment2', None, None], ['payment2', 'payment3', None]):
+        duplicates = find_duplicate_gifts(df, journal)
+        assert duplicates.index.tolist() == [2]
+        loaded = load_contributions(breeze_client, df.copy(), max_workers=1, rate_limiter=rate_limiter,
+                                    journal=journal, max_rows=1, hold_back=set(duplicates.index))
+        assert loaded['Payment ID'].tolist() == expected
+
+def test_older_journals_get_the_gift_index(tmp_path):
+    path = str(tmp_path / 'journal.sqlite')
+    with sqlite3.connect(path) as conn:
+        conn.execute('''create table load_journal (row_key text primary key, payment_id text not null, date text,
+                        person_id text, fund text, amount text, method text, loaded_at text not null)''')
+        conn.execute("insert into load_journal values ('key:0', 'payment1', '2023-01-01', '1', 'General Fund', "
+                     "'100.00', 'Check', '2023-01-02T10:00:00')")
+    conn.close()
+
+    gifts = LoadJournal(path).loaded_gifts(gift_keys(make_contributions()))
+    assert gifts['payment_id'].tolist() == ['payment1']
@@ -1,11 +1,14 @@
 import pandas as pd
 from unittest.mock import Mock
 from utils.funds_util import get_fund_id, get_fund_name
-from code_under_test import load_contributions
+from utils.api_util import TokenBucket
+from utils.load_contr_util import load_contributions, post_contributions
+from utils.reconcile_util import contribution_statuses
 
 def test_adds_contributions_with_valid_data():
     breeze_client = Mock()
     breeze_client.add_contribution.return_value = 'payment123'
+    breeze_client.list_funds.return_value = [{'id': '1', 'name': 'General Fund'}]
 
     df_contribution_recs = pd.DataFrame({
         'Date': ['2023-01-01'],
@@ -35,12 +38,13 @@ def test_handles_empty_dataframe():
 import pandas as pd
 from unittest.mock import Mock
 from utils.funds_util import get_fund_id, get_fund_name
-from code_under_test import load_contributions
+from utils.load_contr_util import load_contributions
 
 
 def test_manages_missing_date_field():
     breeze_client = Mock()
     breeze_client.add_contribution.return_value = 'payment123'
+    breeze_client.list_funds.return_value = [{'id': '1', 'name': 'General Fund'}]
 
     df_contribution_recs = pd.DataFrame({
         'Date': [None],
@@ -54,4 +58,85 @@ def test_manages_missing_date_field():
     result = load_contributions(breeze_client, df_contribution_recs)
 
     assert result.loc[0, 'Payment ID'] == 'payment123'
-    breeze_client.add_contribution.assert_called_once()
\ No newline at end of file
+    breeze_client.add_contribution.assert_called_once()
+
+def fake_breeze_upload(**fake_options):
+    from benchmarks.fake_breeze import FakeBreeze
+    from utils.api_util import TokenBucket
+    from utils.funds_util import FundResolver
+
+    fake_breeze = FakeBreeze(funds=[{'id': '1', 'name': 'General Fund'}, {'id': '2', 'name': 'Altar'}], **fake_options)
+    breeze_client = fake_breeze.client()
+    df_contribution_recs = pd.DataFrame({
+        'Date': ['2024-01-07', '2024-01-14', '2024-01-07'],
+        'Contributor Name': ['John Doe', 'Mary Smith', 'Nick Pappas'],
+        'id': ['11', '12', '13'],
+        'Method': ['Check', 'Cash', 'Check'],
+        'Fund': ['General Fund', 'Altar', 'General Fund'],
+        'Amount': ['100.00', '20.00', '50.00']
+    })
+    return fake_breeze, breeze_client, df_contribution_recs, dict(
+        fund_resolver=FundResolver(breeze_client), rate_limiter=TokenBucket(rate=1000, capacity=1000))
+
+
+def test_submits_one_batch_group_per_date():
+    from utils.load_contr_util import load_contributions
+    fake_breeze, breeze_client, df_contribution_recs, options = fake_breeze_upload()
+
+    result = load_contributions(breeze_client, df_contribution_recs, **options)
+
+    groups = {contribution['person_id']: contribution['group'] for contribution in fake_breeze.contributions}
+    assert groups['11'] == groups['13'] != groups['12']
+    assert groups['11'].endswith('-20240107') and groups['12'].endswith('-20240114')
+    assert sorted(result['Payment ID']) == sorted(c['payment_id'] for c in fake_breeze.contributions)
+
+
+def test_group_id_is_stable_for_the_same_upload():
+    from utils.journal_util import contribution_row_keys
+    from utils.load_contr_util import generate_group_id
+    _, _, df_contribution_recs, _ = fake_breeze_upload()
+
+    row_keys = contribution_row_keys(df_contribution_recs)
+    assert generate_group_id(row_keys) == generate_group_id(list(row_keys))
+    assert generate_group_id(row_keys) != generate_group_id(row_keys[:2])
+    assert generate_group_id() != generate_group_id()
+
+
+def test_retries_transient_breeze_failures(mocker):
+    from utils.load_contr_util import load_contributions
+    mocker.patch('utils.api_util.time.sleep')
+    fake_breeze, breeze_client, df_contribution_recs, options = fake_breeze_upload(failure_rate=0.5, seed=3)
+
+    result = load_contributions(breeze_client, df_contribution_recs, **options)
+
+    assert fake_breeze.failure_count > 0
+    assert result['Payment ID'].notna().all()
+    # Failed requests never reached the account, so every row was added exactly once
+    assert sorted(c['person_id'] for c in fake_breeze.contributions) == ['11', '12', '13']
+
+
+def test_failed_rows_are_reported_by_index():
+    breeze_client = Mock()
+    breeze_client.list_funds.return_value = [{'id': '1', 'name': 'General Fund'}]
+    breeze_client.add_contribution.side_effect = lambda **params: (
+        'payment123' if params['name'] == 'John Doe' else (_ for _ in ()).throw(RuntimeError('Gateway Timeout')))
+
+    df_contribution_recs = pd.DataFrame({
+        'Date': ['2023-01-01'] * 4,
+        'Contributor Name': ['John Doe', 'Mary Smith', 'Nick Pappas', 'Eleni Pappas'],
+        'id': [1, 2, 3, 4],
+        'Method': ['Check'] * 4,
+        'Fund': ['General Fund', 'General Fund', 'General Fund', 'Festival'],
+        'Amount': [100.0, 20.0, 50.0, 10.0]
+    }, index=[5, 6, 7, 8])
+
+    result, skipped, errors = post_contributions(breeze_client, df_contribution_recs, max_workers=1,
+                                                 rate_limiter=TokenBucket(rate=1e9, capacity=1e9), hold_back={7})
+
+    assert result['Payment ID'].tolist() == ['payment123', None, None, None]
+    # Mary's and Eleni's posts failed, and Nick was held back so never posted
+    assert sorted(errors) == [6, 8]
+    assert str(errors[6]) == 'Gateway Timeout'
+    assert breeze_client.add_contribution.call_count == 3
+    statuses = contribution_statuses(result, df_contribution_recs.iloc[:0], errors, {7})
+    assert statuses['Status'].tolist() == ['Loaded', 'Failed', 'Held Back', 'Failed']
@@ -0,0 +1,144 @@
+import random
+import pandas as pd
+from thefuzz import fuzz
+from utils.match_util import PeopleIndex, name_columns, normalize_name, similar_name_clusters, soundex
+
+
+def make_people():
+    return pd.DataFrame({
+        'id': ['1', '2', '3', '4'],
+        'first_name': ['John', 'Jon', 'Maria', 'Georgios'],
+        'last_name': ['Smith', 'Smith', 'Haddad', 'Markopoulos'],
+    })
+
+
+def make_unmatched(names):
+    return pd.DataFrame({
+        'Contributor Name': names,
+        'First_Name': [name.split()[0] for name in names],
+        'Last_Name': [name.split()[1] if len(name.split()) > 1 else None for name in names],
+    }, index=[10 + i for i in range(len(names))])
+
+
+def test_soundex():
+    assert soundex('Robert') == 'R163'
+    assert soundex('Rupert') == 'R163'
+    assert soundex('Ashcraft') == 'A261'
+    assert soundex('') == ''
+
+
+def test_matches_above_threshold_only():
+    df_matched, matched_labels = PeopleIndex(make_people()).match_frame(
+        make_unmatched(['Maria Hadad', 'Georgios Markopoulo', 'Nobody Here']))
+
+    assert matched_labels == [10, 11]
+    assert df_matched['id'].tolist() == ['3', '4']
+    assert df_matched['Contributor Name'].tolist() == ['Maria Hadad', 'Georgios Markopoulo']
+
+
+def test_ties_go_to_first_person_in_directory():
+    people_index = PeopleIndex(make_people())
+    pos, score, questionable_matches = people_index.match('John Smith', 'John', 'Smith')
+
+    assert (pos, score) == (0, 100)
+    assert (1, fuzz.partial_ratio('John Smith', 'Jon Smith')) in questionable_matches
+
+
+def test_blocked_index_agrees_with_exhaustive_scan():
+    people = make_people()
+    unmatched = make_unmatched(['Jon Smth', 'Mari Haddad', 'George Markopoulos', 'Smith'])
+
+    blocked = PeopleIndex(people).match_frame(unmatched)
+    exhaustive = PeopleIndex(people, exhaustive=True).match_frame(unmatched)
+
+    assert blocked[1] == exhaustive[1]
+    assert blocked[0]['id'].tolist() == exhaustive[0]['id'].tolist()
+
+
+def repeated_letter_names(rng, count):
+    # Names like 'Bbbbbba Aaaaa', whose repeated n-grams a filter on distinct n-grams undercounts
+    def part(length):
+        letter, other = rng.sample('ab', 2)
+        return ''.join(rng.choice([letter, letter, letter, other]) for _ in range(length)).title()
+    return [(part(rng.randint(2, 8)), part(rng.randint(2, 9))) for _ in range(count)]
+
+
+def test_blocked_index_agrees_with_exhaustive_scan_on_repeated_letters():
+    rng = random.Random(0)
+    people = pd.DataFrame(repeated_letter_names(rng, 200), columns=['first_name', 'last_name'])
+    people['id'] = people.index.astype(str)
+    unmatched = make_unmatched([f'{first} {last}' for first, last in repeated_letter_names(rng, 200)])
+
+    blocked = PeopleIndex(people).match_frame(unmatched)
+    exhaustive = PeopleIndex(people, exhaustive=True).match_frame(unmatched)
+
+    assert blocked[1] == exhaustive[1]
+    assert blocked[0]['id'].tolist() == exhaustive[0]['id'].tolist()
+
+
+def test_normalize_name():
+    names = pd.Series(['  Élias ', 'KATERÍNA', 'Mary  Ann', None])
+
+    assert normalize_name(names).tolist() == ['elias', 'katerina', 'mary ann', '']
+    assert normalize_name(pd.Series(["O'Brien", 'Smith-Jones', 'Jr.', 'Γεώργιος'])).tolist() == \
+        ['obrien', 'smith jones', 'jr', 'georgios']
+
+
+def test_name_columns():
+    keys = name_columns(pd.Series(['George', 'KATERINA']), pd.Series(['Markopoulos', 'Pappas']))
+
+    assert keys['_alias_key'].tolist() == ['georgios', 'aikaterini']
+    assert keys['_full_name'].tolist() == ['george markopoulos', 'katerina pappas']
+    assert keys['_phonetic_key'].tolist() == ['g:M621', 'a:P120']
+
+
+def test_exact_match_frame_joins_on_first_name_aliases():
+    people = pd.concat([make_people(), pd.DataFrame({'id': ['5', '6'], 'first_name': ['Nikolaos', 'Nicholas'],
+                                                     'last_name': ['Pappas', 'Pappas']})], ignore_index=True)
+    upload = make_unmatched(['George Markopoulos', 'Nikos Pappas', 'Nick Pappas'])
+
+    df_matched, df_unmatched = PeopleIndex(people).exact_match_frame(upload)
+
+    # Nikos could be either Nicholas or Nikolaos Pappas, so it is left to the fuzzy phase
+    assert df_matched['id'].tolist() == ['4']
+    assert df_unmatched.index.tolist() == [11, 12]
+
+
+def test_exact_match_frame_joins_on_normalized_names():
+    people = pd.concat([make_people(), pd.DataFrame({'id': ['5'], 'first_name': ['Maria'], 'last_name': ['Haddad']})],
+                       ignore_index=True)
+    upload = make_unmatched(['maria HADDAD', 'Jon Smith', 'Georgios Markopoulo'])
+
+    df_matched, df_unmatched = PeopleIndex(people).exact_match_frame(upload)
+
+    # Every directory entry with the same name is returned, in directory order
+    assert df_matched['id'].tolist() == ['3', '5', '2']
+    assert df_matched['Contributor Name'].tolist() == ['maria HADDAD', 'maria HADDAD', 'Jon Smith']
+    assert df_unmatched.index.tolist() == [12]
+
+
+def test_similar_name_clusters():
+    names = ['John Smith', 'Jon Smith', 'John Smith', 'Mary Haddad', 'Jonn Smith', 'Maria Hadad', 'George Khoury']
+
+    clusters = similar_name_clusters(names)
+
+    assert clusters == [['John Smith', 'Jon Smith', 'Jonn Smith'], ['Mary Haddad', 'Maria Hadad']]
+
+
+def test_check_similar_names_matches_all_pairs_scan():
+    from utils.ppl_util import check_similar_names
+
+    names = ['John Smith', 'Jon Smith', 'John Smith', 'Ann Lee', 'Anne Lee', 'Al', 'Ali', 'George Khoury']
+    expected = [name for name in names
+                if max(fuzz.ratio(name, other) for other in names if other != name) > 80]
+
+    assert check_similar_names(pd.DataFrame({'Contributor Name': names})) == expected
+
+
+def test_similar_name_clusters_find_names_with_repeated_letters():
+    pairs = [('Aaaaab Aaaaaa', 'Aaaaaa Aaaaaa'), ('Aaaaaa Aaaaaaa', 'Aaaab Abaaaaaa'),
+             ('Bbbbb Aaaaaaaa', 'Bbbbaa Aaabaaaa')]
+
+    for pair in pairs:
+        assert fuzz.ratio(*pair) > 80
+        assert similar_name_clusters(pair) == [list(pair)]
@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from benchmarks.fake_breeze import FakeBreeze
+from contributions_cli import load_file, main
+from utils.api_util import TokenBucket
+from utils.funds_util import FundResolver
+from utils.journal_util import LoadJournal
+from utils.pipeline_util import run_pipeline
+from utils.ppl_util import PeopleDirectory
+from utils.spreadsheet_util import normalize_contributions
+
+FUNDS = [{'id': '1', 'name': 'General Fund'}, {'id': '2', 'name': 'Altar'}]
+PEOPLE = pd.DataFrame({'id': ['11', '12', '13'], 'first_name': ['John', 'Mary', 'Nick'],
+                       'last_name': ['Doe', 'Smith', 'Pappas'], 'force_first_name': '', 'path': ''})
+
+
+def upload(funds=('General Fund', 'Altar', 'General Fund', 'Altar')):
+    return normalize_contributions(pd.DataFrame({
+        'Date': ['2024-01-07', '2024-01-07', '2024-01-14', '2024-01-14'],
+        'Contributor Name': ['John Doe', 'Mary Smith', 'Nick Pappas', 'Zed Unknown'],
+        'Amount': [100, 20, 50, 10],
+        'Fund': list(funds),
+        'Method': ['Check', 'Cash', 'Check', 'Cash'],
+    }))
+
+
+def run(fake_breeze, df_upload, **kwargs):
+    breeze_client = fake_breeze.client()
+    people = PEOPLE.drop(columns=['force_first_name', 'path'])
+    return run_pipeline(df_upload, breeze_client, people, fund_resolver=FundResolver(breeze_client),
+                        rate_limiter=TokenBucket(rate=1e9, capacity=1e9), **kwargs)
+
+
+def test_loads_matched_rows_and_flags_the_rest():
+    fake_breeze = FakeBreeze(funds=FUNDS, people=PEOPLE)
+    result = run(fake_breeze, upload())
+
+    assert result['loaded']
+    assert len(fake_breeze.contributions) == 3
+    assert result['manual']['Contributor Name'].tolist() == ['Zed Unknown']
+    assert result['merged']['Payment ID'].notna().sum() == 3
+
+
+def test_dry_run_loads_nothing():
+    fake_breeze = FakeBreeze(funds=FUNDS, people=PEOPLE)
+    result = run(fake_breeze, upload(), dry_run=True)
+
+    assert not result['loaded']
+    assert len(result['auto']) == 3
+    assert fake_breeze.contributions == []
+
+
+def test_missing_funds_block_the_load():
+    fake_breeze = FakeBreeze(funds=FUNDS, people=PEOPLE)
+    result = run(fake_breeze, upload(funds=('General Fund', 'Festival', 'General Fund', 'Altar')))
+
+    assert not result['loaded']
+    assert result['missing_funds']['Fund'].tolist() == ['Festival']
+    assert fake_breeze.contributions == []
+
+
+def test_cli_writes_result_files_and_resumes(tmp_path, mocker):
+    mocker.patch('utils.load_contr_util.breeze_rate_limiter', return_value=TokenBucket(rate=1e9, capacity=1e9))
+    fake_breeze = FakeBreeze(funds=FUNDS, people=PEOPLE)
+    breeze_client = fake_breeze.client()
+    path = tmp_path / 'deposit.csv'
+    upload().drop(columns=['First_Name', 'Last_Name']).to_csv(path, index=False)
+    directory = PeopleDirectory(breeze_client, path=str(tmp_path / 'people.parquet'))
+    journal = LoadJournal(str(tmp_path / 'journal.sqlite'))
+
+    for _ in range(2):
+        ok, summary = load_file(str(path), str(tmp_path), breeze_client, directory, FundResolver(breeze_client), journal)
+        assert ok, summary
+
+    assert len(fake_breeze.contributions) == 3
+    assert '3 already loaded by a previous run' in summary
+    assert len(pd.read_excel(tmp_path / 'deposit_all.xlsx')) == 4
+    assert pd.read_excel(tmp_path / 'deposit_unmatched.xlsx')['Contributor Name'].tolist() == ['Zed Unknown']
+    assert pd.read_excel(tmp_path / 'deposit_reconciliation.xlsx')['Loaded Amount'].sum() == 170
+
+
+def test_gifts_from_an_earlier_upload_are_held_back(tmp_path):
+    fake_breeze = FakeBreeze(funds=FUNDS, people=PEOPLE)
+    journal = LoadJournal(str(tmp_path / 'journal.sqlite'))
+    run(fake_breeze, upload(), journal=journal)
+
+    # The same deposit again, with the methods keyed in differently
+    later = upload().assign(Method='Online')
+    result = run(fake_breeze, later, journal=journal)
+    assert len(result['duplicates']) == 3
+    assert result['auto']['Payment ID'].isna().all()
+    assert len(fake_breeze.contributions) == 3
+
+    result = run(fake_breeze, later, journal=journal, allow_duplicates=True)
+    assert result['auto']['Payment ID'].notna().all()
+    assert len(fake_breeze.contributions) == 6
+
+
+def test_parallel_loads_of_the_same_upload_post_each_gift_once(tmp_path):
+    fake_breeze = FakeBreeze(funds=FUNDS, people=PEOPLE, latency=0.05)
+    journal = LoadJournal(str(tmp_path / 'journal.sqlite'))
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(lambda _: run(fake_breeze, upload(), journal=journal), range(2)))
+
+    assert len(fake_breeze.contributions) == 3
+    # Whichever load went second found every row already journaled
+    assert sorted(result['skipped'] for result in results) == [0, 3]
+    assert all(result['auto']['Payment ID'].notna().all() for result in results)
+
+
+def test_cli_loads_a_repeated_path_once(tmp_path, mocker, capsys):
+    mocker.patch('utils.load_contr_util.breeze_rate_limiter', return_value=TokenBucket(rate=1e9, capacity=1e9))
+    fake_breeze = FakeBreeze(funds=FUNDS, people=PEOPLE)
+    mocker.patch('contributions_cli.connect_to_breeze', return_value=fake_breeze.client())
+    mocker.patch('contributions_cli.PeopleDirectory',
+                 return_value=PeopleDirectory(fake_breeze.client(), path=str(tmp_path / 'people.parquet')))
+    mocker.patch.dict('os.environ', {'BREEZE_LOAD_JOURNAL': str(tmp_path / 'journal.sqlite')})
+    path = tmp_path / 'deposit.csv'
+    upload().drop(columns=['First_Name', 'Last_Name']).to_csv(path, index=False)
+
+    assert main([str(path), str(path), '--output-dir', str(tmp_path), '--jobs', '2']) == 0
+    assert len(fake_breeze.contributions) == 3
+    assert capsys.readouterr().out.count(str(path)) == 1
@@ -0,0 +1,53 @@
+import os
+from unittest.mock import Mock
+from utils.ppl_util import PeopleDirectory
+
+PEOPLE = [
+    {'id': '1', 'first_name': 'John', 'force_first_name': 'John', 'last_name': 'Doe', 'thumb_path': '', 'path': ''},
+    {'id': '2', 'first_name': 'Mary', 'force_first_name': 'Mary', 'last_name': 'Smith', 'thumb_path': '', 'path': ''},
+]
+
+
+def make_breeze_client():
+    breeze_client = Mock()
+    breeze_client.list_people.return_value = PEOPLE
+    return breeze_client
+
+
+def test_directory_is_fetched_once(tmp_path):
+    breeze_client = make_breeze_client()
+    directory = PeopleDirectory(breeze_client, path=str(tmp_path / 'people.parquet'))
+
+    people = directory.get()
+    directory.get()
+
+    assert people['id'].tolist() == ['1', '2']
+    assert 'path' not in people.columns
+    assert breeze_client.list_people.call_count == 1
+    assert directory.index() is directory.index()
+
+
+def test_cold_start_reads_snapshot(tmp_path):
+    path = str(tmp_path / 'people.parquet')
+    PeopleDirectory(make_breeze_client(), path=path).get()
+
+    breeze_client = make_breeze_client()
+    people = PeopleDirectory(breeze_client, path=path).get()
+
+    assert people['last_name'].tolist() == ['Doe', 'Smith']
+    breeze_client.list_people.assert_not_called()
+
+
+def test_stale_snapshot_and_refresh(tmp_path):
+    path = str(tmp_path / 'people.parquet')
+    PeopleDirectory(make_breeze_client(), path=path).get()
+    os.utime(path, (0, 0))
+
+    breeze_client = make_breeze_client()
+    directory = PeopleDirectory(breeze_client, path=path, ttl=60)
+    directory.get()
+    version = directory.version
+    directory.refresh()
+
+    assert breeze_client.list_people.call_count == 2
+    assert directory.version == version + 1
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+from utils.reconcile_util import RECONCILE_GROUPINGS, contribution_statuses, deposit_check, reconcile
+
+
+def statuses():
+    # One loaded, one failed, one held back and one deferred row, plus one for manual entry
+    loaded = pd.DataFrame({
+        'Date': pd.to_datetime(['2024-01-07', '2024-01-07', '2024-01-14', '2024-01-14', '2024-01-14']),
+        'Fund': ['General Fund', 'Altar', 'General Fund', 'General Fund', 'Altar'],
+        'Method': ['Check', 'Cash', 'Check', 'Check', 'Cash'],
+        'Amount_Cents': pd.array([10000, 2050, 5000, 700, 300], dtype='Int64'),
+        'Payment ID': ['p1', None, 'p3', None, None],
+    }, index=[10, 11, 12, 13, 14])
+    manual = pd.DataFrame({
+        'Date': pd.to_datetime(['2024-01-14']),
+        'Fund': ['Altar'],
+        'Method': ['Cash'],
+        'Amount_Cents': pd.array([1000], dtype='Int64'),
+    })
+    return contribution_statuses(loaded, manual, errors={11: RuntimeError('Gateway Timeout')}, held_back={13})
+
+
+def test_statuses():
+    assert statuses()['Status'].tolist() == ['Loaded', 'Failed', 'Loaded', 'Held Back', 'Deferred', 'Manual']
+
+
+def test_reconcile_by_fund():
+    report = reconcile(statuses(), 'Fund')
+
+    assert report.loc['General Fund', 'Loaded Count'] == 2
+    assert report.loc['General Fund', 'Loaded Amount'] == 150.0
+    assert report.loc['General Fund', 'Held Back Amount'] == 7.0
+    # Only rows that were posted count as submitted
+    assert report.loc['General Fund', 'Submitted Count'] == 2
+    assert report.loc['Altar', 'Submitted Count'] == 1
+    assert report.loc['Altar', 'Failed Amount'] == 20.5
+    assert report.loc['Altar', 'Deferred Amount'] == 3.0
+    assert report.loc['Altar', 'Manual Amount'] == 10.0
+    assert report.loc['Altar', 'Loaded Count'] == 0
+
+
+def test_reconcile_by_all_groupings():
+    report = reconcile(statuses(), RECONCILE_GROUPINGS).reset_index()
+
+    assert len(report) == 4
+    amounts = ['Loaded Amount', 'Failed Amount', 'Held Back Amount', 'Deferred Amount', 'Manual Amount']
+    assert report[amounts].sum().sum() == 190.5
+    assert report['Submitted Amount'].sum() == 170.5
+
+
+def test_deposit_check():
+    check = deposit_check(statuses(), expected_total=190.50)
+    assert check['upload_total'] == 190.5
+    assert (check['failed_total'], check['held_back_total'], check['deferred_total']) == (20.5, 7.0, 3.0)
+    assert check['difference'] == 0
+    assert not check['balanced']    # not every row was loaded
+
+    loaded = statuses().query("Status in ['Loaded', 'Manual']")
+    check = deposit_check(loaded, expected_total=170)
+    assert check['difference'] == -10
+    assert not check['balanced']
+    assert deposit_check(loaded, expected_total=160)['balanced']
+
+
+@pytest.mark.filterwarnings('error::FutureWarning')
+def test_nothing_loaded_without_payment_ids():
+    df_statuses = contribution_statuses(statuses().query("Status != 'Manual'").drop(columns=['Status', 'Payment ID']),
+                                        pd.DataFrame(columns=['Date', 'Fund', 'Method', 'Amount_Cents']))
+    assert set(df_statuses['Status']) == {'Deferred'}
+    assert df_statuses['Amount_Cents'].dtype == 'Int64'
+
+
+def test_empty_upload_has_no_statuses():
+    empty = pd.DataFrame(columns=['Date', 'Fund', 'Method', 'Amount_Cents'])
+    df_statuses = contribution_statuses(empty, empty)
+    assert df_statuses.empty
+    assert 'Status' in df_statuses.columns
+    assert deposit_check(df_statuses)['upload_total'] == 0
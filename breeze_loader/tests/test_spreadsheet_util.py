@@ -0,0 +1,74 @@
+import io
+import pandas as pd
+import pytest
+from unittest.mock import Mock
+from utils.journal_util import contribution_row_keys
+from utils.load_contr_util import contribution_params
+from utils.spreadsheet_util import merge_spreasheet, read_contribution_chunks, read_contributions
+
+ROWS = pd.DataFrame({
+    'Date': ['2023-01-01', '2023-01-08', '2023-01-15'],
+    'Contributor Name': ['John Doe', ' Mary Ann Smith ', 'Cher'],
+    'Amount': ['100.00', '$1,250.50', 'ten'],
+    'Fund': ['General Fund ', 'Cemetery', None],
+    'Method': ['Check', 'Direct Deposit', 'Cash'],
+})
+
+
+def to_xlsx(df):
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        df.to_excel(writer, sheet_name='Sheet1', index=False)
+    output.seek(0)
+    return output
+
+
+def to_csv(df):
+    return io.BytesIO(df.to_csv(index=False).encode())
+
+
+@pytest.mark.parametrize('file_name, make_file', [('gifts.xlsx', to_xlsx), ('gifts.CSV', to_csv)])
+def test_reads_in_chunks(file_name, make_file):
+    chunks = list(read_contribution_chunks(make_file(ROWS), file_name, chunk_size=2))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert list(chunks[0].columns) == list(ROWS.columns)
+
+
+@pytest.mark.parametrize('file_name, make_file', [('gifts.xlsx', to_xlsx), ('gifts.csv', to_csv)])
+def test_normalizes_columns(file_name, make_file):
+    df = read_contributions(make_file(ROWS), file_name, chunk_size=2)
+
+    assert df['Date'].dt.strftime('%Y-%m-%d').tolist()[:2] == ['2023-01-01', '2023-01-08']
+    assert df['Amount'].tolist()[:2] == [100.0, 1250.5]
+    assert pd.isna(df.loc[2, 'Amount'])
+    assert df['Fund'].tolist()[:2] == ['General Fund', 'Cemetery']
+    assert pd.isna(df.loc[2, 'Fund'])
+    assert df['First_Name'].tolist() == ['John', 'Mary', 'Cher']
+    assert df['Last_Name'].tolist()[:2] == ['Doe', 'Ann']
+    assert pd.isna(df.loc[2, 'Last_Name'])
+
+
+def test_missing_columns_are_reported():
+    with pytest.raises(ValueError, match='Missing column\\(s\\): Fund, Method'):
+        read_contributions(to_csv(ROWS.drop(columns=['Fund', 'Method'])), 'gifts.csv')
+
+
+def test_merge_keeps_dates_and_amounts_typed():
+    upload = read_contributions(to_csv(ROWS.assign(Amount=['100.00', '$1,250.50', '0.29'])), 'gifts.csv')
+    matched = pd.DataFrame({'Contributor Name': ['John Doe', 'Mary Ann Smith'], 'id': ['11', '12']})
+
+    merged = merge_spreasheet(upload, matched)
+
+    assert merged['Manually Enter'].tolist() == ['N', 'N', 'Y']
+    assert pd.api.types.is_datetime64_any_dtype(merged['Date'])
+    assert merged['Amount_Cents'].tolist() == [10000, 125050, 29]
+    assert merged['Amount'].sum() == pytest.approx(1350.79)
+
+    # Formatted only for Breeze, and the journal keys match the old string columns
+    fund_resolver = Mock(**{'resolve.return_value': ('1', 'General Fund', 100)})
+    params = contribution_params(merged.iloc[1].to_dict(), fund_resolver, group='g')
+    assert (params['date'], params['amount']) == ('2023-01-08', '1250.50')
+    legacy = merged.assign(Date=merged['Date'].dt.strftime('%Y-%m-%d'),
+                           Amount=merged['Amount'].map('{:.2f}'.format)).drop(columns=['Amount_Cents'])
+    assert contribution_row_keys(merged) == contribution_row_keys(legacy)
@@ -0,0 +1,32 @@
+import io
+from unittest.mock import Mock
+from utils.stage_util import StageCache, file_hash
+
+
+def test_stage_is_recomputed_only_when_its_key_changes():
+    stages = StageCache()
+    compute = Mock(side_effect=['first', 'second'])
+
+    assert stages.run('match', ('file1', 1), compute) == 'first'
+    assert stages.run('match', ('file1', 1), compute) == 'first'
+    assert compute.call_count == 1
+
+    # A new directory version changes the key, so the stage runs again
+    assert stages.run('match', ('file1', 2), compute) == 'second'
+    assert compute.call_count == 2
+
+
+def test_stages_are_cached_independently():
+    stages = StageCache()
+    upload, match = Mock(return_value='rows'), Mock(return_value='matches')
+    for version in (1, 1, 2):
+        stages.run('upload', 'file1', upload)
+        stages.run('match', ('file1', version), match)
+
+    assert upload.call_count == 1
+    assert match.call_count == 2
+
+
+def test_file_hash_depends_on_content_only():
+    assert file_hash(io.BytesIO(b'a,b\n1,2\n')) == file_hash(io.BytesIO(b'a,b\n1,2\n'))
+    assert file_hash(io.BytesIO(b'a,b\n1,2\n')) != file_hash(io.BytesIO(b'a,b\n1,3\n'))
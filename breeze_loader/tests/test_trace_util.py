@@ -0,0 +1,52 @@
+import json
+import pandas as pd
+from unittest.mock import Mock
+from benchmarks.fake_breeze import FakeBreeze
+from utils.api_util import TokenBucket, call_with_retry
+from utils.load_contr_util import load_contributions
+from utils.trace_util import count, current_trace, span, trace_logger, tracing
+
+
+def test_spans_and_counters_are_aggregated(mocker):
+    mocker.patch.object(trace_logger(), 'info')
+    with tracing('run') as trace:
+        for _ in range(3):
+            with span('step'):
+                count('rows', 2)
+
+    data = trace.to_dict()
+    assert data['spans']['step']['calls'] == 3
+    assert data['counters'] == {'rows': 6}
+    assert current_trace() is None
+
+
+def test_nothing_is_recorded_without_a_trace():
+    with span('step'):
+        count('rows')
+    assert current_trace() is None
+
+
+def test_trace_is_logged_as_one_json_line(mocker):
+    info = mocker.patch.object(trace_logger(), 'info')
+    with tracing('run'):
+        call_with_retry(Mock(__name__='list_funds', return_value=[]))
+
+    data = json.loads(info.call_args.args[0])
+    assert data['trace'] == 'run'
+    assert data['counters'] == {'api_calls': 1}
+    assert data['spans']['api.list_funds']['calls'] == 1
+
+
+def test_worker_api_calls_are_traced(mocker):
+    mocker.patch.object(trace_logger(), 'info')
+    breeze_client = FakeBreeze(funds=[{'id': '1', 'name': 'General Fund'}]).client()
+    df = pd.DataFrame({'Date': ['2024-01-07'] * 5, 'Contributor Name': [f'Giver {i}' for i in range(5)],
+                       'id': [str(i) for i in range(5)], 'Method': 'Check', 'Fund': 'General Fund', 'Amount': '10.00'})
+
+    with tracing('load') as trace:
+        load_contributions(breeze_client, df, max_workers=4, rate_limiter=TokenBucket(rate=1e9, capacity=1e9))
+
+    data = trace.to_dict()
+    assert data['spans']['api.add_contribution']['calls'] == len(df)
+    assert data['counters']['load.submitted'] == len(df)
+    assert data['counters']['api_calls'] == len(df) + 1     # plus the fund list
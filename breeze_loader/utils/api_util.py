@@ -1,8 +1,37 @@
 import os
+import random
+import threading
+import time
+import requests
 from dotenv import load_dotenv
 from breeze_chms_api import breeze
+from requests.adapters import HTTPAdapter
+from utils.trace_util import count, span
 
-def connect_to_breeze():
+# Breeze allows roughly 20 API requests per minute per account
+BREEZE_RATE_LIMIT_PER_MINUTE = 20
+BREEZE_RATE_LIMIT_BURST = 1
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+# Responses where Breeze turned the request away before acting on it. Only these are safe to
+# retry for calls that create something (add_contribution): after a 500/502/504 the gift may
+# already exist, and posting it again would record it twice.
+REJECTED_STATUS_CODES = {429, 503}
+# Keep-alive connections to Breeze; at least as many as the loader's worker threads
+BREEZE_POOL_SIZE = 10
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def breeze_session(pool_size=BREEZE_POOL_SIZE):
+    # requests session that keeps connections to Breeze open between calls
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    return session
+
+
+def connect_to_breeze(connection=None):
     load_dotenv('.env')
 
     breeze_url = os.getenv("BREEZE_URL")
@@ -12,11 +41,81 @@ def connect_to_breeze():
 
     breeze_client = breeze.BreezeApi(
         breeze_url=breeze_url,
-        api_key=api_key)
+        api_key=api_key,
+        connection=connection or breeze_session())
 
     return breeze_client
 
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # Block until a token is available, then take it
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def breeze_rate_limiter():
+    # One bucket per process, since the Breeze limit applies to the whole API key
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            per_minute = float(os.getenv('BREEZE_RATE_LIMIT_PER_MINUTE', BREEZE_RATE_LIMIT_PER_MINUTE))
+            burst = int(os.getenv('BREEZE_RATE_LIMIT_BURST', BREEZE_RATE_LIMIT_BURST))
+            _rate_limiter = TokenBucket(per_minute / 60, burst)
+        return _rate_limiter
+
+
+def error_status_code(error):
+    # BreezeError nests the failed requests.Response in its args; dig out its status code
+    stack = [error]
+    while stack:
+        item = stack.pop()
+        if hasattr(item, 'status_code'):
+            return item.status_code
+        if isinstance(item, BaseException):
+            stack.extend(item.args)
+        elif isinstance(item, (tuple, list)):
+            stack.extend(item)
+    return None
+
+
+def call_with_retry(func, *args, rate_limiter=None, retries=4, backoff=2.0, retry_status_codes=RETRY_STATUS_CODES,
+                    **kwargs):
+    # Call a Breeze API method, waiting on the rate limiter before each attempt and
+    # retrying with exponential backoff (plus jitter) on 429 and 5xx responses. Calls that
+    # aren't safe to repeat pass retry_status_codes=REJECTED_STATUS_CODES.
+    for attempt in range(retries + 1):
+        if rate_limiter is not None:
+            with span('api.rate_limit_wait'):
+                rate_limiter.acquire()
+        count('api_calls')
+        try:
+            with span(f'api.{getattr(func, "__name__", "call")}'):
+                return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == retries or error_status_code(e) not in retry_status_codes:
+                raise
+            count('api_retries')
+            time.sleep(backoff * 2 ** attempt + random.uniform(0, backoff))
+
 # test connection
 # breeze_client = connect_to_breeze()
 # funds = breeze_client.list_funds()
-# print(funds)
\ No newline at end of file
+# print(funds)
@@ -0,0 +1,64 @@
+import io
+import pandas as pd
+import streamlit as st
+
+# file extension -> MIME type
+EXPORT_FORMATS = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def render_export(df, file_format):
+    # Write the DataFrame to an in-memory file, the same way generate_template does
+    output = io.BytesIO()
+    if file_format == 'xlsx':
+        with pd.ExcelWriter(output, engine='xlsxwriter', date_format='yyyy-mm-dd', datetime_format='yyyy-mm-dd') as writer:
+            df.to_excel(writer, sheet_name='Sheet1', index=False)
+    elif file_format == 'csv':
+        df.to_csv(output, index=False, date_format='%Y-%m-%d')
+    elif file_format == 'parquet':
+        # Parquet needs one type per column; mixed object columns are written as text
+        df.astype({column: str for column in df.columns if df[column].dtype == object}).to_parquet(output, index=False)
+    else:
+        raise ValueError(f'Unknown export format: {file_format}')
+    return output.getvalue()
+
+
+def frame_fingerprint(df):
+    # Content hash of a DataFrame, so an export is only reused for the same rows
+    hashed = pd.util.hash_pandas_object(df.astype(str), index=True)
+    return f'{len(df)}:{hashed.sum()}:{",".join(map(str, df.columns))}'
+
+
+def session_exports():
+    # Rendered files of this browser session only, as {(key, fingerprint, format): bytes}
+    return st.session_state.setdefault('exports', {})
+
+
+def get_export(df, file_format, key, fingerprint=None):
+    exports = session_exports()
+    export_key = (key, fingerprint or frame_fingerprint(df), file_format)
+    if export_key not in exports:
+        # Drop renderings of rows this export no longer shows
+        for stale in [k for k in exports if k[0] == key and k[1] != export_key[1]]:
+            del exports[stale]
+        exports[export_key] = render_export(df, file_format)
+    return exports[export_key]
+
+
+def export_download(label, df, file_name, key, fingerprint=None):
+    # Format picker and download button for one result frame. The file is only rendered
+    # when "Prepare" is pressed, then kept for the session until the rows change. Callers
+    # that already have a key for the rows (such as a stage key) can pass it as fingerprint.
+    columns = st.columns([2, 1, 2])
+    file_format = columns[0].radio(label, list(EXPORT_FORMATS), horizontal=True, key=f'{key}_format')
+    fingerprint = fingerprint or frame_fingerprint(df)
+    prepared = (key, fingerprint, file_format) in session_exports()
+    if not prepared and columns[1].button('Prepare', key=f'{key}_prepare'):
+        prepared = True
+    if prepared:
+        columns[2].download_button(label=f'Download {label}', data=get_export(df, file_format, key, fingerprint),
+                                   file_name=f'{file_name}.{file_format}', mime=EXPORT_FORMATS[file_format],
+                                   key=f'{key}_download')
@@ -1,5 +1,66 @@
+import threading
+import time
 import streamlit as st
 from thefuzz import fuzz
+from utils.api_util import call_with_retry
+from utils.trace_util import count, span
+
+FUND_CACHE_TTL = 600        # seconds before the Breeze fund list is fetched again
+FUND_MATCH_SCORE = 80       # minimum partial_ratio for a spreadsheet fund to match a Breeze fund
+
+
+class FundResolver:
+    """Resolves spreadsheet fund names to Breeze funds.
+
+    The fund list is fetched from Breeze once and kept for `ttl` seconds (or until
+    invalidate() is called), and each distinct spreadsheet fund string is fuzzy matched
+    only once. A resolver can be shared by check_funds, load_contributions and
+    get_all_fund_names for the whole upload.
+    """
+
+    def __init__(self, breeze_client, ttl=FUND_CACHE_TTL):
+        self.breeze_client = breeze_client
+        self.ttl = ttl
+        self.version = 0
+        self._funds = None
+        self._fetched_at = None
+        self._resolved = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._funds = None
+
+    def list_funds(self):
+        with self._lock:
+            if self._funds is None or time.monotonic() - self._fetched_at > self.ttl:
+                count('fund_list.fetch')
+                self._funds = call_with_retry(self.breeze_client.list_funds)
+                self._fetched_at = time.monotonic()
+                self._resolved = {}
+                self.version += 1
+            return self._funds
+
+    def resolve(self, fund_name):
+        # Returns (fund id, fund name, score) of the first Breeze fund that matches,
+        # or (None, None, best score) if none does
+        funds_list = self.list_funds()
+        with self._lock:
+            if fund_name in self._resolved:
+                count('fund_resolve.cache_hit')
+            else:
+                count('fund_resolve.cache_miss')
+                best_score = 0
+                for item in funds_list:
+                    # Check if the fund name is similar to the fund name in Breeze with a ratio of 80
+                    score = fuzz.partial_ratio(fund_name, item['name'])
+                    if score >= FUND_MATCH_SCORE:
+                        self._resolved[fund_name] = (item['id'], item['name'], score)
+                        break
+                    best_score = max(best_score, score)
+                else:
+                    self._resolved[fund_name] = (None, None, best_score)
+            return self._resolved[fund_name]
 
 
 def get_all_funds(breeze_client):
@@ -10,52 +71,45 @@ def get_all_funds(breeze_client):
         st.error(f'Error: {e}')
 
 
-def check_funds(df_contribution_recs, breeze_client):
-    with st.spinner(text='Checking Funds...'):
+def flag_funds(df_contribution_recs, fund_resolver):
+    # Set 'Fund Exists' to Y/N on each row. Each distinct fund is resolved once and the
+    # result mapped back onto the rows.
+    with span('check_funds'):
         df_check_funds = df_contribution_recs
-        df_check_funds.loc[:,'Fund Exists'] = None
-        funds_list = breeze_client.list_funds()
-        for index, row in df_contribution_recs.iterrows():
-            fund_name = get_fund_name(row['Fund'], breeze_client)
-            for item in funds_list:
-                # Check if the fund name is similar to the fund name in Breeze with a ratio of 80
-                if fuzz.partial_ratio(fund_name, item['name']) >= 80:
-                    df_check_funds.loc[index, 'Fund Exists'] = 'Y'
-                    break
-            else:
-                df_check_funds.loc[index, 'Fund Exists'] = 'N'
+        fund_exists = {fund: 'N' if fund_resolver.resolve(fund)[1] is None else 'Y'
+                       for fund in df_check_funds['Fund'].unique()}
+        df_check_funds.loc[:, 'Fund Exists'] = df_check_funds['Fund'].map(fund_exists)
     return df_check_funds
 
 
-def get_fund_id(fund_name, breeze_client):
+def check_funds(df_contribution_recs, breeze_client, fund_resolver=None):
+    fund_resolver = fund_resolver or FundResolver(breeze_client)
+    with st.spinner(text='Checking Funds...'):
+        return flag_funds(df_contribution_recs, fund_resolver)
+
+
+def get_fund_id(fund_name, breeze_client, fund_resolver=None):
     try:
-        funds_list = breeze_client.list_funds()
-        for item in funds_list:
-            # Check if the fund name is similar to the fund name in Breeze with a ratio of 80
-            if fuzz.partial_ratio(fund_name, item['name']) >= 80:
-                return item['id']
+        fund_resolver = fund_resolver or FundResolver(breeze_client)
+        return fund_resolver.resolve(fund_name)[0]
     except Exception as e:
         st.error(f'Error: {e}')
 
 
-def get_fund_name(fund_name, breeze_client):
+def get_fund_name(fund_name, breeze_client, fund_resolver=None):
     try:
-        funds_list = breeze_client.list_funds()
-        for item in funds_list:
-            # Check if the fund name is similar to the fund name in Breeze with a ratio of 80
-            if fuzz.partial_ratio(fund_name, item['name']) >= 80:
-                return item['name']
+        fund_resolver = fund_resolver or FundResolver(breeze_client)
+        return fund_resolver.resolve(fund_name)[1]
     except Exception as e:
         st.error(f'Error: {e}')
 
 
-def get_all_fund_names(breeze_client):
+def get_all_fund_names(breeze_client, fund_resolver=None):
     try:
+        fund_resolver = fund_resolver or FundResolver(breeze_client)
         fund_names = []
-        funds_list = breeze_client.list_funds()
-        for item in funds_list:
+        for item in fund_resolver.list_funds():
             fund_names.append(item['name'])
         return fund_names
     except Exception as e:
         st.error(f'Error: {e}')
-           
\ No newline at end of file
@@ -0,0 +1,158 @@
+import datetime as dt
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import pandas as pd
+from utils.spreadsheet_util import format_cents
+from utils.trace_util import count, span
+
+JOURNAL_PATH = 'load_journal.sqlite'    # override with BREEZE_LOAD_JOURNAL
+JOURNAL_KEY_COLUMNS = ['Date', 'id', 'Fund', 'Amount', 'Method']
+GIFT_KEY_COLUMNS = ['id', 'Date', 'Fund', 'Amount']    # the same gift, whatever file or method it came in
+
+
+def key_strings(df_contribution_recs):
+    # The key columns as the strings the journal hashes and stores: dates as YYYY-MM-DD and
+    # amounts with two decimals (from Amount_Cents when present). That is how the merged
+    # spreadsheet used to hold them, so rows journaled before keep the same keys.
+    values = df_contribution_recs[JOURNAL_KEY_COLUMNS].copy()
+    if pd.api.types.is_datetime64_any_dtype(values['Date']):
+        values['Date'] = values['Date'].dt.strftime('%Y-%m-%d')
+    if 'Amount_Cents' in df_contribution_recs.columns:
+        values['Amount'] = format_cents(df_contribution_recs['Amount_Cents'])
+    return values.map(str)
+
+
+def gift_key(values):
+    # Hash of a gift's person id, date, fund and amount, as key strings
+    return hashlib.sha256(json.dumps(list(values)).encode()).hexdigest()
+
+
+def gift_keys(df_contribution_recs):
+    values = key_strings(df_contribution_recs)
+    return [gift_key(row) for row in zip(*(values[column] for column in GIFT_KEY_COLUMNS))]
+
+
+def contribution_row_keys(df_contribution_recs):
+    # Content hash of each contribution record (date, person id, fund, amount, method).
+    # Identical gifts in the same file are told apart by their occurrence number, so the
+    # second of two identical rows gets its own key.
+    values = key_strings(df_contribution_recs)
+    hashes = [hashlib.sha256(json.dumps(list(row)).encode()).hexdigest()
+              for row in zip(*(values[column] for column in JOURNAL_KEY_COLUMNS))]
+    occurrences = df_contribution_recs.groupby(hashes, sort=False).cumcount()
+    return [f'{row_hash}:{occurrence}' for row_hash, occurrence in zip(hashes, occurrences)]
+
+
+class LoadJournal:
+    """Append-only SQLite journal of the payment ids returned by add_contribution.
+
+    Every payment id is recorded as soon as Breeze returns it, keyed by the row's content
+    hash, so a load that is interrupted and re-run skips the rows already committed. Rows
+    are also indexed by gift key (person id, date, fund and amount), so an upload can be
+    checked for gifts that an earlier upload already loaded.
+
+    A row is only journaled once Breeze has returned its payment id, so loads that check
+    rows against the journal and then post them hold loading() for both steps. Otherwise
+    two loads of the same gifts (two --jobs of the CLI, or two app sessions sharing the
+    journal) could both pass the checks before either was journaled, and both post.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('BREEZE_LOAD_JOURNAL', JOURNAL_PATH)
+        self._lock = threading.Lock()
+        self._load_lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('''create table if not exists load_journal (
+                                    row_key text primary key,
+                                    payment_id text not null,
+                                    date text, person_id text, fund text, amount text, method text,
+                                    loaded_at text not null)''')
+            # Journals from before the gift index get the column and have it filled in
+            if 'gift_key' not in [column[1] for column in self._conn.execute('pragma table_info(load_journal)')]:
+                self._conn.execute('alter table load_journal add column gift_key text')
+            rows = self._conn.execute('select row_key, person_id, date, fund, amount from load_journal '
+                                      'where gift_key is null').fetchall()
+            self._conn.executemany('update load_journal set gift_key = ? where row_key = ?',
+                                   [(gift_key(row[1:]), row[0]) for row in rows])
+            self._conn.execute('create index if not exists load_journal_gift_key on load_journal (gift_key)')
+
+    def loading(self):
+        # Lock held from checking rows against the journal until they are posted and journaled.
+        # It is reentrant, so a caller holding it can call post_contributions, which takes it too.
+        return self._load_lock
+
+    def committed(self, row_keys):
+        # Payment ids already recorded for any of the given row keys, as {row_key: payment_id}
+        row_keys = list(row_keys)
+        found = {}
+        with self._lock:
+            for start in range(0, len(row_keys), 500):
+                chunk = row_keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"select row_key, payment_id from load_journal where row_key in ({','.join('?' * len(chunk))})",
+                    chunk)
+                found.update(rows.fetchall())
+        return found
+
+    def loaded_gifts(self, gift_keys):
+        # Every journaled row with one of the given gift keys, as a frame of gift_key, row_key,
+        # payment_id and loaded_at
+        gift_keys = list(dict.fromkeys(gift_keys))
+        rows = []
+        with self._lock:
+            for start in range(0, len(gift_keys), 500):
+                chunk = gift_keys[start:start + 500]
+                rows += self._conn.execute(
+                    f"select gift_key, row_key, payment_id, loaded_at from load_journal "
+                    f"where gift_key in ({','.join('?' * len(chunk))})", chunk).fetchall()
+        return pd.DataFrame(rows, columns=['gift_key', 'row_key', 'payment_id', 'loaded_at'])
+
+    def record(self, row_key, payment_id, row):
+        # row holds the key columns, as key_strings formats them
+        with self._lock, self._conn:
+            self._conn.execute('insert or ignore into load_journal (row_key, payment_id, date, person_id, fund, '
+                               'amount, method, loaded_at, gift_key) values (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                               (row_key, str(payment_id), *(str(row[column]) for column in JOURNAL_KEY_COLUMNS),
+                                dt.datetime.now().isoformat(timespec='seconds'),
+                                gift_key(str(row[column]) for column in GIFT_KEY_COLUMNS)))
+
+    def close(self):
+        self._conn.close()
+
+
+def find_duplicate_gifts(df_contribution_recs, journal):
+    """Rows of an upload whose gift an earlier upload already loaded into Breeze.
+
+    All rows are looked up in the journal's gift index at once. A journaled row with the
+    same row key is this upload's own (a resumed load, which post_contributions skips
+    anyway), so only gifts loaded under a different row key, e.g. from a file where the
+    method was different or the gift appeared in another deposit, count. A gift that appears
+    twice in this upload (with different methods, say) and is loaded in max_rows chunks is
+    not a duplicate of itself: the journal row of the chunk already loaded has one of this
+    upload's row keys, so it is never taken for an earlier upload's. Returns the
+    suspect rows with the 'Previous Payment ID' and 'Previously Loaded At' of the match.
+    """
+    columns = ['Contributor Name', 'Date', 'Fund', 'Amount', 'Method', 'Previous Payment ID', 'Previously Loaded At']
+    if df_contribution_recs.empty:
+        return pd.DataFrame(columns=columns)
+    with span('duplicates.check'):
+        keys = pd.Series(gift_keys(df_contribution_recs), index=df_contribution_recs.index)
+        row_keys = contribution_row_keys(df_contribution_recs)
+        prior = journal.loaded_gifts(keys)
+        # Journal rows under this upload's own row keys are an earlier chunk of it, not an
+        # earlier upload: their rows are skipped by the load, and the gift doesn't make the
+        # upload's other rows duplicates
+        committed = prior['row_key'].isin(row_keys)
+        committed_rows = set(prior.loc[committed, 'row_key'])
+        prior = (prior.loc[~committed].sort_values('loaded_at')
+                 .drop_duplicates('gift_key', keep='last').set_index('gift_key'))
+        suspect = keys.isin(prior.index) & ~pd.Series(row_keys, index=keys.index).isin(committed_rows)
+        duplicates = df_contribution_recs.loc[suspect].assign(
+            **{'Previous Payment ID': keys[suspect].map(prior['payment_id']),
+               'Previously Loaded At': keys[suspect].map(prior['loaded_at'])})
+    count('duplicates.suspects', len(duplicates))
+    return duplicates[columns]
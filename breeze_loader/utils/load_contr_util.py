@@ -1,52 +1,149 @@
-from utils.funds_util import get_fund_id, get_fund_name
-import datetime as dt
+from utils.api_util import REJECTED_STATUS_CODES, breeze_rate_limiter, call_with_retry
+from utils.funds_util import FundResolver
+from utils.journal_util import contribution_row_keys, key_strings
+from utils.spreadsheet_util import format_date
+from utils.trace_util import count, span
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+import contextvars
+import hashlib
+import os
+import uuid
+import pandas as pd
 import streamlit as st
 
-def generate_group_id() -> str:
-    return f'{dt.datetime.now().strftime("%Y%m%d%H%M%")}'
+LOADER_MAX_WORKERS = 4      # concurrent add_contribution requests (override with BREEZE_MAX_WORKERS)
 
-def load_contributions(breeze_client, df_contribution_recs):
-    print("loading contributions")
-    print(df_contribution_recs)
+def generate_group_id(row_keys=None) -> str:
+    # Breeze puts every contribution with the same group into one new batch, and groups have
+    # to be unique per batch. An upload's group is derived from its row keys, so re-running
+    # an interrupted upload adds its remaining rows to the same batches.
+    if row_keys is None:
+        return uuid.uuid4().hex[:12]
+    return hashlib.sha256('\n'.join(row_keys).encode()).hexdigest()[:12]
+
+def batch_group(group_id, date):
+    # One Breeze batch per contribution date within an upload
+    day = pd.to_datetime(date, errors='coerce')
+    return group_id if pd.isna(day) else f'{group_id}-{day:%Y%m%d}'
+
+def contribution_params(row, fund_resolver, group=None):
+    # Keyword arguments to breeze_client.add_contribution for one contribution record
+    fund_id, fund_name, _ = fund_resolver.resolve(row['Fund'])
+    # Amounts and dates stay typed until here, the API boundary
+    cents = row.get('Amount_Cents')
+    amount = f'{cents / 100:.2f}' if cents is not None and not pd.isna(cents) else row['Amount']
+    return dict(
+        date=format_date(row['Date']),
+        name=row['Contributor Name'],
+        processor=None,
+        person_id=row['id'],
+        method=row['Method'],
+        funds_json=[
+            {
+                'id': fund_id,
+                'name': fund_name,
+                'amount': amount # Adjusted fund amount
+            }
+        ],
+        amount=amount,  # Total contribution amount
+        group=group or generate_group_id(),
+        batch_number=None,
+        batch_name='Auto Contribution Loader'
+    )
+
+def submit_contribution(breeze_client, params, rate_limiter, journal=None, row_key=None, row=None):
+    # Runs on a loader worker: post one contribution and journal its payment id right away.
+    # add_contribution isn't idempotent, so it is only retried when Breeze rejected the
+    # request outright; any other failure fails the row, to be checked before it is re-run.
+    payment_id = call_with_retry(breeze_client.add_contribution, rate_limiter=rate_limiter,
+                                 retry_status_codes=REJECTED_STATUS_CODES, **params)
+    if journal is not None:
+        with span('journal.record'):
+            journal.record(row_key, payment_id, row)
+    return payment_id
+
+def post_contributions(breeze_client, df_contribution_recs, fund_resolver=None, max_workers=None,
+                       rate_limiter=None, progress=None, journal=None, max_rows=None, group_id=None,
+                       hold_back=()):
+    # Load the records into Breeze without any UI. Returns (records with their 'Payment ID',
+    # number of rows skipped because the journal already had them, {index: exception} of the
+    # rows that failed). Rows whose index is in hold_back (such as suspected duplicates) are
+    # left without a Payment ID.
     df_contribution_recs['Payment ID'] = None
-    
-    # Set values for each conribution record
-    for index, row in df_contribution_recs.iterrows():
-        try:
-            print(row['Date'])
-            date = row['Date']
-            name = row['Contributor Name']
-            uid = row['id']
-            method = row['Method']
-            fund_id = get_fund_id(row['Fund'], breeze_client)
-            fund_name = get_fund_name(row['Fund'], breeze_client)
-            amount = row['Amount']
-            group = generate_group_id()
-            batch_name = 'Auto Contribution Loader'
-
-            # Call API to add contribution
-            payment_id = breeze_client.add_contribution(
-                date=date,
-                name=name,
-                processor=None,
-                person_id=uid,
-                method=method,
-                funds_json=[
-                    {
-                        'id': fund_id,
-                        'name': fund_name,
-                        'amount': amount # Adjusted fund amount
-                    }
-                ],
-                amount=amount,  # Total contribution amount
-                group=group,
-                batch_number=None,
-                batch_name=batch_name
-            )
-            print(payment_id)
-
-            # Add payment_id to the contribution record
-            df_contribution_recs.loc[index, 'Payment ID'] = payment_id
-        except Exception as e:
-            st.error(f'Error: {e}')
+    fund_resolver = fund_resolver or FundResolver(breeze_client)
+    max_workers = max_workers or int(os.getenv('BREEZE_MAX_WORKERS', LOADER_MAX_WORKERS))
+    rate_limiter = rate_limiter or breeze_rate_limiter()
+
+    # The resume check and the posts happen under the journal's load lock, so another load of
+    # the same rows can't pass the check before these are journaled
+    with journal.loading() if journal is not None else nullcontext():
+        # Skip rows a previous run already committed, and load at most max_rows of the rest
+        row_keys = contribution_row_keys(df_contribution_recs)
+        payment_ids = {}
+        if journal is not None:
+            committed = journal.committed(row_keys)
+            payment_ids = {index: committed[row_key] for index, row_key in zip(df_contribution_recs.index, row_keys)
+                           if row_key in committed}
+        skipped = len(payment_ids)
+        count('load.skipped_committed', skipped)
+        # Each pending row carries its record (for the API call) and its key strings (for the journal)
+        pending = [(index, row_key, row, key_row) for index, row_key, row, key_row in
+                   zip(df_contribution_recs.index, row_keys, df_contribution_recs.to_dict('records'),
+                       key_strings(df_contribution_recs).to_dict('records'))
+                   if index not in payment_ids and index not in hold_back]
+        if max_rows:
+            pending = pending[:max_rows]
+        # Breeze has no bulk add, so rows go one request each over the client's keep-alive
+        # session. They share one group per date, and are sent in date order so the batches
+        # fill one after the other.
+        group_id = group_id or generate_group_id(row_keys)
+        pending.sort(key=lambda item: str(item[2]['Date']))
+
+        # Post the contribution records from a bounded worker pool. Workers only call the API
+        # and the journal; results, errors and progress are handled here on the calling
+        # thread.
+        errors = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for index, row_key, row, key_row in pending:
+                try:
+                    params = contribution_params(row, fund_resolver, batch_group(group_id, row['Date']))
+                except Exception as e:
+                    errors[index] = e
+                    continue
+                # Run each worker in a copy of this context so its API spans land in the current trace
+                future = executor.submit(contextvars.copy_context().run, submit_contribution,
+                                         breeze_client, params, rate_limiter, journal, row_key, key_row)
+                futures[future] = index
+
+            for done, future in enumerate(as_completed(futures), start=1):
+                try:
+                    payment_ids[futures[future]] = future.result()
+                except Exception as e:
+                    errors[futures[future]] = e
+                if progress is not None:
+                    progress(done, len(futures))
+
+    count('load.submitted', len(futures))
+    count('load.errors', len(errors))
+
+    # Add payment_id to each contribution record
+    df_contribution_recs['Payment ID'] = [payment_ids.get(index) for index in df_contribution_recs.index]
+    return df_contribution_recs, skipped, errors
+
+def report_load(skipped, errors):
+    # The outcome of post_contributions, in the app
+    if skipped:
+        st.info(f"Skipped {skipped} contribution(s) already loaded by a previous run.")
+    for e in errors.values():
+        st.error(f'Error: {e}')
+
+def load_contributions(breeze_client, df_contribution_recs, fund_resolver=None, max_workers=None,
+                       rate_limiter=None, progress=None, journal=None, max_rows=None, group_id=None,
+                       hold_back=()):
+    df_contribution_recs, skipped, errors = post_contributions(
+        breeze_client, df_contribution_recs, fund_resolver, max_workers, rate_limiter, progress, journal,
+        max_rows, group_id, hold_back)
+    report_load(skipped, errors)
     return df_contribution_recs
@@ -0,0 +1,311 @@
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+from utils.trace_util import count
+
+# Fuzzy match thresholds (same scale as thefuzz, rounded to whole numbers)
+AUTO_MATCH_SCORE = 90       # score > 90 is matched automatically
+QUESTIONABLE_SCORE = 80     # 80 < score <= 90 is a questionable match
+SIMILAR_NAME_SCORE = 80     # spreadsheet names with ratio > 80 are too similar to match on
+
+SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'),
+    **dict.fromkeys('cgjkqsxz', '2'),
+    **dict.fromkeys('dt', '3'),
+    'l': '4',
+    **dict.fromkeys('mn', '5'),
+    'r': '6',
+}
+
+# Greek letters (after accents are stripped) to their usual Latin transliteration
+GREEK_TO_LATIN = str.maketrans({
+    'α': 'a', 'β': 'v', 'γ': 'g', 'δ': 'd', 'ε': 'e', 'ζ': 'z', 'η': 'i', 'θ': 'th', 'ι': 'i', 'κ': 'k',
+    'λ': 'l', 'μ': 'm', 'ν': 'n', 'ξ': 'x', 'ο': 'o', 'π': 'p', 'ρ': 'r', 'σ': 's', 'ς': 's', 'τ': 't',
+    'υ': 'y', 'φ': 'f', 'χ': 'ch', 'ψ': 'ps', 'ω': 'o',
+})
+
+# First names that are the same person's name in Greek, its transliterations and the
+# English form the parish uses. The first name of each group is the canonical alias key.
+FIRST_NAME_ALIASES = [
+    ['georgios', 'george', 'giorgos', 'yiorgos', 'yorgos'],
+    ['ioannis', 'john', 'giannis', 'yiannis', 'yianni', 'gianni'],
+    ['nikolaos', 'nicholas', 'nickolas', 'nicolas', 'nikolas', 'nikos', 'nick'],
+    ['dimitrios', 'demetrios', 'dimitri', 'demetri', 'dimitris', 'demetrius'],
+    ['konstantinos', 'constantine', 'constantinos', 'kostas', 'costas'],
+    ['vasileios', 'vasilios', 'vassilios', 'vasilis', 'basil'],
+    ['panagiotis', 'panayiotis', 'panagiotes', 'panos'],
+    ['petros', 'peter'],
+    ['michail', 'michael', 'michalis', 'mihalis', 'mike'],
+    ['theodoros', 'theodore'],
+    ['athanasios', 'thanasis', 'thanos'],
+    ['anastasios', 'tasos', 'tassos'],
+    ['spyridon', 'spyros', 'spiros', 'spiro'],
+    ['evangelos', 'vangelis'],
+    ['charalambos', 'haralambos', 'haralampos'],
+    ['emmanouil', 'emmanuel', 'manolis'],
+    ['stylianos', 'stelios'],
+    ['elias', 'ilias'],
+    ['aikaterini', 'katerina', 'catherine', 'katherine', 'katina'],
+    ['eleni', 'helen', 'helena', 'elena'],
+    ['maria', 'mary', 'marie'],
+    ['sofia', 'sophia', 'sophie'],
+    ['anna', 'ann', 'anne'],
+    ['vasiliki', 'vassiliki'],
+    ['eftychia', 'eftihia', 'eftyhia'],
+]
+NAME_ALIASES = {name: group[0] for group in FIRST_NAME_ALIASES for name in group}
+
+
+def soundex(name):
+    # American Soundex code of a name, used as a phonetic blocking key
+    letters = [c for c in str(name).lower() if c.isalpha()]
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    last = SOUNDEX_CODES.get(letters[0], '')
+    for c in letters[1:]:
+        digit = SOUNDEX_CODES.get(c, '')
+        if digit and digit != last:
+            code += digit
+        if c not in 'hw':
+            last = digit
+    return (code + '000')[:4]
+
+
+def normalize_name(names):
+    # Vectorized join key for names: accent-folded, case-folded, Greek letters transliterated,
+    # apostrophes and periods dropped, other punctuation and runs of whitespace made one space
+    return (names.fillna('').astype(str)
+            .str.normalize('NFKD')
+            .str.replace(r'[\u0300-\u036f]', '', regex=True)
+            .str.casefold()
+            .str.translate(GREEK_TO_LATIN)
+            .str.replace(r"['\u2019.]", '', regex=True)
+            .str.replace(r'[^\w\s]|_', ' ', regex=True)
+            .str.split()
+            .str.join(' '))
+
+
+def name_columns(first_names, last_names):
+    """Matching columns for a set of names, computed once per frame.
+
+    _first_key, _last_key  normalized first and last name (see normalize_name)
+    _alias_key             first name mapped to its canonical form in FIRST_NAME_ALIASES
+    _full_name             normalized 'first last', the string fuzzy matching scores
+    _phonetic_key          first letter of the alias key plus Soundex of the last name
+    """
+    first_keys = normalize_name(first_names)
+    last_keys = normalize_name(last_names)
+    alias_keys = first_keys.map(NAME_ALIASES).fillna(first_keys)
+    soundex_codes = {name: soundex(name) for name in last_keys.unique()}
+    return pd.DataFrame({
+        '_first_key': first_keys,
+        '_last_key': last_keys,
+        '_alias_key': alias_keys,
+        '_full_name': (first_keys + ' ' + last_keys).str.strip(),
+        '_phonetic_key': alias_keys.str[:1] + ':' + last_keys.map(soundex_codes),
+    })
+
+
+def name_ngrams(name, n=3):
+    # The name's n-grams with how often each occurs, e.g. 'bbbb' has the bigram 'bb' three times
+    name = str(name).casefold()
+    return Counter(name[i:i + n] for i in range(len(name) - n + 1))
+
+
+def ngram_postings(names_ngrams):
+    # {gram: (positions of the names that have it, how often each has it)}
+    postings = defaultdict(lambda: ([], []))
+    for pos, grams in enumerate(names_ngrams):
+        for gram, occurrences in grams.items():
+            postings[gram][0].append(pos)
+            postings[gram][1].append(occurrences)
+    return {gram: (np.array(positions), np.array(counts)) for gram, (positions, counts) in postings.items()}
+
+
+def shared_ngrams(grams, postings, size):
+    # The n-grams each of the size names shares with grams, counted with repeats (the size of
+    # the multiset intersection)
+    hits = [(postings[gram][0], np.minimum(postings[gram][1], occurrences))
+            for gram, occurrences in grams.items() if gram in postings]
+    if not hits:
+        return np.zeros(size, dtype=int)
+    positions, counts = (np.concatenate(arrays) for arrays in zip(*hits))
+    return np.bincount(positions, weights=counts, minlength=size)
+
+
+def min_shared_ngrams(lengths, n=3):
+    # Lower bound on the trigrams (counted with repeats) two names must share for
+    # partial_ratio to be above AUTO_MATCH_SCORE, given the shorter name's length. A score
+    # above 90 allows at most 0.19 * len inserts/deletes between the shorter name and a
+    # substring of the longer one, and each of them breaks at most n of the shorter name's
+    # len - n + 1 trigrams. At 0 or below every name is a candidate.
+    max_edits = np.floor(lengths * (100 - AUTO_MATCH_SCORE - 0.5) * 2 / 100)
+    return lengths - (n - 1) - n * max_edits
+
+
+def min_shared_bigrams(total_lengths):
+    # Lower bound on the bigrams (counted with repeats) two names must share for ratio to be
+    # above SIMILAR_NAME_SCORE, given the sum of their lengths. A ratio above 80 means the
+    # longest common subsequence covers at least 40.25% of the total length. Of one name's
+    # bigrams, each character outside the common subsequence breaks at most two, and each run
+    # of the other name's characters inserted into it at most one, which leaves
+    # 3 * lcs - total - 1 bigrams that both names have.
+    lcs = total_lengths * (SIMILAR_NAME_SCORE + 0.5) / 100 / 2
+    return np.floor(3 * lcs - total_lengths - 1)
+
+
+def similar_name_clusters(names):
+    """Group spreadsheet names whose fuzz.ratio is above SIMILAR_NAME_SCORE.
+
+    Names are deduplicated first, candidate pairs come from a bigram index with a length
+    and shared-bigram filter, and each name is scored against its candidates in one
+    rapidfuzz call. Returns clusters (lists of two or more distinct names, in order of
+    first appearance) of names that are transitively similar.
+    """
+    distinct = [str(name) for name in pd.unique(pd.Series(names, dtype=object).dropna())]
+    lengths = np.array([len(name) for name in distinct])
+    name_bigrams = [name_ngrams(name, n=2) for name in distinct]
+    postings = ngram_postings(name_bigrams)
+
+    parent = list(range(len(distinct)))
+
+    def find(pos):
+        while parent[pos] != pos:
+            parent[pos] = parent[parent[pos]]
+            pos = parent[pos]
+        return pos
+
+    for pos, name in enumerate(distinct):
+        shared = shared_ngrams(name_bigrams[pos], postings, len(distinct))
+        total_lengths = lengths + len(name)
+        max_length_gap = np.floor(total_lengths * (100 - SIMILAR_NAME_SCORE - 0.5) / 100)
+        cands = np.flatnonzero((shared >= min_shared_bigrams(total_lengths)) &
+                               (np.abs(lengths - len(name)) <= max_length_gap))
+        cands = cands[cands > pos]
+        if len(cands) == 0:
+            continue
+        count('similar_name_comparisons', len(cands))
+        scores = np.round(process.cdist([name], [distinct[c] for c in cands], scorer=fuzz.ratio, dtype=np.float64)[0])
+        for other in cands[scores > SIMILAR_NAME_SCORE]:
+            parent[find(other)] = find(pos)
+
+    clusters = defaultdict(list)
+    for pos, name in enumerate(distinct):
+        clusters[find(pos)].append(name)
+    return [cluster for cluster in clusters.values() if len(cluster) > 1]
+
+
+class PeopleIndex:
+    """Blocked fuzzy-name index over the people DataFrame returned by get_people.
+
+    The matching columns of the directory (see name_columns) are computed once, when the
+    index is built. Spreadsheet rows are first joined on the normalized first and last
+    name, then on the first name's alias key, and the rest are fuzzy matched: each name
+    is only scored against the people that share a blocking key with it (the phonetic key,
+    or enough name trigrams), in one batched rapidfuzz call per name.
+    """
+
+    def __init__(self, people, exhaustive=False):
+        self.people = people
+        self.exhaustive = exhaustive
+        self.name_keys = name_columns(people['first_name'], people['last_name']).reset_index(drop=True)
+        self.name_keys['_person_pos'] = np.arange(len(people))
+        self.names = self.name_keys['_full_name'].tolist()
+        self.name_lengths = self.name_keys['_full_name'].str.len().to_numpy()
+
+        self.ngram_postings = ngram_postings([name_ngrams(name) for name in self.names])
+        self.phonetic_postings = {key: np.asarray(pos) for key, pos in
+                                  self.name_keys.groupby('_phonetic_key').indices.items()}
+
+    @staticmethod
+    def phonetic_key(first_name, last_name):
+        return name_columns(pd.Series([first_name]), pd.Series([last_name]))['_phonetic_key'].iloc[0]
+
+    def candidates(self, name, first_name=None, last_name=None, phonetic_key=None):
+        # Positions (in people order) of everyone sharing a blocking key with the name
+        if self.exhaustive:
+            return np.arange(len(self.names))
+        shared = shared_ngrams(name_ngrams(name), self.ngram_postings, len(self.names))
+        by_ngram = np.flatnonzero(shared >= min_shared_ngrams(np.minimum(self.name_lengths, len(name))))
+        if phonetic_key is None:
+            phonetic_key = self.phonetic_key(first_name, last_name)
+        by_phonetic = self.phonetic_postings.get(phonetic_key, np.array([], dtype=int))
+        return np.union1d(by_ngram, by_phonetic).astype(int)
+
+    def _join(self, keys, on):
+        return keys.merge(self.name_keys[on + ['_person_pos']], on=on, how='inner')
+
+    def exact_match_frame(self, df_upload):
+        # Direct matching on normalized (first, last) names as one merge, then on (alias
+        # key, last name) for the rows left over, e.g. 'George' for 'Georgios'. An alias
+        # join that finds more than one person is left to the fuzzy phase. Returns the
+        # matched people rows (with the spreadsheet 'Contributor Name') and the unmatched
+        # spreadsheet rows, keeping the spreadsheet index labels on the latter.
+        keys = name_columns(df_upload['First_Name'], df_upload['Last_Name'])
+        keys['Contributor Name'] = df_upload['Contributor Name'].to_numpy()
+        keys['_upload_label'] = df_upload.index
+        keys = keys[(keys['_first_key'] != '') & (keys['_last_key'] != '')]
+        joined = self._join(keys, ['_first_key', '_last_key'])
+
+        leftover = keys[~keys['_upload_label'].isin(joined['_upload_label'])]
+        by_alias = self._join(leftover, ['_alias_key', '_last_key'])
+        by_alias = by_alias[by_alias.groupby('_upload_label')['_person_pos'].transform('size') == 1]
+        count('exact_matches', joined['_upload_label'].nunique())
+        count('alias_matches', len(by_alias))
+        joined = pd.concat([joined, by_alias], ignore_index=True)
+
+        df_matched = self.people.iloc[joined['_person_pos']].copy()
+        df_matched['Contributor Name'] = joined['Contributor Name'].tolist()
+        df_unmatched = df_upload[~df_upload.index.isin(joined['_upload_label'])]
+        return df_matched, df_unmatched
+
+    def match(self, name, first_name=None, last_name=None):
+        """Return (best position or None, best score, [(position, score), ...] questionable matches)."""
+        keys = name_columns(pd.Series([first_name]), pd.Series([last_name])).iloc[0]
+        return self._match(normalize_name(pd.Series([name])).iloc[0], keys['_phonetic_key'], len(keys['_full_name']))
+
+    def _match(self, name, phonetic_key, upload_name_len):
+        # match() for an already normalized name and its precomputed keys
+        cands = self.candidates(name, phonetic_key=phonetic_key)
+        if len(cands) == 0:
+            return None, 0, []
+        choices = [self.names[pos] for pos in cands]
+        count('fuzzy_comparisons', len(choices))
+        scores = np.round(process.cdist([name], choices, scorer=fuzz.partial_ratio, dtype=np.float64)[0])
+
+        # Ties go to the first person in directory order, like the original row-by-row scan
+        best = int(np.argmax(scores))
+        best_score = int(scores[best])
+
+        questionable = ((scores > QUESTIONABLE_SCORE) & (scores <= AUTO_MATCH_SCORE)) | \
+                       ((scores == 100) & (self.name_lengths[cands] != upload_name_len))
+        questionable_matches = [(int(cands[i]), int(scores[i])) for i in np.flatnonzero(questionable)]
+
+        if best_score > AUTO_MATCH_SCORE:
+            return int(cands[best]), best_score, questionable_matches
+        return None, best_score, questionable_matches
+
+    def match_frame(self, df_unmatched):
+        # Fuzzy match every row of the unmatched frame. Returns the matched people rows
+        # (with the spreadsheet 'Contributor Name') and the index labels that matched.
+        # The names and keys of all rows are normalized up front, in one vectorized pass.
+        keys = name_columns(df_unmatched['First_Name'], df_unmatched['Last_Name'])
+        normalized_names = normalize_name(df_unmatched['Contributor Name'])
+        positions = []
+        matched_labels = []
+        matched_names = []
+        for label, name, normalized_name, phonetic_key, full_name in zip(
+                df_unmatched.index, df_unmatched['Contributor Name'], normalized_names,
+                keys['_phonetic_key'], keys['_full_name']):
+            pos, score, questionable_matches = self._match(normalized_name, phonetic_key, len(full_name))
+            if pos is not None:
+                positions.append(pos)
+                matched_labels.append(label)
+                matched_names.append(name)
+
+        df_matched = self.people.iloc[positions].copy()
+        df_matched['Contributor Name'] = matched_names
+        return df_matched, matched_labels
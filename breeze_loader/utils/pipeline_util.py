@@ -0,0 +1,52 @@
+from contextlib import nullcontext
+from utils.funds_util import FundResolver, flag_funds
+from utils.journal_util import find_duplicate_gifts
+from utils.load_contr_util import post_contributions
+from utils.ppl_util import find_matches
+from utils.spreadsheet_util import merge_spreasheet
+from utils.trace_util import count, span
+
+
+def run_pipeline(df_upload, breeze_client, people, people_index=None, fund_resolver=None, dry_run=False,
+                 journal=None, max_workers=None, max_rows=None, rate_limiter=None, progress=None,
+                 allow_duplicates=False):
+    """Match, merge, check funds and load one normalized upload, without any Streamlit UI.
+
+    df_upload is a frame from spreadsheet_util.read_contributions. Returns a dict of frames:
+    matched, unmatched, excluded (names too similar to match on), merged (every row, with
+    'Manually Enter' and, once loaded, 'Payment ID'), auto, manual and missing_funds, plus
+    similar_clusters, skipped (rows the journal already had), duplicates (rows whose gift an
+    earlier upload already loaded, per the journal), held_back (the index of the duplicates
+    that weren't loaded), errors ({index: exception} of the rows that failed) and loaded. Nothing is posted to
+    Breeze when dry_run is set, or when any auto-loadable row has a fund that does not exist
+    in Breeze, the same as in the app. Duplicates are held back unless allow_duplicates is set.
+    """
+    fund_resolver = fund_resolver or FundResolver(breeze_client)
+    count('upload_rows', len(df_upload))
+    with span('match_people'):
+        matched, unmatched, excluded, similar_clusters = find_matches(df_upload, people, people_index)
+    with span('merge'):
+        merged = merge_spreasheet(df_upload, matched[['Contributor Name', 'id']])
+
+    auto = flag_funds(merged.loc[merged['Manually Enter'] == 'N'].copy(), fund_resolver)
+    manual = merged.loc[merged['Manually Enter'] == 'Y']
+    missing_funds = auto.loc[auto['Fund Exists'] == 'N']
+    # The duplicate check and the load share the journal's load lock, so another load of the
+    # same gifts can't pass the check before these are journaled
+    with journal.loading() if journal is not None else nullcontext():
+        duplicates = find_duplicate_gifts(auto, journal) if journal is not None else auto.iloc[:0]
+        result = dict(matched=matched, unmatched=unmatched, excluded=excluded, similar_clusters=similar_clusters,
+                      merged=merged, auto=auto, manual=manual, missing_funds=missing_funds, duplicates=duplicates,
+                      held_back=set(), skipped=0, errors={}, loaded=False)
+        if dry_run or not missing_funds.empty or auto.empty:
+            return result
+
+        held_back = set() if allow_duplicates else set(duplicates.index)
+        with span('load_contributions'):
+            auto, skipped, errors = post_contributions(breeze_client, auto, fund_resolver, max_workers,
+                                                       rate_limiter, progress, journal, max_rows,
+                                                       hold_back=held_back)
+    merged = merged.copy()
+    merged['Payment ID'] = auto['Payment ID']
+    result.update(merged=merged, auto=auto, held_back=held_back, skipped=skipped, errors=errors, loaded=True)
+    return result
@@ -1,113 +1,158 @@
+import os
+import threading
+import time
 import pandas as pd
-from thefuzz import fuzz
 import streamlit as st
+from utils.match_util import PeopleIndex, similar_name_clusters
+from utils.trace_util import count, span
 
+PEOPLE_SNAPSHOT_PATH = 'people_snapshot.parquet'    # override with BREEZE_PEOPLE_SNAPSHOT
+PEOPLE_SNAPSHOT_TTL = 6 * 60 * 60                   # seconds before the directory is fetched from Breeze again
 
-def get_people(breeze_client):
+
+def fetch_people(breeze_client):
     # Get List of all Breeze Users   
-    people = breeze_client.list_people()
+    with span('api.list_people'):
+        count('api_calls')
+        people = breeze_client.list_people()
     df_ppl = pd.DataFrame(people)
     df_ppl = df_ppl.drop(columns=['force_first_name','path'])
     return df_ppl
 
 
+class PeopleDirectory:
+    """Cached copy of the Breeze people directory.
+
+    The directory is kept in memory and in an on-disk Parquet snapshot. It is only fetched
+    from Breeze when the snapshot is older than `ttl` seconds or refresh() is called, so a
+    cold start reads the snapshot instead of calling list_people.
+    """
+
+    def __init__(self, breeze_client, path=None, ttl=PEOPLE_SNAPSHOT_TTL):
+        self.breeze_client = breeze_client
+        self.path = path or os.getenv('BREEZE_PEOPLE_SNAPSHOT', PEOPLE_SNAPSHOT_PATH)
+        self.ttl = ttl
+        self.version = 0
+        self.loaded_at = None
+        self._people = None
+        self._people_index = None
+        self._lock = threading.RLock()
+
+    def _set(self, people, loaded_at):
+        self._people = people
+        self._people_index = None
+        self.loaded_at = loaded_at
+        self.version += 1
+
+    def refresh(self):
+        with self._lock:
+            people = fetch_people(self.breeze_client)
+            # Write the snapshot atomically so a concurrent reader never sees half a file
+            tmp_path = f'{self.path}.tmp'
+            people.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, self.path)
+            self._set(people, time.time())
+            return people
+
+    def get(self):
+        with self._lock:
+            if self._people is not None and time.time() - self.loaded_at <= self.ttl:
+                count('people_directory.memory_hit')
+                return self._people
+            if os.path.exists(self.path) and time.time() - os.path.getmtime(self.path) <= self.ttl:
+                count('people_directory.snapshot_hit')
+                with span('people_directory.read_snapshot'):
+                    self._set(pd.read_parquet(self.path), os.path.getmtime(self.path))
+                return self._people
+            count('people_directory.fetch')
+            return self.refresh()
+
+    def index(self):
+        # Matching index over the current directory, built once per directory version
+        with self._lock:
+            people = self.get()
+            if self._people_index is None:
+                with span('people_index.build'):
+                    self._people_index = PeopleIndex(people)
+            return self._people_index
+
+
+def get_people(breeze_client):
+    # The Streamlit app shares one PeopleDirectory per process, see resource_util.get_people_directory
+    return PeopleDirectory(breeze_client).get()
+
+
 def check_similar_names(df):
-    names = df['Contributor Name']
-    similar_names = []
-    for name in names:
-        scores = [(other_name, fuzz.ratio(name, other_name)) for other_name in names if other_name != name]
-        scores.sort(key=lambda x: x[1], reverse=True)
-        #st.write(name)
-        #st.write(scores)
-        if scores and scores[0][1] > 80:  # if the best match has a score > 80
-            similar_names.append(name)
-    return similar_names
+    # Every Contributor Name that is too similar to a different name in the spreadsheet
+    clusters = similar_name_clusters(df['Contributor Name'])
+    similar = {name for cluster in clusters for name in cluster}
+    return [name for name in df['Contributor Name'] if name in similar]
 
 
-def match_people(df_orig_uploaded_file, people):
+def find_matches(df_orig_uploaded_file, people, people_index=None):
+    # Match the spreadsheet names against the directory without any UI. Returns
+    # (matched, unmatched, excluded, similar_clusters): the matched people rows with the
+    # spreadsheet 'Contributor Name', the rows that did not match, the rows left out because
+    # their names are too similar to another name in the file, and those similar names.
+    exclude_df = df_orig_uploaded_file.iloc[:0]
+
+    # Check similar names and remove them from the dataframe
+    with span('match.similar_names'):
+        similar_clusters = similar_name_clusters(df_orig_uploaded_file['Contributor Name'])
+    similar_names = [name for cluster in similar_clusters for name in cluster]
+    if similar_names:
+        exclude_df = df_orig_uploaded_file[df_orig_uploaded_file['Contributor Name'].isin(similar_names)]
+        df_uploaded_file = df_orig_uploaded_file[~df_orig_uploaded_file['Contributor Name'].isin(similar_names)]
+    else:
+        df_uploaded_file = df_orig_uploaded_file
+
+    people_index = people_index or PeopleIndex(people)
+
+    # Direct matching on normalized first and last names
+    with span('match.exact'):
+        results_df, unmatched_df = people_index.exact_match_frame(df_uploaded_file)
+    unmatched_records = unmatched_df.copy()
+
+    # Fuzzy matching against a blocked index of the directory, scored in batch
+    with span('match.fuzzy'):
+        df_fuzzy_matched, matched_labels = people_index.match_frame(unmatched_df)
+    if not df_fuzzy_matched.empty:
+        results_df = pd.concat([results_df, df_fuzzy_matched])
+        unmatched_records = unmatched_records.drop(matched_labels)  # remove matched records from unmatched_records
+
+    results_df = results_df.drop_duplicates()
+    return results_df, unmatched_records, exclude_df, similar_clusters
+
+
+def match_people(df_orig_uploaded_file, people, people_index=None):
 
     if df_orig_uploaded_file is None or df_orig_uploaded_file.empty:
         print("Please upload your file.")
         return
     
     else:
-        exclude_df = pd.DataFrame(columns=df_orig_uploaded_file.columns)
-        unmatched_df = pd.DataFrame(columns=df_orig_uploaded_file.columns)
-        st.subheader(body='Match Parishioners',divider='blue')
-        results_df = pd.DataFrame()
-        # Count distinct Contributor Names in the uploaded file
-        distinct_bene_names = df_orig_uploaded_file['Contributor Name'].nunique()
-
-        # Check similar names and remove them from the dataframe
-        similar_names = check_similar_names(df_orig_uploaded_file)
-        if similar_names:
-            exclude_df = df_orig_uploaded_file[df_orig_uploaded_file['Contributor Name'].isin(similar_names)]
-            df_uploaded_file = df_orig_uploaded_file[~df_orig_uploaded_file['Contributor Name'].isin(similar_names)]
-        else:
-            df_uploaded_file = df_orig_uploaded_file
-
-        if df_uploaded_file is not None:
-            for index, row in df_uploaded_file.iterrows():
-            
-                # Direct matching
-                lookup_result = people.loc[(people['first_name'] == row['First_Name']) &
-                                        (people['last_name'] == row['Last_Name'])]
-                if not lookup_result.empty:
-                    lookup_result.loc[:, 'id'] = lookup_result['id']
-                    lookup_result.loc[:, 'Contributor Name'] = row['Contributor Name']  # Add 'Contributor Name' to lookup_result
-                    results_df = pd.concat([results_df, lookup_result])
-                else:
-                    unmatched_df = pd.concat([unmatched_df, pd.DataFrame(row).T])
-
-            unmatched_records = unmatched_df.copy()
-
-            # Fuzzy matching
-            for index, row in unmatched_df.iterrows():
-                max_score = 0
-                best_match = None
-                questionable_matches = []
-
-                for i, person in people.iterrows():
-                    score = fuzz.partial_ratio(row['Contributor Name'], person['first_name'] + ' ' + person['last_name'])
-                    #score = fuzz.token_sort_ratio(row['Contributor Name'], person['first_name'] + ' ' + person['last_name'])
-                    if score > max_score:
-                        max_score = score
-                        best_match = person
-                    if 80 < score <= 90 or ((score == 100) and len(row['First_Name'] + ' ' + row['Last_Name']) != len(person['first_name'] + ' ' + person['last_name'])):  # questionable match
-                        questionable_matches.append((person, score))
-                if max_score > 90:
-                    lookup_result = best_match
-                    print(lookup_result)
-                    print(max_score)
-                    print(row)
-                    lookup_result['id'] = lookup_result['id']
-                    lookup_result['Contributor Name'] = row['Contributor Name']
-                    results_df = pd.concat([results_df, pd.DataFrame(lookup_result).T])
-                    unmatched_records = unmatched_records.drop(index)  # remove matched record from unmatched_records
-                # elif questionable_matches:
-                #     st.warning(f"Questionable matches for {row['Contributor Name']}:")
-                    # approved_matches = []
-                    # for match, score in questionable_matches:
-                    #     is_approved = st.checkbox(f"Is {match['first_name']} {match['last_name']} with score {score} the right person?", value=False)
-                    #     if is_approved:
-                    #         approved_matches.append(match)
-                    # for match in approved_matches:
-                    #     # Assuming match is a dictionary with keys corresponding to columns in results_df
-                    #     match_df = pd.DataFrame(match, index=[0])
-                    #     results_df = pd.concat([results_df, match_df], ignore_index=True)
-                    
-            results_df = results_df.drop_duplicates()
-
-        if not results_df.empty:
-            st.markdown(f"<div style='color: white; font-size:16px;'>Found <b>{str(results_df['id'].count())}</b> out of <b>{str(distinct_bene_names)}</b> parishioners from the spreadsheet that matched in Breeze.  <b>{str(unmatched_records['First_Name'].count())}</b> parishioner(s) did not automatically match, and <b>{str(exclude_df['First_Name'].count())}</b> were excluded from the matching process since the names were too similar.</div>", unsafe_allow_html=True)            
-            st.write(results_df)
-            if not exclude_df.empty:
-                st.write("Excluded records:")
-                st.write(exclude_df)
-            if not unmatched_records.empty:
-                st.write("Unmatched records:")
-                st.write(unmatched_records)
-            return results_df
-        else:
-            print("No matches found")
-            return None
\ No newline at end of file
+        return display_matches(df_orig_uploaded_file,
+                               *find_matches(df_orig_uploaded_file, people, people_index))
+
+
+def display_matches(df_orig_uploaded_file, results_df, unmatched_records, exclude_df, similar_clusters):
+    # Show the output of find_matches; returns the matched people, or None if nobody matched
+    st.subheader(body='Match Parishioners',divider='blue')
+    # Count distinct Contributor Names in the uploaded file
+    distinct_bene_names = df_orig_uploaded_file['Contributor Name'].nunique()
+
+    if not results_df.empty:
+        st.markdown(f"<div style='color: white; font-size:16px;'>Found <b>{str(results_df['id'].count())}</b> out of <b>{str(distinct_bene_names)}</b> parishioners from the spreadsheet that matched in Breeze.  <b>{str(unmatched_records['First_Name'].count())}</b> parishioner(s) did not automatically match, and <b>{str(exclude_df['First_Name'].count())}</b> were excluded from the matching process since the names were too similar.</div>", unsafe_allow_html=True)            
+        st.write(results_df)
+        if not exclude_df.empty:
+            st.write("Excluded records:")
+            st.write(exclude_df)
+            st.write("Names that were too similar to each other:")
+            st.write(pd.DataFrame({'Similar Names': [', '.join(cluster) for cluster in similar_clusters]}))
+        if not unmatched_records.empty:
+            st.write("Unmatched records:")
+            st.write(unmatched_records)
+        return results_df
+    else:
+        print("No matches found")
+        return None
\ No newline at end of file
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+RECONCILE_GROUPINGS = ['Fund', 'Method', 'Date']
+# Submitted is Loaded + Failed: the rows the load tried to post to Breeze
+STATUSES = ['Loaded', 'Failed', 'Held Back', 'Deferred', 'Manual']
+
+
+def contribution_statuses(df_loaded, df_manual, errors=None, held_back=()):
+    # Every row of the upload with its Status: Loaded (has a payment id, from this run or an
+    # earlier one), Failed (has an error in errors, the {index: exception} returned by
+    # post_contributions), Held Back (in held_back, e.g. suspected duplicates), Deferred (not
+    # sent yet: past max_rows, a dry run, or before the first load) and Manual (flagged for
+    # manual entry).
+    payment_ids = df_loaded['Payment ID'] if 'Payment ID' in df_loaded.columns else pd.Series(None, index=df_loaded.index)
+    status = np.select([payment_ids.notna().to_numpy(), df_loaded.index.isin(list(errors or {})),
+                        df_loaded.index.isin(list(held_back))],
+                       ['Loaded', 'Failed', 'Held Back'], 'Deferred')
+    loaded = df_loaded.assign(Status=status)
+    # Empty frames are left out so they don't decide the dtypes of the result
+    frames = [frame for frame in (loaded, df_manual.assign(Status='Manual')) if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else loaded.reset_index(drop=True)
+
+
+def reconcile(df_statuses, by):
+    """Count and total of each status per group of `by` (a column name or list of them).
+
+    Totals are summed in integer cents and converted to dollars at the end. Columns are
+    '<status> Count' and '<status> Amount' for Submitted and each of STATUSES.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    grouped = (df_statuses.groupby(by + ['Status'], dropna=False)['Amount_Cents']
+               .agg(['size', 'sum'])
+               .unstack('Status', fill_value=0)
+               .reindex(columns=pd.MultiIndex.from_product([['size', 'sum'], STATUSES]), fill_value=0))
+    counts, cents = grouped['size'], grouped['sum']
+    counts.insert(0, 'Submitted', counts['Loaded'] + counts['Failed'])
+    cents.insert(0, 'Submitted', cents['Loaded'] + cents['Failed'])
+    report = pd.concat([counts.add_suffix(' Count'), (cents.astype('float64') / 100).add_suffix(' Amount')], axis=1)
+    return report[[f'{status} {column}' for status in ['Submitted'] + STATUSES for column in ('Count', 'Amount')]]
+
+
+def deposit_check(df_statuses, expected_total=None):
+    # Upload total and the total of each status ('loaded_total', 'failed_total', ...), and how
+    # far the upload is from the expected bank deposit (if one is given). balanced means the
+    # upload matches the deposit to the cent and every row is either loaded or flagged for
+    # manual entry.
+    cents = df_statuses.groupby('Status')['Amount_Cents'].sum().reindex(STATUSES, fill_value=0)
+    upload_cents = int(cents.sum())
+    check = {'upload_total': upload_cents / 100}
+    check.update({f"{status.lower().replace(' ', '_')}_total": int(cents[status]) / 100 for status in STATUSES})
+    check.update(expected_total=expected_total, difference=None)
+    balanced = cents[['Failed', 'Held Back', 'Deferred']].sum() == 0
+    if expected_total is not None:
+        difference = upload_cents - int(round(expected_total * 100))
+        check['difference'] = difference / 100
+        balanced = balanced and difference == 0
+    check['balanced'] = bool(balanced)
+    return check
+
+
+def display_reconciliation(df_statuses):
+    st.subheader(body='Reconciliation',divider='blue')
+    expected_total = st.number_input("Expected deposit total (optional)", min_value=0.0, value=None, step=0.01,
+                                     format='%.2f', help="The bank deposit this upload should add up to.")
+    check = deposit_check(df_statuses, expected_total)
+    columns = st.columns(6)
+    columns[0].metric('Upload total', f"${check['upload_total']:,.2f}")
+    columns[1].metric('Loaded', f"${check['loaded_total']:,.2f}")
+    columns[2].metric('Failed', f"${check['failed_total']:,.2f}")
+    columns[3].metric('Held back', f"${check['held_back_total']:,.2f}")
+    columns[4].metric('Deferred', f"${check['deferred_total']:,.2f}")
+    columns[5].metric('Manual entry', f"${check['manual_total']:,.2f}")
+    if check['difference']:
+        st.error(f"The upload is ${check['difference']:+,.2f} off the expected deposit of ${expected_total:,.2f}.")
+    if check['failed_total']:
+        st.error("Some contributions failed to load (see the errors above). Check Breeze for them before loading again.")
+    if check['held_back_total']:
+        st.warning("Some contributions were held back as possible duplicates of gifts already in Breeze.")
+    if check['deferred_total']:
+        st.warning("Some contributions have not been sent yet. Press Load Contributions again to load the rest.")
+    if check['balanced']:
+        st.success("Balanced: every contribution is loaded or flagged for manual entry"
+                   + (" and the upload matches the deposit." if expected_total is not None else "."))
+
+    for tab, by in zip(st.tabs([f'By {by}' for by in RECONCILE_GROUPINGS]), RECONCILE_GROUPINGS):
+        with tab:
+            st.dataframe(reconcile(df_statuses, by), use_container_width=True)
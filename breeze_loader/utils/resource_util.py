@@ -0,0 +1,31 @@
+import streamlit as st
+from utils.api_util import connect_to_breeze
+from utils.funds_util import FundResolver
+from utils.journal_util import LoadJournal
+from utils.ppl_util import PeopleDirectory
+
+# Clients shared by every session of the Streamlit server process. st.cache_resource builds
+# each one on first use and hands the same object to every rerun and session after that, so
+# they must be safe to use from several threads (each keeps its own lock where needed).
+
+
+@st.cache_resource
+def get_breeze_client():
+    # One BreezeApi with a keep-alive session, instead of a new client on every rerun
+    return connect_to_breeze()
+
+
+@st.cache_resource
+def get_fund_resolver():
+    return FundResolver(get_breeze_client())
+
+
+@st.cache_resource
+def get_people_directory():
+    return PeopleDirectory(get_breeze_client())
+
+
+@st.cache_resource
+def get_load_journal():
+    # Journal of loaded rows, so an interrupted load can be re-run without double-posting
+    return LoadJournal()
@@ -1,7 +1,14 @@
+import numpy as np
 import pandas as pd
 import io
+import openpyxl
+import datetime as dt
 import streamlit as st
 
+CONTRIBUTION_COLUMNS = ['Date', 'Contributor Name', 'Amount', 'Fund', 'Method']
+CHUNK_ROWS = 5000       # rows read and normalized at a time
+PREVIEW_ROWS = 1000     # rows of the upload shown in the app
+
 def generate_template():
     # Create a DataFrame (replace this with your actual data)
     data = {
@@ -22,39 +29,127 @@ def generate_template():
     return output.getvalue()
 
 
-def get_upload_file():
-    st.subheader(body='Upload an .xlsx file',divider='blue') 
-    uploaded_file = st.file_uploader("""Make sure your file is in the correct format by using the template in the sidebar.  
-                                     """, type=['xlsx'],
+def read_contribution_chunks(uploaded_file, file_name, chunk_size=CHUNK_ROWS):
+    # Stream the rows of an .xlsx or .csv file as DataFrames of up to chunk_size rows.
+    # Workbooks are opened in openpyxl read-only mode, so only one chunk of cells is
+    # materialized at a time.
+    if file_name.lower().endswith('.csv'):
+        yield from pd.read_csv(uploaded_file, chunksize=chunk_size)
+        return
+
+    workbook = openpyxl.load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(column) if column is not None else '' for column in header]
+        chunk = []
+        for row in rows:
+            if any(value is not None for value in row):
+                chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+def normalize_contributions(df):
+    # Validate and normalize one chunk of contribution records in a single vectorized pass
+    df = df.rename(columns=lambda column: str(column).strip())
+    df = df.loc[:, [column for column in df.columns if column and not column.startswith('Unnamed:')]]
+    missing = [column for column in CONTRIBUTION_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+
+    df['Date'] = pd.to_datetime(df['Date'], format='mixed', errors='coerce')
+    amount = df['Amount']
+    if amount.dtype == object:
+        amount = amount.astype(str).str.replace(r'[$,\s]', '', regex=True)
+    df['Amount'] = pd.to_numeric(amount, errors='coerce')
+    for column in ['Fund', 'Method']:
+        df[column] = df[column].where(df[column].isna(), df[column].astype(str).str.strip())
+
+    # Split the Contributor Name into First and Last Name
+    df['Contributor Name'] = df['Contributor Name'].astype(str).str.strip()
+    name_parts = df['Contributor Name'].str.split()
+    df['First_Name'] = name_parts.str[0]
+    df['Last_Name'] = name_parts.str[1]
+    return df
+
+
+def read_contributions(uploaded_file, file_name, chunk_size=CHUNK_ROWS):
+    chunks = [normalize_contributions(chunk) for chunk in read_contribution_chunks(uploaded_file, file_name, chunk_size)]
+    if not chunks:
+        return pd.DataFrame(columns=CONTRIBUTION_COLUMNS + ['First_Name', 'Last_Name'])
+    return pd.concat(chunks, ignore_index=True)
+
+
+def upload_widget():
+    st.subheader(body='Upload an .xlsx or .csv file',divider='blue') 
+    return st.file_uploader("""Make sure your file is in the correct format by using the template in the sidebar.  
+                                     """, type=['xlsx', 'csv'],
                                      help="""Ex.)
                                             \nDate | Contributor Name | Amount | Fund | Method
                                            \n2023-01-01 | John Doe | 100.00 | General Fund | Cemetery""")
 
+
+def show_upload(contr_data):
+    st.write('Original Data:')
+    st.dataframe(data=contr_data.head(PREVIEW_ROWS), use_container_width=True)
+    if len(contr_data) > PREVIEW_ROWS:
+        st.caption(f"Showing the first {PREVIEW_ROWS:,} of {len(contr_data):,} rows.")
+
+    invalid = contr_data['Date'].isna() | contr_data['Amount'].isna()
+    if invalid.any():
+        st.warning("The following rows have a missing or invalid Date or Amount:")
+        st.write(contr_data.loc[invalid, CONTRIBUTION_COLUMNS])
+
+
+def get_upload_file():
+    uploaded_file = upload_widget()
+
     # Check if a file has been uploaded
     if uploaded_file is not None:
 
         try:
-            # Convert the uploaded file into a Pandas DataFrame
-            df = pd.read_excel(uploaded_file)
-            st.write('Original Data:')
-            st.dataframe(data=df, use_container_width=True)
-            contr_data = df
-            # Split the Contributor Name into First and Last Name
-            contr_data['Contributor Name'] = contr_data['Contributor Name'].astype(str)
-            contr_data['First_Name'] = contr_data['Contributor Name'].str.split().str[0]
-            contr_data['Last_Name'] = contr_data['Contributor Name'].str.split().str[1]
+            # Read the uploaded file into a Pandas DataFrame in chunks, normalizing as it goes
+            contr_data = read_contributions(uploaded_file, uploaded_file.name)
+            show_upload(contr_data)
             return contr_data
         except Exception as e:
             st.error(f'Error: {e}')
     return None
 
 
+def to_cents(amounts):
+    # Amounts as exact integer cents (nullable, so missing amounts stay missing)
+    return (pd.to_numeric(amounts, errors='coerce') * 100).round().astype('Int64')
+
+
+def format_cents(cents):
+    # '1250.50' strings for Breeze and the load journal
+    return (cents.astype('float64') / 100).map('{:.2f}'.format)
+
+
+def format_date(date):
+    # One contribution date as Breeze expects it, YYYY-MM-DD
+    return date.strftime('%Y-%m-%d') if isinstance(date, dt.date) and not pd.isna(date) else date
+
+
 def merge_spreasheet(df_uploaded_file, df_ppl_matched):
     merged_df = df_uploaded_file.merge(df_ppl_matched,how='left',left_on='Contributor Name',right_on='Contributor Name')
-    
-    merged_df['Manually Enter'] = merged_df.apply(lambda row: 'Y' if pd.isna(row['id']) else 'N', axis=1)
-    merged_df['Date'] = pd.to_datetime(merged_df['Date']).dt.strftime('%Y-%m-%d')
-    merged_df['Amount'] = merged_df['Amount'].astype(float).round(2)
-    merged_df['Amount'] = merged_df['Amount'].map('{:.2f}'.format)
+
+    merged_df['Manually Enter'] = np.where(merged_df['id'].isna(), 'Y', 'N')
+    # Dates and amounts were parsed when the file was read. They stay typed from here on
+    # (Amount_Cents is the exact amount) and are only formatted as strings where they leave
+    # the app: the Breeze API call, the load journal and exports.
+    if not pd.api.types.is_datetime64_any_dtype(merged_df['Date']):
+        merged_df['Date'] = pd.to_datetime(merged_df['Date'], format='mixed', errors='coerce')
+    merged_df['Amount_Cents'] = to_cents(merged_df['Amount'])
+    merged_df['Amount'] = merged_df['Amount_Cents'].astype('float64') / 100
 
     return merged_df
@@ -0,0 +1,45 @@
+import hashlib
+import threading
+import streamlit as st
+from utils.trace_util import count, span
+
+
+class StageCache:
+    """Last output of each loader stage, with the key it was computed for.
+
+    A stage's key is built from everything it depends on (the uploaded file's hash, the
+    people directory and fund list versions, the keys of the stages before it), so a rerun
+    only recomputes the stages downstream of whatever changed. Only the latest output of
+    each stage is kept.
+    """
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def run(self, name, key, compute):
+        with self._lock:
+            cached = self._stages.get(name)
+        if cached is not None and cached[0] == key:
+            count(f'stage.{name}.hit')
+            return cached[1]
+        count(f'stage.{name}.miss')
+        with span(f'stage.{name}'):
+            value = compute()
+        with self._lock:
+            self._stages[name] = (key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+
+
+def session_stages():
+    # One StageCache per browser session
+    return st.session_state.setdefault('loader_stages', StageCache())
+
+
+def file_hash(uploaded_file):
+    # Content hash of an uploaded file, the root key of every stage
+    return hashlib.sha256(uploaded_file.getvalue()).hexdigest()
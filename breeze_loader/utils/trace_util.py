@@ -0,0 +1,133 @@
+import contextvars
+import datetime as dt
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+import pandas as pd
+import streamlit as st
+
+TRACE_LOGGER = 'breeze_loader.trace'    # one JSON line per run; BREEZE_TRACE_LOG sends it to a file
+
+_current_trace = contextvars.ContextVar('breeze_trace', default=None)
+_logger_lock = threading.Lock()
+
+
+class Trace:
+    """Timings and counters for one run of the loader.
+
+    Spans are aggregated by name (calls, total and max seconds) rather than kept one by
+    one, so tracing a few thousand API calls stays cheap. Spans and counters can be
+    recorded from worker threads.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.time()
+        self.seconds = None
+        self.spans = {}
+        self.counters = Counter()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_span(self, name, seconds):
+        with self._lock:
+            stats = self.spans.setdefault(name, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self._start
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'trace': self.name,
+                'started_at': dt.datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+                'seconds': round(self.seconds if self.seconds is not None else time.perf_counter() - self._start, 4),
+                'spans': {name: {'calls': stats['calls'], 'seconds': round(stats['seconds'], 4),
+                                 'max_seconds': round(stats['max_seconds'], 4)}
+                          for name, stats in self.spans.items()},
+                'counters': dict(self.counters),
+            }
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def tracing(name):
+    # Collect spans and counters for everything run inside the block, then log them as JSON
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.finish()
+        export(trace)
+
+
+@contextmanager
+def span(name):
+    # Time a block under the current trace; does nothing when no trace is active
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, time.perf_counter() - start)
+
+
+def count(name, n=1):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.count(name, n)
+
+
+def trace_logger():
+    logger = logging.getLogger(TRACE_LOGGER)
+    with _logger_lock:
+        if not logger.handlers:
+            log_path = os.getenv('BREEZE_TRACE_LOG')
+            handler = logging.FileHandler(log_path) if log_path else logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+    return logger
+
+
+def export(trace):
+    trace_logger().info(json.dumps(trace.to_dict()))
+
+
+def show_trace_panel(username):
+    # Admin-only sidebar expander, filled in at the end of the run by display_trace
+    admins = [user.strip() for user in os.getenv('BREEZE_ADMIN_USERS', '').split(',') if user.strip()]
+    if username not in admins:
+        return None
+    return st.sidebar.expander('Run timings').empty()
+
+
+def display_trace(trace, container):
+    data = trace.to_dict()
+    with container.container():
+        st.caption(f"{data['seconds']:.2f}s total, {data['started_at']}")
+        if data['spans']:
+            spans = pd.DataFrame.from_dict(data['spans'], orient='index').sort_values('seconds', ascending=False)
+            st.dataframe(spans, use_container_width=True)
+        if data['counters']:
+            st.dataframe(pd.Series(data['counters'], name='count').sort_index(), use_container_width=True)
@@ -0,0 +1,79 @@
+"""Benchmark the memory footprint of the festival frames: object-dtype frames built from the
+libsql rows (as the dashboard used to load them) vs the typed frames from schema_util.
+
+Run from the festival_analysis directory:
+    python -m benchmarks.bench_memory [--festivals 1 3 10] [--transactions 6000]
+"""
+import argparse
+import datetime as dt
+import random
+
+import pandas as pd
+
+from util.schema_util import (ORDER_ITEMS_SCHEMA, ORDER_ITEMS_TABLE, TRANSACTIONS_SCHEMA, TRANSACTIONS_TABLE,
+                              rows_to_arrow, typed_frame)
+
+MENU = {
+    'Food': ['Gyro', 'Souvlaki', 'Pastitsio', 'Moussaka', 'Spanakopita', 'Tiropita', 'Dolmades', 'Greek Salad'],
+    'Pastries': ['Baklava', 'Loukoumades', 'Galaktoboureko', 'Koulourakia', 'Kourabiedes', 'Finikia'],
+    'Drinks': ['Soda', 'Water', 'Beer', 'Wine', 'Greek Coffee', 'Frappe'],
+    'Market': ['Raffle Ticket', 'T-Shirt', 'Cookbook', 'Icon'],
+}
+PRICE_POINTS = ['Regular', 'Large', 'Plate', 'Half Dozen', 'Dozen']
+
+
+def synthetic_festivals(festivals, transactions_per_festival, seed=0):
+    # Rows shaped like the libsql results: one three-day festival a year, 1-4 items per transaction
+    rng = random.Random(seed)
+    order_items, transactions = [], []
+    for year in range(2024 - festivals + 1, 2025):
+        days = [dt.date(year, 6, 7) + dt.timedelta(days=offset) for offset in range(3)]
+        for _ in range(transactions_per_festival):
+            transaction_id = f'{rng.getrandbits(64):016x}'
+            day, time = rng.choice(days).isoformat(), f'{rng.randint(11, 21):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}'
+            total = 0
+            for _ in range(rng.randint(1, 4)):
+                category = rng.choice(list(MENU))
+                qty, price = rng.randint(1, 3), rng.choice([3, 5, 8, 12.5, 15])
+                total += qty * price
+                order_items.append((f'{rng.getrandbits(64):016x}', day, time, category, rng.choice(MENU[category]), qty,
+                                    rng.choice(PRICE_POINTS), '', qty * price, 0.0, qty * price, 0.0, transaction_id,
+                                    f'P{transaction_id}', None, None, None, 1, f'tok_{rng.getrandbits(48):012x}'))
+            card = rng.random() < 0.7
+            fees = round(total * 0.026 + 0.15, 2) if card else 0.0
+            transactions.append((transaction_id, day, time, total, 0.0, 0.0, total, 0.0, 0.0, 0.0, 0.0, total,
+                                 total if card else 0.0, 'Contactless' if card else '', 0.0 if card else total, fees,
+                                 total - fees, f'P{transaction_id}', rng.choice(['Visa', 'Mastercard', 'Amex']) if card else '',
+                                 f'{rng.randint(0, 9999):04d}' if card else '', None, None, None, 2.6, 0.15, 'Complete'))
+    return order_items, transactions
+
+
+def legacy_frame(rows, schema):
+    # What the dashboard used to hold: object columns straight from the tuples, Date parsed
+    df = pd.DataFrame(rows, columns=schema.names)
+    df['Date'] = pd.to_datetime(df['Date'], dayfirst=False, errors='coerce')
+    return df
+
+
+def megabytes(df):
+    return df.memory_usage(index=True, deep=True).sum() / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--festivals', type=int, nargs='+', default=[1, 3, 10])
+    parser.add_argument('--transactions', type=int, default=6000, help='transactions per festival')
+    args = parser.parse_args()
+
+    print(f"{'festivals':>9} {'table':<22} {'rows':>8} {'legacy MB':>10} {'typed MB':>9} {'reduction':>10}")
+    for festivals in args.festivals:
+        order_items, transactions = synthetic_festivals(festivals, args.transactions)
+        for table_name, rows, schema in ((ORDER_ITEMS_TABLE, order_items, ORDER_ITEMS_SCHEMA),
+                                         (TRANSACTIONS_TABLE, transactions, TRANSACTIONS_SCHEMA)):
+            legacy = megabytes(legacy_frame(rows, schema))
+            typed = megabytes(typed_frame(table_name, rows_to_arrow(rows, schema)))
+            print(f'{festivals:>9} {table_name:<22} {len(rows):>8} {legacy:>10.1f} {typed:>9.1f} {legacy / typed:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
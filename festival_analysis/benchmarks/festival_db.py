@@ -0,0 +1,28 @@
+"""A local SQLite copy of the festival tables, for tests and benchmarks.
+
+SQLite speaks the same SQL as the libsql replica and has the same implicit rowid, so the
+table cache and the SQL filters run against it unchanged.
+"""
+import sqlite3
+import pyarrow as pa
+from util.schema_util import TABLE_SCHEMAS
+
+
+def create_festival_tables(conn):
+    # The festival tables as they are in Turso: text and real columns
+    for table_name, schema in TABLE_SCHEMAS.items():
+        columns = ', '.join(f'{field.name} {"text" if pa.types.is_string(field.type) else "real"}' for field in schema)
+        conn.execute(f'create table {table_name} ({columns})')
+
+
+def insert_rows(conn, table_name, rows):
+    placeholders = ', '.join('?' * len(TABLE_SCHEMAS[table_name]))
+    with conn:
+        conn.executemany(f'insert into {table_name} values ({placeholders})', rows)
+
+
+def festival_db(path):
+    # Connection on a new database at path with empty festival tables
+    conn = sqlite3.connect(path)
+    create_festival_tables(conn)
+    return conn
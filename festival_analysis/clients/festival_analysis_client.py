@@ -1,6 +1,14 @@
+import logging
+import os
 import streamlit as st
 import pandas as pd
-from util.db_util import connect_turso_db
+from util.resource_util import get_computation_cache, get_sync_manager, get_table_cache
+from util.rollup_util import aggregate
+from util.schema_util import (ORDER_ITEMS_SCHEMA, ORDER_ITEMS_TABLE, TRANSACTIONS_SCHEMA, TRANSACTIONS_TABLE,
+                               rows_to_arrow, typed_frame)
+
+logger = logging.getLogger(__name__)
+
 # from dotenv import load_dotenv
 # from langchain import LLMChain
 # from langchain_groq import ChatGroq
@@ -11,66 +19,152 @@ from util.db_util import connect_turso_db
 
 
 class FestivalAnalyzer:
+    # (table, column) indexes that the sidebar filters rely on
+    FILTER_INDEXES = [(ORDER_ITEMS_TABLE, 'Date'), (ORDER_ITEMS_TABLE, 'Item'), (ORDER_ITEMS_TABLE, 'Transaction_ID'),
+                      (TRANSACTIONS_TABLE, 'Date'), (TRANSACTIONS_TABLE, 'Transaction_ID')]
+
     def __init__(self):
-        self.conn = connect_turso_db()
+        # Reads go to the local replica; the sync manager keeps it up to date in the background.
+        # The sync manager and the Arrow cache are shared by all sessions, the connection is not.
+        self.sync = get_sync_manager()
+        self.conn = self.sync.connect()
         self.cursor = self.conn.cursor()
-        print('------CONN-----', self.conn)
+        # Read from a local Arrow copy of the tables unless FESTIVAL_LOCAL_CACHE=0, in which
+        # case every filter change is pushed down to libsql instead
+        self.cache = get_table_cache() if os.getenv('FESTIVAL_LOCAL_CACHE', '1') != '0' else None
+        if self.cache is None:
+            self.ensure_indexes()
+        logger.debug('Connected to %s', self.conn)
+
+    def ensure_indexes(self):
+        # Through a replica connection, so the indexes are created on the primary and synced back
+        cursor = self.sync.connect_replica().cursor()
+        for table_name, column in self.FILTER_INDEXES:
+            try:
+                cursor.execute(f'create index if not exists idx_{table_name}_{column.lower()} on {table_name} ({column})')
+            except Exception as e:
+                # A read-only token cannot create indexes; filtering still works without them
+                logger.warning('Could not create index on %s.%s: %s', table_name, column, e)
 
-    def fetch_order_items(self):
-        self.cursor.execute('''select item_order_id, Date, Time, Category, Item, Qty, Price_Point_Name, Modifiers_Applied,
-                            Gross_Sales, Discounts, Net_Sales, Tax, Transaction_ID, Payment_ID, Customer_ID, Customer_Name,
-                            Customer_Reference_ID, Count, Token
-                            from festival_item_orders''')
+    @staticmethod
+    def build_filter_clause(table_name, date_range=None, excluded_items=()):
+        # WHERE clause and parameters for the active sidebar filters on one table. Dates are
+        # stored as YYYY-MM-DD text, so the range compares as text and can use the Date index.
+        conditions, params = [], []
+        if date_range is not None:
+            conditions.append('Date between ? and ?')
+            params += [date.isoformat() for date in date_range]
+        if excluded_items:
+            if table_name == ORDER_ITEMS_TABLE:
+                conditions.append(f"(Item is null or Item not in ({', '.join('?' * len(excluded_items))}))")
+                params += list(excluded_items)
+            else:
+                # Keep the transactions that still have an order item after the filters
+                items_clause, items_params = FestivalAnalyzer.build_filter_clause(ORDER_ITEMS_TABLE, date_range, excluded_items)
+                conditions.append(f'Transaction_ID in (select Transaction_ID from {ORDER_ITEMS_TABLE}{items_clause})')
+                params += items_params
+        return (' where ' + ' and '.join(conditions) if conditions else ''), tuple(params)
+
+    def fetch_order_items(self, date_range=None, excluded_items=()):
+        where, params = self.build_filter_clause(ORDER_ITEMS_TABLE, date_range, excluded_items)
+        self.cursor.execute(f"select {', '.join(ORDER_ITEMS_SCHEMA.names)} from {ORDER_ITEMS_TABLE}{where}", params)
         order_items = self.cursor.fetchall()
         columns = [desc[0] for desc in self.cursor.description]
         return order_items, columns
 
-    def fetch_transactions(self):
-        self.cursor.execute('''select Transaction_ID, Date, Time, Gross_Sales, Discounts, Service_Charges, Net_Sales,
-                            Gift_Card_Sales, Tax, Tip, Partial_Refunds, Total_Collected, Card, Card_Entry_Methods, Cash,
-                            Fees, Net_Total, Payment_ID, Card_Brand, PAN_Suffix, Customer_ID, Customer_Name, Customer_Reference_ID,
-                            Fee_Percentage_Rate, Fee_Fixed_Rate, Transaction_Status
-                            from festival_transactions''')
+    def fetch_transactions(self, date_range=None, excluded_items=()):
+        where, params = self.build_filter_clause(TRANSACTIONS_TABLE, date_range, excluded_items)
+        self.cursor.execute(f"select {', '.join(TRANSACTIONS_SCHEMA.names)} from {TRANSACTIONS_TABLE}{where}", params)
         transactions = self.cursor.fetchall()
         columns = [desc[0] for desc in self.cursor.description]
         return transactions, columns
 
+    def fetch_date_range(self):
+        if self.cache is not None:
+            return self.cache.date_range()
+        dates = []
+        for table_name in (ORDER_ITEMS_TABLE, TRANSACTIONS_TABLE):
+            self.cursor.execute(f'select min(Date), max(Date) from {table_name}')
+            dates += [date for date in self.cursor.fetchone() if date is not None]
+        return (min(dates), max(dates)) if dates else (None, None)
+
+    def fetch_items(self, date_range=None):
+        if self.cache is not None:
+            return self.cache.items(date_range)
+        where, params = self.build_filter_clause(ORDER_ITEMS_TABLE, date_range)
+        self.cursor.execute(f'select distinct Item from {ORDER_ITEMS_TABLE}{where} order by Item', params)
+        return [item for item, in self.cursor.fetchall() if item is not None]
+
+    def load_frames(self, date_range=None, excluded_items=()):
+        # Only the rows matching the filters are read, from the local cache or from libsql
+        if self.cache is not None:
+            order_items, transactions = self.cache.filtered_tables(date_range, excluded_items)
+        else:
+            order_items = rows_to_arrow(self.fetch_order_items(date_range, excluded_items)[0], ORDER_ITEMS_SCHEMA)
+            transactions = rows_to_arrow(self.fetch_transactions(date_range, excluded_items)[0], TRANSACTIONS_SCHEMA)
+        # Typed frames: categoricals, money in cents and a single Timestamp column
+        return typed_frame(ORDER_ITEMS_TABLE, order_items), typed_frame(TRANSACTIONS_TABLE, transactions)
+
+    def load_rollups(self, date_range=None, excluded_items=()):
+        # Per-day/hour/item totals for the dashboard views. They come straight from the stored
+        # rollups unless items are excluded, since dropping items changes which transactions
+        # count; then the matching rows are loaded and rolled up here.
+        if self.cache is not None and not excluded_items:
+            return (self.cache.rollups.frame(ORDER_ITEMS_TABLE, date_range),
+                    self.cache.rollups.frame(TRANSACTIONS_TABLE, date_range))
+        order_items_df, transactions_df = self.load_frames(date_range, excluded_items)
+        return aggregate(ORDER_ITEMS_TABLE, order_items_df), aggregate(TRANSACTIONS_TABLE, transactions_df)
+
     @staticmethod
-    def display_metrics(transactions_df, order_items_df):
+    def compute_metrics(transactions_rollup, order_items_rollup):
+        totals = transactions_rollup[['Gross_Sales', 'Discounts', 'Fees', 'Net_Sales', 'Net_Total', 'Count']].sum().astype(float)
+        # Rollup money is in cents
+        totals[['Gross_Sales', 'Discounts', 'Fees', 'Net_Sales', 'Net_Total']] /= 100
+        totals['Items_Sold'] = order_items_rollup['Count'].sum()
+        return totals
+
+    @staticmethod
+    def display_metrics(totals):
+        items_sold = totals['Items_Sold']
         # Create three columns
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric('Gross Sales:', f"{transactions_df['Gross_Sales'].sum():,.2f}", delta=f"{transactions_df['Gross_Sales'].sum()-85853.28:,.2f}")
-            st.write('Discounts:  ', f" {transactions_df['Discounts'].sum():,.2f}")
-            st.write('Square Fees:  ', f" {transactions_df['Fees'].sum():,.2f}")
+            st.metric('Gross Sales:', f"{totals['Gross_Sales']:,.2f}", delta=f"{totals['Gross_Sales']-85853.28:,.2f}")
+            st.write('Discounts:  ', f" {totals['Discounts']:,.2f}")
+            st.write('Square Fees:  ', f" {totals['Fees']:,.2f}")
         with col2:
-            st.metric('Net Sales:', f"{transactions_df['Net_Sales'].sum():,.2f}", delta=f"{transactions_df['Net_Sales'].sum()-84738.78:,.2f}")
-            st.write('Number of Items Sold:  ', f" {order_items_df.shape[0]:,.2f}")
-            st.write('Number of Transactions:  ', f" {transactions_df.shape[0]:,.2f}")
+            st.metric('Net Sales:', f"{totals['Net_Sales']:,.2f}", delta=f"{totals['Net_Sales']-84738.78:,.2f}")
+            st.write('Number of Items Sold:  ', f" {items_sold:,.2f}")
+            st.write('Number of Transactions:  ', f" {totals['Count']:,.2f}")
         with col3:
-            st.metric('Net Total:', f"{transactions_df['Net_Total'].sum():,.2f}", delta=f"{transactions_df['Net_Total'].sum()-82924.26:,.2f}")
-            st.write('Avg. Items per Trans:  ', f" {order_items_df.shape[0] / transactions_df.shape[0]:,.2f}")
-            st.write('Avg. Net Sales per Trans:  ', f" {transactions_df['Net_Sales'].mean():,.2f}")
+            st.metric('Net Total:', f"{totals['Net_Total']:,.2f}", delta=f"{totals['Net_Total']-82924.26:,.2f}")
+            st.write('Avg. Items per Trans:  ', f" {items_sold / totals['Count']:,.2f}")
+            st.write('Avg. Net Sales per Trans:  ', f" {totals['Net_Sales'] / totals['Count']:,.2f}")
 
     @staticmethod
-    def display_item_sales(order_items_df):
-        st.header('Item Sales')
+    def compute_item_sales(order_items_rollup):
         # Group and aggregate data by Item
-        item_sales = order_items_df.groupby('Item').agg({'Qty': 'sum', 'Net_Sales': 'sum'}).reset_index()
-        item_sales['Net_Sales'] = item_sales['Net_Sales'].astype(float)
+        item_sales = order_items_rollup.groupby('Item', observed=True).agg({'Qty': 'sum', 'Net_Sales': 'sum'}).reset_index()
+        item_sales['Net_Sales'] = item_sales['Net_Sales'] / 100
         # Sort by Net_Sales in descending order
-        item_sales = item_sales.sort_values(by='Net_Sales', ascending=False)
+        return item_sales.sort_values(by='Net_Sales', ascending=False)
+
+    @staticmethod
+    def display_item_sales(item_sales):
+        st.header('Item Sales')
         # Display the aggregated data by Item
         st.dataframe(item_sales, hide_index=True, use_container_width=True)
 
     @staticmethod
-    def display_item_details(order_items_df):
-        st.header('Item Details')
-        item_sales_pp = order_items_df.groupby(['Item', 'Price_Point_Name', 'Date']).agg({'Qty': 'sum'}).reset_index()
-        item_sales_pp['Date'] = pd.to_datetime(item_sales_pp['Date'])
+    def compute_item_details(order_items_rollup):
+        item_sales_pp = (order_items_rollup.groupby(['Item', 'Price_Point_Name', 'Date'], observed=True)
+                         .agg({'Qty': 'sum'}).reset_index())
         item_sales_pp['Day'] = item_sales_pp['Date'].dt.date
-        item_sales_pp = item_sales_pp.sort_values(by=['Item', 'Day'])
+        return item_sales_pp.sort_values(by=['Item', 'Day'])
 
+    @staticmethod
+    def display_item_details(item_sales_pp):
+        st.header('Item Details')
         selected_item = st.selectbox('Select an Item', item_sales_pp['Item'].unique())
         item_data = item_sales_pp[item_sales_pp['Item'] == selected_item]
         st.dataframe(item_data, hide_index=True, use_container_width=True)
@@ -78,62 +172,82 @@ class FestivalAnalyzer:
         st.bar_chart(price_point_data.pivot(index='Day', columns='Price_Point_Name', values='Qty'), use_container_width=True)
 
     @staticmethod
-    def display_transactions_over_time(transactions_df):
-        st.header('Transactions by Day and Hour of the Day')
-        transactions_df['Date'] = pd.to_datetime(transactions_df['Date'], dayfirst=False, errors='coerce')
-        transactions_df['Time'] = pd.to_datetime(transactions_df['Time'], format='%H:%M:%S')
-        transactions_df['Day'] = transactions_df['Date'].dt.day_name()
-        transactions_df['Hour'] = transactions_df['Time'].dt.hour
-        transactions_grouped = transactions_df.groupby(['Day', 'Hour']).size().reset_index(name='Count')
+    def compute_transactions_over_time(transactions_rollup):
+        transactions_by_day = transactions_rollup.assign(Day=transactions_rollup['Date'].dt.day_name())
+        transactions_grouped = transactions_by_day.groupby(['Day', 'Hour'])['Count'].sum().reset_index()
+        transactions_grouped['Hour'] = transactions_grouped['Hour'].astype(int)
         transactions_grouped['Day_Hour'] = transactions_grouped['Day'] + ' ' + transactions_grouped['Hour'].astype(str)
         transactions_grouped = transactions_grouped.sort_values(by=['Day', 'Hour'])
-        st.line_chart(transactions_grouped.set_index('Day_Hour')['Count'])
+        return transactions_grouped.set_index('Day_Hour')['Count']
+
+    @staticmethod
+    def display_transactions_over_time(transactions_by_hour):
+        st.header('Transactions by Day and Hour of the Day')
+        st.line_chart(transactions_by_hour)
+
+    def compute_views(self, date_range=None, excluded_items=()):
+        # Everything the dashboard shows for one set of filters, ready to render
+        order_items_rollup, transactions_rollup = self.load_rollups(date_range, excluded_items)
+        return {
+            'order_items_rollup': order_items_rollup,
+            'transactions_rollup': transactions_rollup,
+            'metrics': self.compute_metrics(transactions_rollup, order_items_rollup),
+            'item_sales': self.compute_item_sales(order_items_rollup),
+            'item_details': self.compute_item_details(order_items_rollup),
+            'transactions_over_time': self.compute_transactions_over_time(transactions_rollup),
+        }
+
+    def load_views(self, data_version, date_range=None, excluded_items=()):
+        # Reruns with filters seen before (for the same data) are served from memory
+        key = (date_range, tuple(sorted(excluded_items)))
+        return get_computation_cache().get_or_compute(data_version, key,
+                                                      lambda: self.compute_views(date_range, excluded_items))
+
+    def display_sync_status(self):
+        if self.sync.last_synced_at is not None:
+            st.sidebar.caption(f'Data synced {self.sync.last_synced_at:%Y-%m-%d %H:%M}')
+        else:
+            st.sidebar.caption('Showing the local copy; syncing in the background')
+        if self.sync.last_error is not None:
+            st.sidebar.warning(f'Last sync failed: {self.sync.last_error}')
 
     @staticmethod
-    def filter_dates(order_items_df, transactions_df):
-        # Convert the 'Date' columns to datetime format
-        order_items_df['Date'] = pd.to_datetime(order_items_df['Date'], dayfirst=False, errors='coerce')
-        transactions_df['Date'] = pd.to_datetime(transactions_df['Date'], dayfirst=False, errors='coerce')
-        # Fetch the minimum and maximum dates from the DataFrames
-        min_date = min(order_items_df['Date'].min(), transactions_df['Date'].min())
-        max_date = max(order_items_df['Date'].max(), transactions_df['Date'].max())
+    def filter_dates(min_date, max_date):
         # Ensure min_date and max_date are of type datetime.date
-        min_date = min_date.date()
-        max_date = max_date.date()
+        min_date = pd.to_datetime(min_date).date()
+        max_date = pd.to_datetime(max_date).date()
         # Create a Streamlit slider for date filtering
         date_filter = st.sidebar.slider('Date Filter', min_date, max_date, (min_date, max_date), format="YYYY-MM-DD")
-        # Filter the DataFrames by the selected date range
-        order_items_df = order_items_df[(order_items_df['Date'] >= pd.to_datetime(date_filter[0])) & (order_items_df['Date'] <= pd.to_datetime(date_filter[1]))]
-        transactions_df = transactions_df[(transactions_df['Date'] >= pd.to_datetime(date_filter[0])) & (transactions_df['Date'] <= pd.to_datetime(date_filter[1]))]
-        return order_items_df, transactions_df
+        return date_filter
 
     @staticmethod
-    def filter_items(order_items_df, transactions_df):
-        items_to_exclude = st.sidebar.multiselect('Exclude Items', sorted(order_items_df['Item'].unique()))
-        if items_to_exclude:
-            order_items_df = order_items_df[~order_items_df['Item'].isin(items_to_exclude)]
-            # Filter transactions based on the filtered order items
-            filtered_transaction_ids = order_items_df['Transaction_ID'].unique()
-            transactions_df = transactions_df[transactions_df['Transaction_ID'].isin(filtered_transaction_ids)]
-        return order_items_df, transactions_df
+    def filter_items(items):
+        items_to_exclude = st.sidebar.multiselect('Exclude Items', sorted(items))
+        return tuple(items_to_exclude)
 
     def execute(self):
         tab1, tab2 = st.tabs(['Dashboard', 'Chat'])
 
         with tab1:
             st.title('Festival Analysis Dashboard')
-            order_items, order_items_columns = self.fetch_order_items()
-            transactions, transactions_columns = self.fetch_transactions()
-            order_items_df = pd.DataFrame(order_items, columns=order_items_columns)
-            transactions_df = pd.DataFrame(transactions, columns=transactions_columns)
+            # Read the version before refreshing, so a sync landing mid-run can't label old data as new
+            data_version = self.sync.data_version
+            if self.cache is not None:
+                self.cache.refresh_all()
+            min_date, max_date = self.fetch_date_range()
+            if min_date is None:
+                st.warning('No festival data has been loaded yet.')
+                return
+            self.display_sync_status()
             st.sidebar.title('Filters')
-            order_items_df, transactions_df = self.filter_dates(order_items_df, transactions_df)
-            order_items_df, transactions_df = self.filter_items(order_items_df, transactions_df)
-            self.display_metrics(transactions_df, order_items_df)
+            date_range = self.filter_dates(min_date, max_date)
+            excluded_items = self.filter_items(self.fetch_items(date_range))
+            views = self.load_views(data_version, date_range, excluded_items)
+            self.display_metrics(views['metrics'])
             st.divider()
-            self.display_item_sales(order_items_df)
-            self.display_item_details(order_items_df)
-            self.display_transactions_over_time(transactions_df)
+            self.display_item_sales(views['item_sales'])
+            self.display_item_details(views['item_details'])
+            self.display_transactions_over_time(views['transactions_over_time'])
 
         with tab2:
             st.title('Chat With Festival Data')
@@ -1,9 +1,12 @@
 import sys
 import os
+import streamlit as st
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 import clients.festival_analysis_client as fac
 
-festival_analyzer = fac.FestivalAnalyzer()
-festival_analyzer.execute()
+# One analyzer (and libsql connection) per user session instead of one per rerun
+if 'festival_analyzer' not in st.session_state:
+    st.session_state.festival_analyzer = fac.FestivalAnalyzer()
+st.session_state.festival_analyzer.execute()
@@ -0,0 +1,25 @@
+import pytest
+from benchmarks.bench_memory import synthetic_festivals
+from benchmarks.festival_db import festival_db as connect_festival_db, insert_rows
+from util.schema_util import ORDER_ITEMS_TABLE, TRANSACTIONS_TABLE
+
+
+@pytest.fixture
+def festival_rows():
+    # (order item rows, transaction rows) of two small festivals
+    return synthetic_festivals(2, 60)
+
+
+@pytest.fixture
+def empty_festival_db(tmp_path):
+    conn = connect_festival_db(str(tmp_path / 'festival-db.db'))
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def festival_db(empty_festival_db, festival_rows):
+    order_items, transactions = festival_rows
+    insert_rows(empty_festival_db, ORDER_ITEMS_TABLE, order_items)
+    insert_rows(empty_festival_db, TRANSACTIONS_TABLE, transactions)
+    return empty_festival_db
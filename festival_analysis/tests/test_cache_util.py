@@ -0,0 +1,86 @@
+import os
+import pyarrow as pa
+import pytest
+from benchmarks.festival_db import insert_rows
+from util.cache_util import FestivalTableCache
+from util.schema_util import ORDER_ITEMS_TABLE, TABLE_SCHEMAS, TRANSACTIONS_TABLE, rows_to_arrow
+
+
+def db_table(conn, table_name):
+    # What the cache should hold for a table: every row, in rowid order
+    schema = TABLE_SCHEMAS[table_name]
+    rows = conn.execute(f"select {', '.join(schema.names)} from {table_name} order by rowid").fetchall()
+    return rows_to_arrow(rows, schema)
+
+
+def assert_cache_matches_db(cache, conn):
+    for table_name in TABLE_SCHEMAS:
+        assert cache.table(table_name).equals(db_table(conn, table_name)), table_name
+
+
+def test_refresh_fetches_only_new_rows(empty_festival_db, festival_rows, tmp_path):
+    order_items, transactions = festival_rows
+    cache = FestivalTableCache(empty_festival_db, str(tmp_path / 'cache'))
+    assert cache.refresh_all() == 0
+
+    for start, end in ((0, 50), (50, 120), (120, len(order_items))):
+        insert_rows(empty_festival_db, ORDER_ITEMS_TABLE, order_items[start:end])
+        assert cache.refresh(ORDER_ITEMS_TABLE) == end - start
+    insert_rows(empty_festival_db, TRANSACTIONS_TABLE, transactions)
+    assert cache.refresh(TRANSACTIONS_TABLE) == len(transactions)
+
+    assert cache.refresh_all() == 0
+    assert_cache_matches_db(cache, empty_festival_db)
+    # A new cache on the same directory reads the files instead of refetching
+    assert FestivalTableCache(empty_festival_db, cache.directory).refresh_all() == 0
+
+
+@pytest.mark.parametrize('delete', [
+    'rowid in (3, 4, 5)',                                   # below the high water mark
+    'rowid > (select max(rowid) - 3 from {table})',         # the newest rows, so max(rowid) goes back
+    '1 = 1',                                                # everything
+])
+def test_refresh_rebuilds_after_deletes(festival_db, tmp_path, delete):
+    cache = FestivalTableCache(festival_db, str(tmp_path / 'cache'))
+    cache.refresh_all()
+
+    with festival_db:
+        festival_db.execute(f'delete from {ORDER_ITEMS_TABLE} where {delete.format(table=ORDER_ITEMS_TABLE)}')
+    remaining = festival_db.execute(f'select count(*) from {ORDER_ITEMS_TABLE}').fetchone()[0]
+
+    assert cache.refresh(ORDER_ITEMS_TABLE) == remaining
+    assert_cache_matches_db(cache, festival_db)
+
+
+def test_refresh_rebuilds_when_rows_are_replaced(festival_db, festival_rows, tmp_path):
+    # Deleting old rows and adding as many new ones keeps the count the same
+    order_items, _ = festival_rows
+    cache = FestivalTableCache(festival_db, str(tmp_path / 'cache'))
+    cache.refresh_all()
+
+    with festival_db:
+        festival_db.execute(f'delete from {ORDER_ITEMS_TABLE} where rowid <= 5')
+    insert_rows(festival_db, ORDER_ITEMS_TABLE, [(f'new{i}',) + row[1:] for i, row in enumerate(order_items[:5])])
+
+    cache.refresh(ORDER_ITEMS_TABLE)
+    assert_cache_matches_db(cache, festival_db)
+
+
+def test_write_swaps_in_complete_files_only(festival_db, tmp_path, monkeypatch):
+    cache = FestivalTableCache(festival_db, str(tmp_path / 'cache'))
+    cache.refresh_all()
+    before = cache.table(ORDER_ITEMS_TABLE)
+
+    def broken_writer(sink, schema):
+        sink.write(b'partial')
+        raise OSError('disk full')
+
+    insert_rows(festival_db, ORDER_ITEMS_TABLE, [('late',) + tuple(None for _ in range(18))])
+    monkeypatch.setattr(pa.ipc, 'new_file', broken_writer)
+    with pytest.raises(OSError):
+        cache.refresh(ORDER_ITEMS_TABLE)
+    monkeypatch.undo()
+
+    # The file on disk is still the last complete one
+    assert FestivalTableCache(festival_db, cache.directory).table(ORDER_ITEMS_TABLE).equals(before)
+    assert os.path.exists(os.path.join(cache.directory, f'{ORDER_ITEMS_TABLE}.arrow'))
@@ -0,0 +1,42 @@
+import logging
+import threading
+from unittest.mock import Mock
+from util.db_util import SyncManager
+
+
+def sync_manager():
+    # A SyncManager without Turso settings or a background thread
+    manager = SyncManager.__new__(SyncManager)
+    manager.data_version, manager.last_synced_at, manager.last_error = 0, None, None
+    manager._table_stats = None
+    manager._lock = threading.Lock()
+    return manager
+
+
+def test_sync_failures_are_logged_once_until_they_change(caplog):
+    manager = sync_manager()
+    conn = Mock()
+    conn.sync.side_effect = [ConnectionError('offline'), ConnectionError('offline'), ConnectionError('bad token')]
+
+    with caplog.at_level(logging.WARNING, logger='util.db_util'):
+        for _ in range(3):
+            manager.sync_now(conn)
+
+    assert [record.getMessage() for record in caplog.records] == ['Turso sync failed: offline',
+                                                                  'Turso sync failed: bad token']
+    assert str(manager.last_error) == 'bad token'
+
+
+def test_successful_sync_clears_the_error(caplog):
+    manager = sync_manager()
+    conn = Mock()
+    conn.sync.side_effect = [ConnectionError('offline'), None, ConnectionError('offline')]
+    conn.execute.return_value.fetchone.return_value = (10, 10)
+
+    with caplog.at_level(logging.WARNING, logger='util.db_util'):
+        for _ in range(3):
+            manager.sync_now(conn)
+
+    # Failing again after a success is a new failure
+    assert len(caplog.records) == 2
+    assert manager.data_version == 1
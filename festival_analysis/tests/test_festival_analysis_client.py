@@ -0,0 +1,71 @@
+import datetime as dt
+import pandas as pd
+import pytest
+from benchmarks.festival_db import insert_rows
+from clients.festival_analysis_client import FestivalAnalyzer
+from util.cache_util import FestivalTableCache
+from util.schema_util import ORDER_ITEMS_TABLE, TRANSACTIONS_TABLE
+
+EXCLUDED_ITEMS = ('Gyro', 'Baklava', 'Beer')
+
+
+def analyzer(conn, cache=None):
+    # A FestivalAnalyzer on the test database, without the sync manager
+    festival_analyzer = FestivalAnalyzer.__new__(FestivalAnalyzer)
+    festival_analyzer.conn = conn
+    festival_analyzer.cursor = conn.cursor()
+    festival_analyzer.cache = cache
+    return festival_analyzer
+
+
+@pytest.fixture
+def analyzers(empty_festival_db, festival_rows, tmp_path):
+    # (SQL, local cache) analyzers on the same rows. Some order items have no Item, one
+    # transaction only has excluded items and one only has an item without a name.
+    order_items, transactions = festival_rows
+    order_items = [row[:4] + (None,) + row[5:] if i % 7 == 0 else row for i, row in enumerate(order_items)]
+    order_items += [(f'only{i}', '2024-06-08', '12:00:00', 'Food', item, 1, 'Regular', '', 5, 0, 5, 0, f'T{i}', f'PT{i}',
+                     None, None, None, 1, f'tok{i}') for i, item in enumerate(['Gyro', None])]
+    transactions += [(f'T{i}', '2024-06-08', '12:00:00', 5, 0, 0, 5, 0, 0, 0, 0, 5, 0, '', 5, 0, 5, f'PT{i}', '', '',
+                      None, None, None, 0, 0, 'Complete') for i in range(2)]
+    insert_rows(empty_festival_db, ORDER_ITEMS_TABLE, order_items)
+    insert_rows(empty_festival_db, TRANSACTIONS_TABLE, transactions)
+    cache = FestivalTableCache(empty_festival_db, str(tmp_path / 'cache'))
+    cache.refresh_all()
+    return analyzer(empty_festival_db), analyzer(empty_festival_db, cache)
+
+
+def metrics(festival_analyzer, date_range, excluded_items):
+    order_items_rollup, transactions_rollup = festival_analyzer.load_rollups(date_range, excluded_items)
+    return FestivalAnalyzer.compute_metrics(transactions_rollup, order_items_rollup)
+
+
+def sorted_frame(df, key):
+    return df.sort_values(key).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('date_range', [None, (dt.date(2024, 6, 7), dt.date(2024, 6, 8))])
+@pytest.mark.parametrize('excluded_items', [(), EXCLUDED_ITEMS])
+def test_sql_and_cache_filters_agree(analyzers, date_range, excluded_items):
+    sql, cached = analyzers
+
+    sql_items, sql_transactions = sql.load_frames(date_range, excluded_items)
+    cached_items, cached_transactions = cached.load_frames(date_range, excluded_items)
+    pd.testing.assert_frame_equal(sorted_frame(sql_items, 'item_order_id'), sorted_frame(cached_items, 'item_order_id'))
+    pd.testing.assert_frame_equal(sorted_frame(sql_transactions, 'Transaction_ID'),
+                                  sorted_frame(cached_transactions, 'Transaction_ID'))
+    assert sql.fetch_items(date_range) == cached.fetch_items(date_range)
+
+    # With no excluded items the cache serves the stored rollups, otherwise the filtered rows
+    pd.testing.assert_series_equal(metrics(sql, date_range, excluded_items), metrics(cached, date_range, excluded_items))
+
+
+def test_excluded_items_drop_their_transactions(analyzers):
+    for festival_analyzer in analyzers:
+        order_items, transactions = festival_analyzer.load_frames(excluded_items=EXCLUDED_ITEMS)
+        assert not order_items['Item'].isin(EXCLUDED_ITEMS).any()
+        assert order_items['Item'].isna().any()
+        # T0 only had a Gyro; T1's item has no name, so it stays
+        assert 'T0' not in set(transactions['Transaction_ID'])
+        assert 'T1' in set(transactions['Transaction_ID'])
+        assert set(transactions['Transaction_ID']) == set(order_items['Transaction_ID'])
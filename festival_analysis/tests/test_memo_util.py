@@ -0,0 +1,79 @@
+import pandas as pd
+from util.memo_util import ComputationCache, estimate_size
+
+
+def frame(rows):
+    return pd.DataFrame({'Net_Sales': range(rows)})
+
+
+def compute(value, calls):
+    def compute_value():
+        calls.append(value)
+        return value
+    return compute_value
+
+
+def test_hits_and_misses():
+    cache, calls = ComputationCache(max_bytes=10 ** 6), []
+    value = frame(10)
+
+    assert cache.get_or_compute(1, 'all', compute(value, calls)) is value
+    assert cache.get_or_compute(1, 'all', compute(frame(10), calls)) is value
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used_entries_over_max_bytes():
+    size = estimate_size(frame(100))
+    cache, calls = ComputationCache(max_bytes=size * 2), []
+    cache.get_or_compute(1, 'a', compute(frame(100), calls))
+    cache.get_or_compute(1, 'b', compute(frame(100), calls))
+    cache.get_or_compute(1, 'a', compute(frame(100), calls))      # a is now the most recent
+    cache.get_or_compute(1, 'c', compute(frame(100), calls))      # evicts b
+
+    assert list(cache._entries) == ['a', 'c']
+    assert cache._total_bytes == size * 2 <= cache.max_bytes
+    cache.get_or_compute(1, 'b', compute(frame(100), calls))
+    assert len(calls) == 4
+    assert list(cache._entries) == ['c', 'b']
+
+
+def test_new_data_version_clears_the_cache():
+    cache, calls = ComputationCache(max_bytes=10 ** 6), []
+    cache.get_or_compute(1, 'a', compute(frame(10), calls))
+    cache.get_or_compute(1, 'b', compute(frame(10), calls))
+
+    cache.get_or_compute(2, 'a', compute(frame(10), calls))
+    assert len(calls) == 3
+    assert list(cache._entries) == ['a']
+    assert cache.data_version == 2
+    assert cache._total_bytes == estimate_size(frame(10))
+
+
+def test_value_computed_for_an_old_data_version_is_not_cached():
+    cache, calls = ComputationCache(max_bytes=10 ** 6), []
+
+    def compute_during_sync():
+        # A sync lands while the view is being computed
+        cache.get_or_compute(2, 'other', compute(frame(10), calls))
+        return frame(10)
+
+    cache.get_or_compute(1, 'a', compute_during_sync)
+    assert list(cache._entries) == ['other']
+
+
+def test_oversized_values_are_returned_but_not_cached():
+    cache, calls = ComputationCache(max_bytes=estimate_size(frame(100))), []
+    cache.get_or_compute(1, 'small', compute(frame(100), calls))
+    big = frame(10000)
+
+    assert cache.get_or_compute(1, 'big', compute(big, calls)) is big
+    assert list(cache._entries) == ['small']
+    cache.get_or_compute(1, 'big', compute(big, calls))
+    assert len(calls) == 3
+
+
+def test_estimate_size_of_nested_views():
+    df = frame(100)
+    assert estimate_size({'totals': df, 'by_hour': [df['Net_Sales'], df]}) == (
+        2 * estimate_size(df) + estimate_size(df['Net_Sales']))
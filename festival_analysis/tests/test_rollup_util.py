@@ -0,0 +1,87 @@
+import datetime as dt
+import pandas as pd
+import pytest
+from benchmarks.festival_db import insert_rows
+from util.cache_util import FestivalTableCache
+from util.rollup_util import ROLLUPS, aggregate
+from util.schema_util import ORDER_ITEMS_TABLE, TABLE_SCHEMAS, TRANSACTIONS_TABLE, rows_to_arrow, typed_frame
+
+
+def sorted_rollup(table_name, rollup):
+    keys, measures = ROLLUPS[table_name]
+    # Key columns as plain values, so rollups with different category sets compare equal
+    rollup = rollup.astype({key: object for key in keys if isinstance(rollup[key].dtype, pd.CategoricalDtype)})
+    return rollup[keys + measures].sort_values(keys, na_position='last').reset_index(drop=True)
+
+
+def assert_rollups_match_cache(cache, date_range=None, excluded_items=()):
+    # The stored rollups have the same totals as rolling up the cached rows from scratch
+    for table_name in TABLE_SCHEMAS:
+        df = typed_frame(table_name, cache.table(table_name))
+        if date_range is not None:
+            day = df['Timestamp'].dt.normalize()
+            df = df[(day >= pd.Timestamp(date_range[0])) & (day <= pd.Timestamp(date_range[1]))]
+        if excluded_items and 'Item' in df.columns:
+            df = df[~df['Item'].isin(excluded_items)]
+        expected = aggregate(table_name, df)
+        actual = cache.rollups.frame(table_name, date_range, excluded_items)
+        pd.testing.assert_frame_equal(sorted_rollup(table_name, actual), sorted_rollup(table_name, expected))
+
+
+def assert_cache_matches_db(cache, conn):
+    for table_name, schema in TABLE_SCHEMAS.items():
+        rows = conn.execute(f"select {', '.join(schema.names)} from {table_name} order by rowid").fetchall()
+        assert cache.table(table_name).equals(rows_to_arrow(rows, schema)), table_name
+
+
+@pytest.fixture
+def batches(festival_rows):
+    # The festival rows in four batches. Items without a name are mixed in, and an item
+    # that only shows up in the last batch gives that batch a category the others don't have.
+    order_items, transactions = festival_rows
+    order_items = [row[:4] + (None,) + row[5:] if i % 9 == 0 else row for i, row in enumerate(order_items)]
+    order_items[-3:] = [row[:4] + ('Frappe Special',) + row[5:] for row in order_items[-3:]]
+    bounds = [0, len(order_items) // 5, len(order_items) // 2, len(order_items) - 3, len(order_items)]
+    transaction_bounds = [round(bound * len(transactions) / len(order_items)) for bound in bounds]
+    return [(order_items[start:end], transactions[t_start:t_end])
+            for start, end, t_start, t_end in zip(bounds, bounds[1:], transaction_bounds, transaction_bounds[1:])]
+
+
+def test_rollups_merged_batch_by_batch_match_a_full_rollup(empty_festival_db, batches, tmp_path):
+    cache = FestivalTableCache(empty_festival_db, str(tmp_path / 'cache'))
+    for order_items, transactions in batches:
+        insert_rows(empty_festival_db, ORDER_ITEMS_TABLE, order_items)
+        insert_rows(empty_festival_db, TRANSACTIONS_TABLE, transactions)
+        cache.refresh_all()
+        assert_rollups_match_cache(cache)
+
+    assert_rollups_match_cache(cache, (dt.date(2024, 6, 7), dt.date(2024, 6, 8)))
+    assert_rollups_match_cache(cache, excluded_items=('Gyro', 'Frappe Special'))
+    # Read back from disk by a new cache
+    assert_rollups_match_cache(FestivalTableCache(empty_festival_db, cache.directory))
+
+
+def test_rollups_are_rebuilt_when_rows_are_deleted(empty_festival_db, batches, tmp_path):
+    cache = FestivalTableCache(empty_festival_db, str(tmp_path / 'cache'))
+    for order_items, transactions in batches[:2]:
+        insert_rows(empty_festival_db, ORDER_ITEMS_TABLE, order_items)
+        insert_rows(empty_festival_db, TRANSACTIONS_TABLE, transactions)
+        cache.refresh_all()
+
+    with empty_festival_db:
+        empty_festival_db.execute(f"delete from {ORDER_ITEMS_TABLE} where Item = 'Gyro' or rowid < 10")
+        empty_festival_db.execute(f'delete from {TRANSACTIONS_TABLE} where rowid % 4 = 0')
+    cache.refresh_all()
+    assert_cache_matches_db(cache, empty_festival_db)
+    assert_rollups_match_cache(cache)
+
+    # Reloaded in full, with more rows than before
+    with empty_festival_db:
+        for table_name in TABLE_SCHEMAS:
+            empty_festival_db.execute(f'delete from {table_name}')
+    for order_items, transactions in batches:
+        insert_rows(empty_festival_db, ORDER_ITEMS_TABLE, order_items)
+        insert_rows(empty_festival_db, TRANSACTIONS_TABLE, transactions)
+    cache.refresh_all()
+    assert_cache_matches_db(cache, empty_festival_db)
+    assert_rollups_match_cache(cache)
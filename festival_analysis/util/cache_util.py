@@ -0,0 +1,128 @@
+import os
+import threading
+import pyarrow as pa
+import pyarrow.compute as pc
+from util.rollup_util import RollupStore
+from util.schema_util import ORDER_ITEMS_TABLE, TABLE_SCHEMAS, TRANSACTIONS_TABLE, rows_to_arrow
+
+CACHE_DIRECTORY = 'festival_cache'      # override with FESTIVAL_CACHE_DIRECTORY
+ROWID_COLUMN = '_rowid'
+
+
+class FestivalTableCache:
+    """Local Arrow copy of the festival tables, refreshed incrementally from libsql.
+
+    Each table is kept as an uncompressed Arrow IPC file that is memory-mapped on read.
+    refresh() only fetches rows whose rowid is above the highest rowid already cached,
+    since the festival tables are append-only. If rows were deleted (or the table was
+    reloaded) the cached copy is rebuilt from scratch.
+    """
+
+    def __init__(self, conn, directory=None):
+        self.conn = conn
+        self.directory = directory or os.getenv('FESTIVAL_CACHE_DIRECTORY', CACHE_DIRECTORY)
+        self.version = 0
+        self._tables = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.rollups = RollupStore(self.directory)
+
+    def _path(self, table_name):
+        return os.path.join(self.directory, f'{table_name}.arrow')
+
+    @staticmethod
+    def _empty(table_name):
+        return TABLE_SCHEMAS[table_name].append(pa.field(ROWID_COLUMN, pa.int64())).empty_table()
+
+    def _read(self, table_name):
+        if table_name not in self._tables:
+            path = self._path(table_name)
+            if os.path.exists(path):
+                with pa.ipc.open_file(pa.memory_map(path)) as reader:
+                    self._tables[table_name] = reader.read_all()
+            else:
+                self._tables[table_name] = self._empty(table_name)
+        return self._tables[table_name]
+
+    def _write(self, table_name, table):
+        # Write to a temporary file and swap it in, so readers never see a partial file
+        path = self._path(table_name)
+        with pa.OSFile(f'{path}.tmp', 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(f'{path}.tmp', path)
+        self._tables.pop(table_name, None)
+
+    def _fetch(self, cursor, table_name, high_water_mark):
+        # Rows above the high water mark, with their rowid, as an Arrow table
+        schema = TABLE_SCHEMAS[table_name]
+        cursor.execute(f'''select {', '.join(schema.names)}, rowid from {table_name}
+                           where rowid > ? order by rowid''', (high_water_mark,))
+        return rows_to_arrow(cursor.fetchall(), self._empty(table_name).schema)
+
+    def refresh(self, table_name):
+        # Pull new rows for one table; returns the number of rows added
+        with self._lock:
+            cached = self._read(table_name)
+            high_water_mark = pc.max(cached[ROWID_COLUMN]).as_py() or 0
+
+            cursor = self.conn.cursor()
+            cursor.execute(f'select count(*), max(rowid) from {table_name}')
+            count, max_rowid = cursor.fetchone()
+            max_rowid = max_rowid or 0
+            if count == cached.num_rows and max_rowid == high_water_mark:
+                if not self.rollups.exists(table_name):
+                    self.rollups.update(table_name, cached, rebuild=True)
+                return 0
+            if count < cached.num_rows or max_rowid < high_water_mark:
+                cached, high_water_mark = self._empty(table_name), 0
+
+            new_rows = self._fetch(cursor, table_name, high_water_mark)
+            if cached.num_rows + new_rows.num_rows != count:
+                # Rows below the high water mark were deleted as well as new ones added, so
+                # the cached rows can't be trusted
+                cached, high_water_mark = self._empty(table_name), 0
+                new_rows = self._fetch(cursor, table_name, 0)
+            self._write(table_name, pa.concat_tables([cached, new_rows]))
+            if high_water_mark == 0 or not self.rollups.exists(table_name):
+                self.rollups.update(table_name, self._read(table_name), rebuild=True)
+            else:
+                self.rollups.update(table_name, new_rows)
+            self.version += 1
+            return new_rows.num_rows
+
+    def refresh_all(self):
+        return sum(self.refresh(table_name) for table_name in TABLE_SCHEMAS)
+
+    def table(self, table_name):
+        with self._lock:
+            return self._read(table_name).drop_columns([ROWID_COLUMN])
+
+    def date_range(self):
+        # (min, max) Date over both tables, as stored
+        dates = []
+        for table_name in TABLE_SCHEMAS:
+            min_max = pc.min_max(self.table(table_name)['Date'])
+            dates += [date for date in (min_max['min'].as_py(), min_max['max'].as_py()) if date is not None]
+        return (min(dates), max(dates)) if dates else (None, None)
+
+    def items(self, date_range=None):
+        order_items = self._filter(self.table(ORDER_ITEMS_TABLE), date_range)
+        return sorted(item for item in pc.unique(order_items['Item']).to_pylist() if item is not None)
+
+    @staticmethod
+    def _filter(table, date_range=None, excluded_items=()):
+        if date_range is not None:
+            start, end = (date.isoformat() for date in date_range)
+            table = table.filter((pc.field('Date') >= start) & (pc.field('Date') <= end))
+        if excluded_items and 'Item' in table.column_names:
+            table = table.filter(pc.field('Item').is_null() | ~pc.field('Item').isin(list(excluded_items)))
+        return table
+
+    def filtered_tables(self, date_range=None, excluded_items=()):
+        # The same filters as FestivalAnalyzer.build_filter_clause, applied to the Arrow tables
+        order_items = self._filter(self.table(ORDER_ITEMS_TABLE), date_range, excluded_items)
+        transactions = self._filter(self.table(TRANSACTIONS_TABLE), date_range)
+        if excluded_items:
+            transactions = transactions.filter(pc.field('Transaction_ID').isin(pc.unique(order_items['Transaction_ID'])))
+        return order_items, transactions
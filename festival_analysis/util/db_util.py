@@ -1,8 +1,16 @@
+import logging
 import os
+import threading
+import datetime as dt
 import toml
 import libsql_experimental as libsql
 from dotenv import load_dotenv
 import streamlit as st
+from util.schema_util import TABLE_SCHEMAS
+
+SYNC_INTERVAL_SECONDS = 300     # override with TURSO_SYNC_INTERVAL
+
+logger = logging.getLogger(__name__)
 
 
 def load_secrets():
@@ -16,7 +24,8 @@ def load_secrets():
         for key, value in config.items():
             os.environ[key] = value
 
-def connect_turso_db():
+def turso_settings():
+    # (sync url, auth token, local replica path)
     if os.path.exists('.env'):
         load_secrets()
         url = os.getenv("TURSO_DATABASE_URL")
@@ -32,9 +41,102 @@ def connect_turso_db():
         os.makedirs(db_directory)
 
     db_path = os.path.join(db_directory, "festival-db.db")
+    return url, auth_token, db_path
 
+
+def connect_turso_db(sync=True):
+    url, auth_token, db_path = turso_settings()
     conn = libsql.connect(db_path, sync_url=url, auth_token=auth_token)
-    conn.sync()
+    if sync:
+        conn.sync()
     return conn
 
+
+class SyncManager:
+    """Keeps the local Turso replica up to date from a background thread.
+
+    The dashboard reads the local replica and never waits on a sync, except on the very
+    first run when there is no local copy yet. A daemon thread syncs every `interval`
+    seconds on its own connection. data_version goes up each time a sync changes the
+    festival tables, so caches can key on it; last_synced_at is the time of the last
+    successful sync.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval or int(os.getenv('TURSO_SYNC_INTERVAL', SYNC_INTERVAL_SECONDS))
+        self.url, self.auth_token, self.db_path = turso_settings()
+        self.data_version = 0
+        self.last_synced_at = None
+        self.last_error = None
+        self._table_stats = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        if os.path.exists(self.db_path):
+            self._table_stats = self.table_stats(self.connect())
+            wait_first = False
+        else:
+            # Nothing to show until the replica exists, so the first sync blocks
+            self.sync_now()
+            wait_first = True
+        self._thread = threading.Thread(target=self._run, args=(wait_first,), name='turso-sync', daemon=True)
+        self._thread.start()
+
+    def connect(self):
+        # Plain connection on the local replica file, for reading. It never talks to Turso.
+        return libsql.connect(self.db_path)
+
+    def connect_replica(self):
+        return libsql.connect(self.db_path, sync_url=self.url, auth_token=self.auth_token)
+
+    @staticmethod
+    def table_stats(conn):
+        # (row count, highest rowid) of each festival table, to tell whether a sync changed anything
+        stats = []
+        for table_name in TABLE_SCHEMAS:
+            try:
+                stats.append(tuple(conn.execute(f'select count(*), max(rowid) from {table_name}').fetchone()))
+            except Exception:
+                stats.append(None)
+        return tuple(stats)
+
+    def sync_now(self, conn=None):
+        with self._lock:
+            try:
+                conn = conn or self.connect_replica()
+                conn.sync()
+                table_stats = self.table_stats(conn)
+                if table_stats != self._table_stats:
+                    self._table_stats = table_stats
+                    self.data_version += 1
+                self.last_synced_at = dt.datetime.now()
+                self.last_error = None
+            except Exception as e:
+                self._sync_failed(e)
+
+    def _sync_failed(self, error):
+        # Warn when syncs start failing (or fail differently); repeats of the same error on
+        # every interval only go to the debug log
+        if self.last_error is None or str(error) != str(self.last_error):
+            logger.warning('Turso sync failed: %s', error)
+        else:
+            logger.debug('Turso sync failed again: %s', error)
+        self.last_error = error
+
+    def _run(self, wait_first=False):
+        conn = None
+        if wait_first:
+            self._stop.wait(self.interval)
+        while not self._stop.is_set():
+            try:
+                conn = conn or self.connect_replica()
+            except Exception as e:
+                self._sync_failed(e)
+            else:
+                self.sync_now(conn)
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        self._stop.set()
+
+
 #connect_turso_db()
\ No newline at end of file
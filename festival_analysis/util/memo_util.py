@@ -0,0 +1,71 @@
+import os
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+COMPUTE_CACHE_MB = 256      # override with FESTIVAL_COMPUTE_CACHE_MB
+
+
+def estimate_size(value):
+    # Approximate memory footprint in bytes of a computed view (frames, series, dicts of them)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, dict):
+        return sum(estimate_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(item) for item in value)
+    return 64
+
+
+class ComputationCache:
+    """LRU cache of filtered frames and view aggregates, capped by memory.
+
+    Entries are keyed on the active filters and belong to one data version. When the data
+    version changes (a sync brought in new rows) every entry is dropped.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or int(os.getenv('FESTIVAL_COMPUTE_CACHE_MB', COMPUTE_CACHE_MB)) * 1024 * 1024
+        self.data_version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._total_bytes = 0
+
+    def get_or_compute(self, data_version, key, compute):
+        with self._lock:
+            if data_version != self.data_version:
+                self._entries.clear()
+                self._sizes.clear()
+                self._total_bytes = 0
+                self.data_version = data_version
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = compute()
+        size = estimate_size(value)
+        with self._lock:
+            if data_version != self.data_version or size > self.max_bytes:
+                return value
+            if key not in self._entries:
+                self._entries[key] = value
+                self._sizes[key] = size
+                self._total_bytes += size
+            # Evict least recently used entries until the cache fits again
+            while self._total_bytes > self.max_bytes:
+                old_key, _ = self._entries.popitem(last=False)
+                self._total_bytes -= self._sizes.pop(old_key)
+            return value
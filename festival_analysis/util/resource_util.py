@@ -0,0 +1,24 @@
+import streamlit as st
+from util.cache_util import FestivalTableCache
+from util.db_util import SyncManager
+from util.memo_util import ComputationCache
+
+# Resources shared by every session of the Streamlit server process. st.cache_resource builds
+# each one on first use and hands the same object to every rerun and session after that, so
+# they must be safe to use from several threads (each keeps its own lock).
+
+
+@st.cache_resource
+def get_sync_manager():
+    # One background sync thread per process
+    return SyncManager()
+
+
+@st.cache_resource
+def get_table_cache():
+    return FestivalTableCache(get_sync_manager().connect())
+
+
+@st.cache_resource
+def get_computation_cache():
+    return ComputationCache()
@@ -0,0 +1,86 @@
+import os
+import threading
+import pandas as pd
+import pyarrow as pa
+from util.schema_util import ORDER_ITEMS_TABLE, TIMESTAMP_COLUMN, TRANSACTIONS_TABLE, categorize, typed_frame
+
+# Rollup of each table: group-by keys and summed measures. 'Count' is the number of rows,
+# money measures are int64 cents like the typed frames they are built from.
+ROLLUPS = {
+    ORDER_ITEMS_TABLE: (['Date', 'Item', 'Price_Point_Name'], ['Qty', 'Net_Sales', 'Count']),
+    TRANSACTIONS_TABLE: (['Date', 'Hour'], ['Gross_Sales', 'Discounts', 'Fees', 'Net_Sales', 'Net_Total', 'Count']),
+}
+ROLLUP_FORMAT = 2       # bump when the stored rollup columns change, so old files are rebuilt
+
+
+def aggregate(table_name, df):
+    # Roll typed order item or transaction rows (see schema_util.typed_frame) up to per-day
+    # (and per-item/price point or per-hour) totals. Used for both the stored rollups and
+    # for filtered raw rows.
+    keys, measures = ROLLUPS[table_name]
+    df = df.assign(Count=1, Date=df[TIMESTAMP_COLUMN].dt.normalize())
+    if table_name == TRANSACTIONS_TABLE:
+        df['Hour'] = df[TIMESTAMP_COLUMN].dt.hour
+    return df.groupby(keys, dropna=False, sort=False, observed=True)[measures].sum().reset_index()
+
+
+class RollupStore:
+    """Pre-aggregated festival totals, kept next to the local table cache.
+
+    FestivalTableCache hands each batch of newly synced rows to update(), which merges
+    their totals into the stored rollups, so the dashboard reads a few hundred rollup rows
+    instead of aggregating every order item on each rerun.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def _path(self, table_name):
+        return os.path.join(self.directory, f'{table_name}_rollup.v{ROLLUP_FORMAT}.arrow')
+
+    def _read(self, table_name):
+        if table_name not in self._frames:
+            path = self._path(table_name)
+            if os.path.exists(path):
+                with pa.ipc.open_file(pa.memory_map(path)) as reader:
+                    self._frames[table_name] = reader.read_all().to_pandas()
+            else:
+                keys, measures = ROLLUPS[table_name]
+                self._frames[table_name] = pd.DataFrame(columns=keys + measures)
+        return self._frames[table_name]
+
+    def _write(self, table_name, rollup):
+        path = self._path(table_name)
+        table = pa.Table.from_pandas(rollup, preserve_index=False)
+        with pa.OSFile(f'{path}.tmp', 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(f'{path}.tmp', path)
+        self._frames[table_name] = rollup
+
+    def exists(self, table_name):
+        return os.path.exists(self._path(table_name))
+
+    def update(self, table_name, new_rows, rebuild=False):
+        # Merge the totals of newly synced rows (an Arrow table) into the stored rollup
+        with self._lock:
+            keys, measures = ROLLUPS[table_name]
+            new_rollup = aggregate(table_name, typed_frame(table_name, new_rows))
+            if not rebuild and self.exists(table_name):
+                new_rollup = (pd.concat([self._read(table_name), new_rollup], ignore_index=True)
+                              .groupby(keys, dropna=False, sort=False, observed=True)[measures].sum().reset_index())
+                # Categories differ between batches, so the merged keys come back as plain objects
+                new_rollup = categorize(new_rollup, [key for key in keys if key not in ('Date', 'Hour')])
+            self._write(table_name, new_rollup)
+
+    def frame(self, table_name, date_range=None, excluded_items=()):
+        with self._lock:
+            rollup = self._read(table_name)
+        if date_range is not None:
+            start, end = (pd.Timestamp(date) for date in date_range)
+            rollup = rollup[(rollup['Date'] >= start) & (rollup['Date'] <= end)]
+        if excluded_items and 'Item' in rollup.columns:
+            rollup = rollup[~rollup['Item'].isin(excluded_items)]
+        return rollup
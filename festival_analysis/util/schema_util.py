@@ -0,0 +1,130 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+ORDER_ITEMS_TABLE = 'festival_item_orders'
+TRANSACTIONS_TABLE = 'festival_transactions'
+
+ORDER_ITEMS_SCHEMA = pa.schema([
+    ('item_order_id', pa.string()),
+    ('Date', pa.string()),
+    ('Time', pa.string()),
+    ('Category', pa.string()),
+    ('Item', pa.string()),
+    ('Qty', pa.float64()),
+    ('Price_Point_Name', pa.string()),
+    ('Modifiers_Applied', pa.string()),
+    ('Gross_Sales', pa.float64()),
+    ('Discounts', pa.float64()),
+    ('Net_Sales', pa.float64()),
+    ('Tax', pa.float64()),
+    ('Transaction_ID', pa.string()),
+    ('Payment_ID', pa.string()),
+    ('Customer_ID', pa.string()),
+    ('Customer_Name', pa.string()),
+    ('Customer_Reference_ID', pa.string()),
+    ('Count', pa.float64()),
+    ('Token', pa.string()),
+])
+
+TRANSACTIONS_SCHEMA = pa.schema([
+    ('Transaction_ID', pa.string()),
+    ('Date', pa.string()),
+    ('Time', pa.string()),
+    ('Gross_Sales', pa.float64()),
+    ('Discounts', pa.float64()),
+    ('Service_Charges', pa.float64()),
+    ('Net_Sales', pa.float64()),
+    ('Gift_Card_Sales', pa.float64()),
+    ('Tax', pa.float64()),
+    ('Tip', pa.float64()),
+    ('Partial_Refunds', pa.float64()),
+    ('Total_Collected', pa.float64()),
+    ('Card', pa.float64()),
+    ('Card_Entry_Methods', pa.string()),
+    ('Cash', pa.float64()),
+    ('Fees', pa.float64()),
+    ('Net_Total', pa.float64()),
+    ('Payment_ID', pa.string()),
+    ('Card_Brand', pa.string()),
+    ('PAN_Suffix', pa.string()),
+    ('Customer_ID', pa.string()),
+    ('Customer_Name', pa.string()),
+    ('Customer_Reference_ID', pa.string()),
+    ('Fee_Percentage_Rate', pa.float64()),
+    ('Fee_Fixed_Rate', pa.float64()),
+    ('Transaction_Status', pa.string()),
+])
+
+TABLE_SCHEMAS = {
+    ORDER_ITEMS_TABLE: ORDER_ITEMS_SCHEMA,
+    TRANSACTIONS_TABLE: TRANSACTIONS_SCHEMA,
+}
+
+# Columns with a handful of distinct values, loaded as pandas categoricals
+CATEGORICAL_COLUMNS = {
+    ORDER_ITEMS_TABLE: ['Category', 'Item', 'Price_Point_Name', 'Modifiers_Applied'],
+    TRANSACTIONS_TABLE: ['Card_Entry_Methods', 'Card_Brand', 'Transaction_Status'],
+}
+
+# Money columns, loaded as int64 cents so totals add up exactly. Divide by 100 for display.
+MONEY_COLUMNS = {
+    ORDER_ITEMS_TABLE: ['Gross_Sales', 'Discounts', 'Net_Sales', 'Tax'],
+    TRANSACTIONS_TABLE: ['Gross_Sales', 'Discounts', 'Service_Charges', 'Net_Sales', 'Gift_Card_Sales', 'Tax', 'Tip',
+                         'Partial_Refunds', 'Total_Collected', 'Card', 'Cash', 'Fees', 'Net_Total'],
+}
+
+# Date and Time are stored as separate text columns; typed frames replace them with one timestamp
+TIMESTAMP_COLUMN = 'Timestamp'
+
+
+def rows_to_arrow(rows, schema):
+    # Build a typed Arrow table from libsql result tuples, one column at a time
+    columns = list(zip(*rows)) if rows else [()] * len(schema)
+    arrays = []
+    for field, values in zip(schema, columns):
+        if pa.types.is_string(field.type):
+            arrays.append(pa.array([None if value is None else str(value) for value in values], type=field.type))
+        else:
+            arrays.append(pa.array(pd.to_numeric(pd.Series(values, dtype=object), errors='coerce'), type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def typed_timestamps(table):
+    # Date + Time parsed once into a timestamp. Rows without a usable Time fall back to midnight.
+    date = table['Date']
+    timestamps = pc.strptime(pc.binary_join_element_wise(date, table['Time'], ' '),
+                             format='%Y-%m-%d %H:%M:%S', unit='s', error_is_null=True)
+    return pc.coalesce(timestamps, pc.strptime(date, format='%Y-%m-%d', unit='s', error_is_null=True))
+
+
+def typed_frame(table_name, table):
+    # Compact pandas frame of an Arrow table with the table's schema: categoricals for the
+    # low-cardinality text columns, int64 cents for money, Arrow-backed strings for ids and
+    # names, and a single Timestamp column in place of Date/Time
+    categorical_columns = CATEGORICAL_COLUMNS[table_name]
+    money_columns = MONEY_COLUMNS[table_name]
+    columns = {}
+    for name in table.column_names:
+        column = table[name]
+        if name in ('Date', 'Time'):
+            continue
+        if name in categorical_columns:
+            column = pc.dictionary_encode(column)
+        elif name in money_columns:
+            column = pc.round(pc.multiply(pc.fill_null(column, 0), 100)).cast(pa.int64())
+        elif name == 'Count':
+            column = pc.fill_null(column, 0).cast(pa.int32())
+        columns[name] = column
+    columns = {TIMESTAMP_COLUMN: typed_timestamps(table), **columns}
+    df = pa.table(columns).to_pandas(types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get)
+    return categorize(df, categorical_columns)
+
+
+def categorize(df, columns):
+    # Categoricals with the categories in alphabetical order, so sorting on them sorts by name
+    for name in columns:
+        if name in df.columns:
+            categories = df[name].astype('category').cat.categories
+            df[name] = pd.Categorical(df[name], categories=sorted(categories))
+    return df